@@ -0,0 +1,94 @@
+import argparse
+import time
+import numpy as np
+from src.init import *
+from src.kernels import *
+from src.boundaries import *
+
+# Per-step cost of the boundary conditions as a fraction of the total step time, on the
+# thermal and isothermal flow past cylinders examples
+parser = argparse.ArgumentParser(description="Measure the share of the step time spent in boundary conditions.")
+parser.add_argument("--steps", type=int, default=20)
+args = parser.parse_args()
+
+nx = 500
+ny = 100
+nl = 9
+tau_f = 0.8
+tau_g = 0.6
+wind_speed = 0.1
+gravity = 0.0
+alpha = 0.01
+T_hot = 1
+T_cold = 0
+
+radius = 5
+spacing = 2 * radius + 10
+cylinder_centers_x = []
+cylinder_centers_y = []
+for ix in range(4):
+    for iy in range(4):
+        cx = nx // 4 + ix * spacing
+        cy = ny // 3 - spacing + iy * spacing
+        if 0 < cy < ny-1:
+            cylinder_centers_x.append(cx)
+            cylinder_centers_y.append(cy)
+n_cylinders = len(cylinder_centers_x)
+
+solid = np.zeros((nx, ny), dtype=bool)
+solid = create_obstacle_mask(nx, ny, np.array(cylinder_centers_x), np.array(cylinder_centers_y), n_cylinders, "cylinder", radius, solid)
+solid[:, 0] = True
+solid[:, ny-1] = True
+
+# Fluid-solid links used by the obstacle bounce-back, built once since the geometry never changes
+links = obstacle_links(solid, nx, ny, "cylinder", n_cylinders, cylinder_centers_x, cylinder_centers_y, radius, T_hot, T_cold)
+
+def thermal_case():
+    f, g = thermal_sim(nx, ny, nl, T_cold)
+    f = wind_tunnel(f, nx, ny, nl, wind_speed)
+
+    def kernels(f, g):
+        f_new, g_new, _, _, _, _ = collide_and_stream(f, g, nx, ny, nl, solid, tau_f, tau_g, alpha, T_cold, gravity, None, None, False)
+        return f_new, g_new
+
+    def boundaries(f, g):
+        f, g = obstacle_link_bc(f, g, links)
+        f, g = thermal_flow_inlet_bc(ny, nl, wind_speed, f, g, T_cold, solid)
+        f, g = outlet_bc(nx, ny, nl, f, g, "right")
+        return f, g
+
+    return f, g, kernels, boundaries
+
+def isothermal_case():
+    f = wind_tunnel(np.zeros((nx, ny, nl)), nx, ny, nl, wind_speed)
+
+    def kernels(f, g):
+        f_new, _, _, _, _, _ = collide_and_stream(f, None, nx, ny, nl, solid, tau_f, None, None, None, None, None, None, False)
+        return f_new, None
+
+    def boundaries(f, g):
+        f = obstacle_bc(solid, nx, ny, nl, f, None, "cylinder", None, n_cylinders, cylinder_centers_x, cylinder_centers_y, radius, T_hot, T_cold)
+        f = wind_tunnel_inlet_bc(f, nx, ny, wind_speed)
+        f = outlet_bc(nx, ny, nl, f, None, "right")
+        return f, None
+
+    return f, None, kernels, boundaries
+
+print(f"{'case':>22} {'kernels [ms]':>13} {'BCs [ms]':>10} {'BC share':>9}")
+for name, case in (("cylinder_thermal_flow", thermal_case), ("cylinder_flow", isothermal_case)):
+    f, g, kernels, boundaries = case()
+    f, g = boundaries(*kernels(f, g)) # JIT warm-up
+
+    kernel_time = 0.0
+    boundary_time = 0.0
+    for _ in range(args.steps):
+        start = time.perf_counter()
+        f, g = kernels(f, g)
+        middle = time.perf_counter()
+        f, g = boundaries(f, g)
+        end = time.perf_counter()
+        kernel_time += middle - start
+        boundary_time += end - middle
+
+    share = boundary_time / (kernel_time + boundary_time)
+    print(f"{name:>22} {1e3 * kernel_time / args.steps:>13.2f} {1e3 * boundary_time / args.steps:>10.2f} {100 * share:>8.1f}%")
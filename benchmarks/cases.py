@@ -0,0 +1,265 @@
+import numpy as np
+from src.init import *
+from src.kernels import *
+from src.boundaries import *
+from src.simulation import Simulation
+
+# The example configurations as Simulation builders, without plotting. Every builder takes a scale factor
+# applied to the example's grid size and obstacle dimensions, so the physics setup stays the same at
+# every resolution.
+def scaled(n, scale):
+    return max(1, int(round(n * scale)))
+
+def obstacle_grid(nx, ny, width, spacing, offset):
+    # Obstacle centres laid out like the examples, offset shifts every other column up by spacing // 4
+    n_per_side = 4
+    start_x = nx // 4
+    start_y = ny // 3 - (n_per_side // 3) * spacing
+    centers_x = []
+    centers_y = []
+    for ix in range(n_per_side):
+        y_offset = (spacing // 4) if (offset and ix % 2 == 1) else 0
+        for iy in range(n_per_side):
+            cx = start_x + ix * spacing
+            cy = start_y + iy * spacing + y_offset
+            if 0 < cy < ny-1:
+                centers_x.append(cx)
+                centers_y.append(cy)
+    return centers_x, centers_y
+
+def ldc_flow(scale, precision="float64"):
+    nx = ny = scaled(200, scale)
+    nl = 9
+    lid_speed = 0.2
+    f = rest(nl, np.zeros((nx, ny, nl)))
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[0, :] = True
+    solid[nx-1, :] = True
+    solid[:, 0] = True
+    sim = Simulation(f, solid, 0.6, precision=precision, boundaries=[
+        lambda f, g: lid_bc(f, lid_speed * min(1.0, sim.time / 100), nx, ny),
+    ])
+    return sim
+
+def obstacle_flow(scale, obstacle):
+    nx, ny, nl = scaled(500, scale), scaled(250, scale), 9
+    wind_speed = 0.1
+    width = scaled(10, scale)
+    f = wind_tunnel(np.zeros((nx, ny, nl)), nx, ny, nl, wind_speed)
+    centers_x, centers_y = obstacle_grid(nx, ny, width, 2 * width + scaled(50, scale), True)
+    solid = create_obstacle_mask(nx, ny, np.array(centers_x), np.array(centers_y), len(centers_x), obstacle, width, np.zeros((nx, ny), dtype=bool))
+    return Simulation(f, solid, 0.7, boundaries=[
+        lambda f, g: wind_tunnel_inlet_bc(f, nx, ny, wind_speed),
+        lambda f, g: outlet_bc(nx, ny, nl, f, g, "right"),
+    ])
+
+def cylinder_flow(scale):
+    return obstacle_flow(scale, "cylinder")
+
+def box_flow(scale):
+    return obstacle_flow(scale, "box")
+
+def airfoil_flow(scale):
+    nx, ny, nl = scaled(500, scale), scaled(250, scale), 9
+    wind_speed = 0.1
+    thickness = scaled(5, scale)
+    f = wind_tunnel(np.zeros((nx, ny, nl)), nx, ny, nl, wind_speed)
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+    x_start = nx // 4
+    y_start = ny // 2
+    slope = -np.tan(np.radians(5))
+    for i in range(x_start, nx // 2):
+        y_center = int(y_start + slope * (i - x_start))
+        solid[i, y_center - thickness // 2: y_center + thickness // 2 + 1] = True
+    return Simulation(f, solid, 0.7, boundaries=[
+        lambda f, g: wind_tunnel_inlet_bc(f, nx, ny, wind_speed),
+        lambda f, g: outlet_bc(nx, ny, nl, f, g, "right"),
+    ])
+
+def rayleigh_bernard_case(scale, precision="float64"):
+    nx, ny, nl = scaled(500, scale), scaled(100, scale), 9
+    T_hot = 1
+    T_cold = 0.75
+    f, g = rayleigh_bernard(nx, ny, nl, T_hot, T_cold)
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+    return Simulation(f, solid, 0.8, g=g, tau_g=0.6, alpha=0.4, T_ref=0.5 * (T_hot + T_cold), gravity=0.05, periodic="x",
+                      precision=precision, boundaries=[
+        lambda f, g: heat_flux_bc(f, g, nx, ny, T_cold, T_hot, None, None),
+    ])
+
+def rising_smoke(scale):
+    nx, ny, nl = scaled(200, scale), scaled(400, scale), 9
+    T_hot = 1
+    T_cold = 0.75
+    f, g = thermal_sim(nx, ny, nl, T_cold)
+    source_width = nx // 10
+    source_start = nx // 2 - source_width // 2
+    source_end = nx // 2 + source_width // 2
+    return Simulation(f, np.zeros((nx, ny), dtype=bool), 0.8, g=g, tau_g=0.6, alpha=0.4, T_ref=T_cold, gravity=0.005, periodic="x", boundaries=[
+        lambda f, g: heat_flux_bc(f, g, nx, ny, T_cold, T_hot, source_start, source_end),
+        lambda f, g: outlet_bc(nx, ny, nl, f, g, "top"),
+    ])
+
+def thermal_bubble_case(scale):
+    nx, ny, nl = scaled(200, scale), scaled(400, scale), 9
+    T_cold = 0.75
+    f, g = thermal_sim(nx, ny, nl, T_cold)
+    f, g = thermal_bubble(f, g, nx, ny, nl, nx // 2, ny // 4, scaled(15, scale), 1)
+    return Simulation(f, np.zeros((nx, ny), dtype=bool), 0.8, g=g, tau_g=0.6, alpha=0.05, T_ref=T_cold, gravity=0.005, periodic="xy")
+
+def droplet(scale):
+    nx, ny, nl = scaled(400, scale), scaled(200, scale), 9
+    liquid_density = 2
+    gas_density = 0.1
+    density = droplet_collision(nx, ny, np.ones((nx, ny)) * gas_density, liquid_density, gas_density, nx // 2, int(ny * 0.7), nx // 8, ny // 4)
+    f = np.zeros((nx, ny, nl), dtype=np.float64)
+    for k in range(nl):
+        f[:, :, k] = w[k] * density
+    return Simulation(f, np.zeros((nx, ny), dtype=bool), 0.9, gravity=0.0005, G=-5.5, periodic="x")
+
+def thermal_obstacle_case(scale, obstacle, length):
+    nx, ny, nl = scaled(500, scale), scaled(100, scale), 9
+    wind_speed = 0.1
+    T_hot = 1
+    T_cold = 0
+    length = scaled(length, scale)
+    f, g = thermal_sim(nx, ny, nl, T_cold)
+    f = wind_tunnel(f, nx, ny, nl, wind_speed)
+    spacing = 2 * length + (scaled(10, scale) if obstacle == "cylinder" else 0)
+    centers_x, centers_y = obstacle_grid(nx, ny, length, spacing, False)
+    n_obstacles = len(centers_x)
+    solid = create_obstacle_mask(nx, ny, np.array(centers_x), np.array(centers_y), n_obstacles, obstacle, length, np.zeros((nx, ny), dtype=bool))
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+    links = obstacle_links(solid, nx, ny, obstacle, n_obstacles, centers_x, centers_y, length, T_hot, T_cold)
+    f, g = thermal_obstacle_flow(f, g, n_obstacles, centers_x, centers_y, length, nx, ny, nl, obstacle, T_hot)
+    return Simulation(f, solid, 0.8, g=g, tau_g=0.6, alpha=0.01, T_ref=T_cold, gravity=0.0, boundaries=[
+        lambda f, g: obstacle_link_bc(f, g, links),
+        lambda f, g: thermal_flow_inlet_bc(ny, nl, wind_speed, f, g, T_cold, solid),
+        lambda f, g: outlet_bc(nx, ny, nl, f, g, "right"),
+    ])
+
+def cylinder_thermal_flow(scale):
+    return thermal_obstacle_case(scale, "cylinder", 5)
+
+def box_thermal_flow(scale):
+    return thermal_obstacle_case(scale, "box", 10)
+
+CASES = {
+    "ldc_flow": ldc_flow,
+    "cylinder_flow": cylinder_flow,
+    "box_flow": box_flow,
+    "airfoil_flow": airfoil_flow,
+    "rayleigh_bernard": rayleigh_bernard_case,
+    "rising_smoke": rising_smoke,
+    "thermal_bubble": thermal_bubble_case,
+    "droplet": droplet,
+    "cylinder_thermal_flow": cylinder_thermal_flow,
+    "box_thermal_flow": box_thermal_flow,
+}
+
+# Some of the configurations as (Simulation positional arguments, keyword arguments, boundaries) for the decomposed
+# solvers (decomposition.py, distributed.py). boundaries(domain) builds the boundary conditions of one slab and
+# boundaries(None) those of the whole lattice for a single-process Simulation.
+def decomposed_cylinder_flow(scale):
+    nx, ny, nl = scaled(500, scale), scaled(250, scale), 9
+    wind_speed = 0.1
+    width = scaled(10, scale)
+    f = wind_tunnel(np.zeros((nx, ny, nl)), nx, ny, nl, wind_speed)
+    centers_x, centers_y = obstacle_grid(nx, ny, width, 2 * width + scaled(50, scale), True)
+    solid = create_obstacle_mask(nx, ny, np.array(centers_x), np.array(centers_y), len(centers_x), "cylinder", width, np.zeros((nx, ny), dtype=bool))
+
+    def boundaries(domain):
+        local_nx = nx if domain is None else domain.nx
+        return [
+            lambda f, g: wind_tunnel_inlet_bc(f, local_nx, ny, wind_speed),
+            lambda f, g: outlet_bc(local_nx, ny, nl, f, g, "right"),
+        ]
+
+    return (f, solid, 0.7), {}, boundaries
+
+def decomposed_rayleigh_bernard(scale):
+    nx, ny, nl = scaled(500, scale), scaled(100, scale), 9
+    T_hot = 1
+    T_cold = 0.75
+    f, g = rayleigh_bernard(nx, ny, nl, T_hot, T_cold)
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+
+    def boundaries(domain):
+        local_nx = nx if domain is None else domain.nx
+        return [lambda f, g: heat_flux_bc(f, g, local_nx, ny, T_cold, T_hot, None, None)]
+
+    return (f, solid, 0.8), dict(g=g, tau_g=0.6, alpha=0.4, T_ref=0.5 * (T_hot + T_cold), gravity=0.05, periodic="x"), boundaries
+
+def decomposed_rising_smoke(scale):
+    nx, ny, nl = scaled(200, scale), scaled(400, scale), 9
+    T_hot = 1
+    T_cold = 0.75
+    f, g = thermal_sim(nx, ny, nl, T_cold)
+    source_width = nx // 10
+
+    def boundaries(domain):
+        local_nx = nx if domain is None else domain.nx
+        source_start = nx // 2 - source_width // 2
+        source_end = nx // 2 + source_width // 2
+        if domain is not None:
+            source_start, source_end = domain.local_x(source_start), domain.local_x(source_end)
+        return [
+            lambda f, g: heat_flux_bc(f, g, local_nx, ny, T_cold, T_hot, source_start, source_end),
+            lambda f, g: outlet_bc(local_nx, ny, nl, f, g, "top"),
+        ]
+
+    return (f, np.zeros((nx, ny), dtype=bool), 0.8), dict(g=g, tau_g=0.6, alpha=0.4, T_ref=T_cold, gravity=0.005, periodic="x"), boundaries
+
+def decomposed_droplet(scale):
+    nx, ny, nl = scaled(400, scale), scaled(200, scale), 9
+    liquid_density = 2
+    gas_density = 0.1
+    density = droplet_collision(nx, ny, np.ones((nx, ny)) * gas_density, liquid_density, gas_density, nx // 2, int(ny * 0.7), nx // 8, ny // 4)
+    f = np.zeros((nx, ny, nl), dtype=np.float64)
+    for k in range(nl):
+        f[:, :, k] = w[k] * density
+    return (f, np.zeros((nx, ny), dtype=bool), 0.9), dict(gravity=0.0005, G=-5.5, periodic="x"), lambda domain: []
+
+def decomposed_cylinder_thermal_flow(scale):
+    nx, ny, nl = scaled(500, scale), scaled(100, scale), 9
+    wind_speed = 0.1
+    T_hot = 1
+    T_cold = 0
+    length = scaled(5, scale)
+    f, g = thermal_sim(nx, ny, nl, T_cold)
+    f = wind_tunnel(f, nx, ny, nl, wind_speed)
+    centers_x, centers_y = obstacle_grid(nx, ny, length, 2 * length + scaled(10, scale), False)
+    n_obstacles = len(centers_x)
+    solid = create_obstacle_mask(nx, ny, np.array(centers_x), np.array(centers_y), n_obstacles, "cylinder", length, np.zeros((nx, ny), dtype=bool))
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+    links = obstacle_links(solid, nx, ny, "cylinder", n_obstacles, centers_x, centers_y, length, T_hot, T_cold)
+    f, g = thermal_obstacle_flow(f, g, n_obstacles, centers_x, centers_y, length, nx, ny, nl, "cylinder", T_hot)
+
+    def boundaries(domain):
+        if domain is None:
+            local_nx, local_solid, local_links = nx, solid, links
+        else:
+            local_nx, local_solid, local_links = domain.nx, solid[domain.global_columns()], domain.local_links(links)
+        return [
+            lambda f, g: obstacle_link_bc(f, g, local_links),
+            lambda f, g: thermal_flow_inlet_bc(ny, nl, wind_speed, f, g, T_cold, local_solid),
+            lambda f, g: outlet_bc(local_nx, ny, nl, f, g, "right"),
+        ]
+
+    return (f, solid, 0.8), dict(g=g, tau_g=0.6, alpha=0.01, T_ref=T_cold, gravity=0.0), boundaries
+
+DECOMPOSED_CASES = {
+    "cylinder_flow": decomposed_cylinder_flow,
+    "rayleigh_bernard": decomposed_rayleigh_bernard,
+    "rising_smoke": decomposed_rising_smoke,
+    "droplet": decomposed_droplet,
+    "cylinder_thermal_flow": decomposed_cylinder_thermal_flow,
+}
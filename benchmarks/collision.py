@@ -0,0 +1,46 @@
+import argparse
+import time
+import numpy as np
+from benchmarks.cases import airfoil_flow, cylinder_flow
+from src.kernels import COLLISIONS
+from src.simulation import Simulation
+
+# The BGK, TRT and MRT collisions on the cylinder and airfoil examples: step throughput at the example's tau_f, and how
+# many steps each survives as tau_f approaches 0.5 (higher Re on the same grid) before the fields stop being finite
+parser = argparse.ArgumentParser(description="Compare the throughput and high-Re stability of the collision operators.")
+parser.add_argument("--scale", type=float, default=0.5)
+parser.add_argument("--steps", type=int, default=20)
+parser.add_argument("--stability-steps", type=int, default=3000)
+parser.add_argument("--taus", type=float, nargs="+", default=[0.53, 0.515, 0.508])
+args = parser.parse_args()
+
+CASES = {"cylinder_flow": cylinder_flow, "airfoil_flow": airfoil_flow}
+
+def build(case, tau_f, collision):
+    # The example with tau_f and the collision replaced, same populations and boundary conditions
+    sim = CASES[case](args.scale)
+    return Simulation(sim.f, sim.solid, tau_f, boundaries=sim.boundaries, collision=collision)
+
+def throughput(case, collision):
+    sim = build(case, 0.7, collision)
+    sim.step() # JIT warm-up
+    start = time.perf_counter()
+    sim.advance(args.steps)
+    return sim.nx * sim.ny * args.steps / (time.perf_counter() - start) / 1e6
+
+def survived(case, tau_f, collision):
+    # Steps until the velocity is no longer finite, checked every 100 steps, or None when the whole run is stable
+    sim = build(case, tau_f, collision)
+    while sim.time < args.stability_steps:
+        sim.advance(100)
+        if not np.isfinite(sim.v_x).all():
+            return sim.time
+    return None
+
+for case in CASES:
+    print(f"{case} at scale {args.scale}")
+    print(f"{'collision':>10} {'MLUPS':>8} " + " ".join(f"{f'tau {tau_f}':>11}" for tau_f in args.taus))
+    for collision in COLLISIONS:
+        steps = [survived(case, tau_f, collision) for tau_f in args.taus]
+        cells = " ".join(f"{'stable' if s is None else f'NaN @ {s}':>11}" for s in steps)
+        print(f"{collision:>10} {throughput(case, collision):>8.2f} {cells}")
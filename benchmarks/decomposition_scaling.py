@@ -0,0 +1,51 @@
+import argparse
+import os
+import time
+import numpy as np
+from src.simulation import Simulation
+from src.decomposition import DecomposedSimulation
+from benchmarks.cases import DECOMPOSED_CASES
+
+# Strong scaling of DecomposedSimulation over 1..N worker processes on a fixed grid, against the single-process
+# Simulation on the same configuration. Every decomposed run is also checked against the single-process result.
+# The single-process reference runs last: numba's TBB threading layer must not be started before the workers fork.
+parser = argparse.ArgumentParser(description="Measure the MLUPS of the multiprocess domain decomposition.")
+parser.add_argument("--case", default="rayleigh_bernard", choices=list(DECOMPOSED_CASES))
+parser.add_argument("--scale", type=float, default=2.0, help="grid size relative to the example")
+parser.add_argument("--processes", type=int, default=os.cpu_count(), help="largest number of processes")
+parser.add_argument("--threads", type=int, default=1, help="numba threads per process")
+parser.add_argument("--steps", type=int, default=100)
+args = parser.parse_args()
+
+def copies(positional, keywords):
+    # Simulation takes ownership of the populations it is given
+    copy = lambda value: value.copy(order="K") if isinstance(value, np.ndarray) else value
+    return [copy(value) for value in positional], {name: copy(value) for name, value in keywords.items()}
+
+def timed(sim, steps):
+    sim.advance(1) # JIT warm-up, and the first step of the workers
+    start = time.perf_counter()
+    sim.advance(steps)
+    return (time.perf_counter() - start) / steps
+
+positional, keywords, boundaries = DECOMPOSED_CASES[args.case](args.scale)
+nx, ny = positional[0].shape[:2]
+cells = nx * ny
+
+results = []
+for processes in range(1, args.processes + 1):
+    run_positional, run_keywords = copies(positional, keywords)
+    with DecomposedSimulation(*run_positional, boundaries=boundaries, processes=processes, threads=args.threads, **run_keywords) as sim:
+        step_time = timed(sim, args.steps)
+        results.append((processes, step_time, sim.f))
+
+reference = Simulation(*positional, boundaries=boundaries(None), **keywords)
+reference_time = timed(reference, args.steps)
+
+print(f"{args.case} {nx}x{ny}, {args.threads} thread(s) per process, {args.steps} steps")
+print(f"{'processes':>9} {'MLUPS':>8} {'speedup':>8} {'efficiency':>10} {'max |f - f_ref|':>16}")
+print(f"{'single':>9} {cells / reference_time / 1e6:>8.2f} {1.0:>8.2f} {'':>10} {'':>16}")
+for processes, step_time, f in results:
+    speedup = reference_time / step_time
+    print(f"{processes:>9} {cells / step_time / 1e6:>8.2f} {speedup:>8.2f} {100 * speedup / processes:>9.1f}% "
+          f"{np.abs(f - reference.f).max():>16.3g}")
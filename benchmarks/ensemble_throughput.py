@@ -0,0 +1,102 @@
+import argparse
+import time
+import numpy as np
+from src.init import *
+from src.boundaries import *
+from src.simulation import Simulation
+from src.ensemble import Ensemble
+from benchmarks.cases import scaled
+
+# Cases per hour of a parameter sweep on small grids, run one Simulation after the other against one batched Ensemble
+# of all the cases. Sweeps tau_f of the lid driven cavity, the wind speed of the flow past cylinders, alpha of
+# Rayleigh-Bernard convection and G of the droplet collision.
+parser = argparse.ArgumentParser(description="Compare sequential simulations with a batched ensemble for parameter sweeps.")
+parser.add_argument("--sweeps", nargs="+", default=["ldc_flow", "cylinder_flow", "rayleigh_bernard", "droplet"])
+parser.add_argument("--members", type=int, default=32)
+parser.add_argument("--scale", type=float, default=0.25, help="grid size relative to the example")
+parser.add_argument("--steps", type=int, default=100, help="steps per case")
+args = parser.parse_args()
+
+# Every sweep builds the Simulation of one case from the swept value
+def ldc_flow(scale, tau_f):
+    nx = ny = scaled(200, scale)
+    nl = 9
+    lid_speed = 0.2
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[0, :] = True
+    solid[nx-1, :] = True
+    solid[:, 0] = True
+    sim = Simulation(rest(nl, np.zeros((nx, ny, nl))), solid, tau_f, boundaries=[
+        lambda f, g: lid_bc(f, lid_speed * min(1.0, sim.time / 100), nx, ny),
+    ])
+    return sim
+
+def cylinder_flow(scale, wind_speed):
+    nx, ny, nl = scaled(500, scale), scaled(250, scale), 9
+    radius = scaled(10, scale)
+    f = wind_tunnel(np.zeros((nx, ny, nl)), nx, ny, nl, wind_speed)
+    solid = create_obstacle_mask(nx, ny, np.array([nx // 4]), np.array([ny // 2]), 1, "cylinder", radius, np.zeros((nx, ny), dtype=bool))
+    return Simulation(f, solid, 0.7, boundaries=[
+        lambda f, g: wind_tunnel_inlet_bc(f, nx, ny, wind_speed),
+        lambda f, g: outlet_bc(nx, ny, nl, f, g, "right"),
+    ])
+
+def rayleigh_bernard_case(scale, alpha):
+    nx, ny, nl = scaled(500, scale), scaled(100, scale), 9
+    T_hot = 1
+    T_cold = 0.75
+    f, g = rayleigh_bernard(nx, ny, nl, T_hot, T_cold)
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+    return Simulation(f, solid, 0.8, g=g, tau_g=0.6, alpha=alpha, T_ref=0.5 * (T_hot + T_cold), gravity=0.05, periodic="x", boundaries=[
+        lambda f, g: heat_flux_bc(f, g, nx, ny, T_cold, T_hot, None, None),
+    ])
+
+def droplet(scale, G):
+    nx, ny, nl = scaled(400, scale), scaled(200, scale), 9
+    density = droplet_collision(nx, ny, np.ones((nx, ny)) * 0.1, 2, 0.1, nx // 2, int(ny * 0.7), nx // 8, ny // 4)
+    f = np.zeros((nx, ny, nl), dtype=np.float64)
+    for k in range(nl):
+        f[:, :, k] = w[k] * density
+    return Simulation(f, np.zeros((nx, ny), dtype=bool), 0.9, gravity=0.0005, G=G, periodic="x")
+
+SWEEPS = {
+    "ldc_flow": (ldc_flow, (0.55, 0.8)),
+    "cylinder_flow": (cylinder_flow, (0.05, 0.15)),
+    "rayleigh_bernard": (rayleigh_bernard_case, (0.2, 0.6)),
+    "droplet": (droplet, (-5.0, -6.0)),
+}
+
+def timed(sim, steps):
+    sim.advance(1) # JIT warm-up
+    start = time.perf_counter()
+    sim.advance(steps)
+    return time.perf_counter() - start
+
+print(f"{args.members} cases per sweep, {args.steps} steps per case")
+print(f"{'sweep':>17} {'grid':>9} {'sequential cases/h':>19} {'ensemble cases/h':>17} {'speedup':>8} {'max deviation':>14}")
+for name in args.sweeps:
+    build, (low, high) = SWEEPS[name]
+    values = np.linspace(low, high, args.members)
+
+    # The first case compiles the kernels, the rest run warm like in a long sweep
+    sequential_time = 0.0
+    sequential = []
+    for index, value in enumerate(values):
+        np.random.seed(index) # same perturbed initial state in both runs
+        sim = build(args.scale, value)
+        sequential_time += timed(sim, args.steps)
+        sequential.append(sim)
+
+    members = []
+    for index, value in enumerate(values):
+        np.random.seed(index)
+        members.append(build(args.scale, value))
+    ensemble = Ensemble.from_simulations(members)
+    ensemble_time = timed(ensemble, args.steps)
+
+    deviation = max(np.abs(ensemble.f[m] - sim.f).max() for m, sim in enumerate(sequential))
+    nx, ny = sequential[0].nx, sequential[0].ny
+    print(f"{name:>17} {f'{nx}x{ny}':>9} {3600 * args.members / sequential_time:>19.0f} {3600 * args.members / ensemble_time:>17.0f} "
+          f"{sequential_time / ensemble_time:>8.2f} {deviation:>14.3g}")
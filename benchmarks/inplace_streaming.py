@@ -0,0 +1,48 @@
+import argparse
+import time
+import numpy as np
+from src.init import thermal_sim
+from src.inplace import InPlaceSimulation
+from src.simulation import Simulation
+
+# Ping-pong buffers (Simulation) against AA-pattern in-place streaming (InPlaceSimulation): step throughput and
+# the memory held by the populations, for the isothermal and thermal steps in both layouts
+parser = argparse.ArgumentParser(description="Compare ping-pong and in-place (AA pattern) streaming.")
+parser.add_argument("--nx", type=int, default=1000)
+parser.add_argument("--ny", type=int, default=500)
+parser.add_argument("--steps", type=int, default=20)
+args = parser.parse_args()
+
+nx = args.nx
+ny = args.ny
+nl = 9
+tau_f = 0.8
+tau_g = 0.6
+gravity = 0.05
+alpha = 0.4
+T_ref = 0.75
+
+solid = np.zeros((nx, ny), dtype=bool)
+
+def measure(cls, layout, thermal):
+    f, g = thermal_sim(nx, ny, nl, T_ref, layout)
+    if thermal:
+        sim = cls(f, solid, tau_f, g=g, tau_g=tau_g, alpha=alpha, T_ref=T_ref, gravity=gravity, periodic="x")
+    else:
+        sim = cls(f, solid, tau_f, periodic="x")
+    sim.advance(2) # JIT warm-up of both in-place kernels
+
+    start = time.perf_counter()
+    sim.advance(args.steps)
+    elapsed = (time.perf_counter() - start) / args.steps
+    buffers = [getattr(sim, name, None) for name in ("f", "f_new", "g", "g_new")]
+    return elapsed, sum(buffer.nbytes for buffer in buffers if buffer is not None)
+
+print(f"{nx}x{ny} lattice, {args.steps} steps per case")
+print(f"{'case':>16} {'ping-pong MLUPS':>16} {'in-place MLUPS':>15} {'speedup':>8} {'ping-pong MB':>13} {'in-place MB':>12}")
+for layout in ("aos", "soa"):
+    for name, thermal in (("isothermal", False), ("thermal", True)):
+        dense_time, dense_bytes = measure(Simulation, layout, thermal)
+        inplace_time, inplace_bytes = measure(InPlaceSimulation, layout, thermal)
+        print(f"{name + ' ' + layout:>16} {nx * ny / dense_time / 1e6:>16.2f} {nx * ny / inplace_time / 1e6:>15.2f} "
+              f"{dense_time / inplace_time:>8.2f} {dense_bytes / 1e6:>13.1f} {inplace_bytes / 1e6:>12.1f}")
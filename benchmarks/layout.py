@@ -0,0 +1,43 @@
+import argparse
+import time
+import numpy as np
+from src.init import thermal_sim
+from src.simulation import Simulation
+
+# Step throughput with the populations stored as (nx, ny, nl) "aos" against (nl, nx, ny) "soa",
+# for the isothermal and thermal steps
+parser = argparse.ArgumentParser(description="Compare fused step throughput of the AoS and SoA population layouts.")
+parser.add_argument("--nx", type=int, default=1000)
+parser.add_argument("--ny", type=int, default=500)
+parser.add_argument("--steps", type=int, default=20)
+args = parser.parse_args()
+
+nx = args.nx
+ny = args.ny
+nl = 9
+tau_f = 0.8
+tau_g = 0.6
+gravity = 0.05
+alpha = 0.4
+T_ref = 0.75
+
+solid = np.zeros((nx, ny), dtype=bool)
+
+def measure(layout, thermal):
+    f, g = thermal_sim(nx, ny, nl, T_ref, layout)
+    if thermal:
+        sim = Simulation(f, solid, tau_f, g=g, tau_g=tau_g, alpha=alpha, T_ref=T_ref, gravity=gravity, periodic="x")
+    else:
+        sim = Simulation(f, solid, tau_f, periodic="x")
+    sim.step() # JIT warm-up
+
+    start = time.perf_counter()
+    sim.advance(args.steps)
+    return (time.perf_counter() - start) / args.steps
+
+print(f"Fused step on a {nx}x{ny} lattice, {args.steps} steps per case")
+print(f"{'case':>12} {'AoS MLUPS':>10} {'SoA MLUPS':>10} {'speedup':>8}")
+for name, thermal in (("isothermal", False), ("thermal", True)):
+    aos_time = measure("aos", thermal)
+    soa_time = measure("soa", thermal)
+    print(f"{name:>12} {nx * ny / aos_time / 1e6:>10.2f} {nx * ny / soa_time / 1e6:>10.2f} {aos_time / soa_time:>8.2f}")
@@ -0,0 +1,68 @@
+import argparse
+import shutil
+import sys
+import tempfile
+import numpy as np
+from mpi4py import MPI
+from src.layout import to_soa
+from src.simulation import Simulation
+from src.distributed import MPISimulation, ParallelSnapshotWriter
+from benchmarks.cases import DECOMPOSED_CASES
+
+# Runs the decomposed configurations on the ranks of mpirun and checks them against a single-process Simulation,
+#     mpirun -n 4 python3 -m benchmarks.mpi_check
+# The MPI fields are written with ParallelSnapshotWriter and read back from the .npy files on rank 0, so the
+# parallel output is checked as well. Exits with status 1 if any field differs.
+parser = argparse.ArgumentParser(description="Check the MPI solver against the single-process one.")
+parser.add_argument("--cases", nargs="+", default=list(DECOMPOSED_CASES), choices=list(DECOMPOSED_CASES))
+parser.add_argument("--layouts", nargs="+", default=["aos", "soa"], choices=["aos", "soa"])
+parser.add_argument("--scale", type=float, default=0.25, help="grid size relative to the example")
+parser.add_argument("--steps", type=int, default=50)
+args = parser.parse_args()
+
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+directory = comm.bcast(tempfile.mkdtemp() if rank == 0 else None)
+fields = ("f", "g", "density", "v_x", "v_y", "T")
+
+def build(name, layout):
+    # Some initial conditions are randomly perturbed, every rank and the reference must build the same one
+    np.random.seed(0)
+    positional, keywords, boundaries = DECOMPOSED_CASES[name](args.scale)
+    positional, keywords = list(positional), dict(keywords)
+    if layout == "soa":
+        positional[0] = to_soa(positional[0])
+        if keywords.get("g") is not None:
+            keywords["g"] = to_soa(keywords["g"])
+    return positional, keywords, boundaries
+
+failed = False
+if rank == 0:
+    print(f"{comm.Get_size()} ranks, {args.steps} steps")
+    print(f"{'case':>22} {'layout':>6} {'max deviation':>14}")
+for name in args.cases:
+    for layout in args.layouts:
+        positional, keywords, boundaries = build(name, layout)
+        sim = MPISimulation(*positional, boundaries=boundaries, **keywords)
+        sim.advance(args.steps)
+        prefix = f"{name}_{layout}"
+        ParallelSnapshotWriter(sim, directory, fields=fields, prefix=prefix).capture()
+
+        if rank == 0:
+            positional, keywords, boundaries = build(name, layout)
+            reference = Simulation(*positional, boundaries=boundaries(None), **keywords)
+            reference.advance(args.steps)
+            deviation = 0.0
+            for field in fields:
+                expected = getattr(reference, field)
+                if expected is not None:
+                    written = np.load(f"{directory}/{prefix}_{args.steps:08d}_{field}.npy")
+                    deviation = max(deviation, np.abs(written - expected).max())
+            failed = failed or deviation != 0.0
+            print(f"{name:>22} {layout:>6} {deviation:>14.3g}")
+
+failed = comm.bcast(failed)
+if rank == 0:
+    shutil.rmtree(directory)
+    print("FAILED" if failed else "OK")
+sys.exit(1 if failed else 0)
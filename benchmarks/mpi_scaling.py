@@ -0,0 +1,47 @@
+import argparse
+import time
+from mpi4py import MPI
+from src.distributed import MPISimulation
+from benchmarks.cases import DECOMPOSED_CASES
+
+# Strong and weak scaling of MPISimulation, run under mpirun with the largest number of ranks to measure,
+#     mpirun -n 8 python3 -m benchmarks.mpi_scaling --mode weak
+# COMM_WORLD is split to run on 1, 2, ... ranks in turn. Strong scaling keeps the grid of --scale fixed, weak scaling
+# grows it with the number of ranks so every rank keeps the cells of one --scale grid.
+parser = argparse.ArgumentParser(description="Measure the MLUPS of the MPI solver from 1 to N ranks.")
+parser.add_argument("--case", default="rayleigh_bernard", choices=list(DECOMPOSED_CASES))
+parser.add_argument("--mode", default="strong", choices=["strong", "weak"])
+parser.add_argument("--scale", type=float, default=2.0, help="grid size relative to the example (per rank for weak scaling)")
+parser.add_argument("--steps", type=int, default=100)
+args = parser.parse_args()
+
+world = MPI.COMM_WORLD
+rank = world.Get_rank()
+
+if rank == 0:
+    print(f"{args.mode} scaling of {args.case}, {args.steps} steps")
+    print(f"{'ranks':>5} {'grid':>11} {'MLUPS':>8} {'MLUPS/rank':>10} {'efficiency':>10}")
+
+baseline = None
+for ranks in range(1, world.Get_size() + 1):
+    comm = world.Split(0 if rank < ranks else MPI.UNDEFINED, rank)
+    if comm != MPI.COMM_NULL:
+        # Weak scaling doubles the cells every time the ranks double, the grid keeps the aspect ratio of the example
+        scale = args.scale * (ranks ** 0.5 if args.mode == "weak" else 1.0)
+        positional, keywords, boundaries = DECOMPOSED_CASES[args.case](scale)
+        nx, ny = positional[0].shape[:2]
+        sim = MPISimulation(*positional, boundaries=boundaries, comm=comm, **keywords)
+        sim.advance(1) # JIT warm-up
+        comm.Barrier()
+        start = time.perf_counter()
+        sim.advance(args.steps)
+        comm.Barrier()
+        step_time = (time.perf_counter() - start) / args.steps
+        mlups = nx * ny / step_time / 1e6
+        if rank == 0:
+            baseline = baseline or mlups
+            # Strong scaling efficiency compares the speedup with the rank count, weak scaling the throughput per rank
+            efficiency = mlups / (baseline * ranks)
+            print(f"{ranks:>5} {f'{nx}x{ny}':>11} {mlups:>8.2f} {mlups / ranks:>10.2f} {100 * efficiency:>9.1f}%")
+        comm.Free()
+    world.Barrier()
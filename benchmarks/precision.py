@@ -0,0 +1,52 @@
+import argparse
+import time
+import numpy as np
+from benchmarks.cases import ldc_flow, rayleigh_bernard_case
+
+# float32 storage (Simulation(..., precision="float32")) against float64 on the lid-driven cavity and Rayleigh-Benard
+# examples: the error of the velocity and temperature fields after a run, relative to the largest float64 value, and
+# the step throughput and memory of the populations and fields. Both runs of a case start from the same random seed.
+parser = argparse.ArgumentParser(description="Compare the accuracy, throughput and memory of float32 and float64 storage.")
+parser.add_argument("--scale", type=float, default=1.0)
+parser.add_argument("--steps", type=int, default=2000)
+parser.add_argument("--timing-steps", type=int, default=50)
+args = parser.parse_args()
+
+CASES = {"ldc_flow": ldc_flow, "rayleigh_bernard": rayleigh_bernard_case}
+
+def build(case, precision):
+    np.random.seed(0)
+    return CASES[case](args.scale, precision=precision)
+
+def footprint(sim):
+    arrays = (sim.f, sim.f_new, sim.g, sim.g_new, sim.density, sim.v_x, sim.v_y, sim.T)
+    return sum(array.nbytes for array in arrays if array is not None)
+
+def mlups(sim):
+    sim.step() # JIT warm-up
+    start = time.perf_counter()
+    sim.advance(args.timing_steps)
+    return sim.nx * sim.ny * args.timing_steps / (time.perf_counter() - start) / 1e6
+
+def relative_error(field, reference):
+    if reference is None:
+        return None
+    return np.abs(field.astype(np.float64) - reference).max() / np.abs(reference).max()
+
+print(f"scale {args.scale}, errors after {args.steps} steps")
+print(f"{'case':>18} {'precision':>10} {'MLUPS':>8} {'MB':>8} {'velocity error':>15} {'T error':>10}")
+for case in CASES:
+    reference = build(case, "float64")
+    reference.advance(args.steps)
+    single = build(case, "float32")
+    single.advance(args.steps)
+    speed = np.hypot(reference.v_x, reference.v_y)
+    errors = {
+        "float64": (0.0, 0.0 if reference.T is not None else None),
+        "float32": (relative_error(np.hypot(single.v_x, single.v_y), speed), relative_error(single.T, reference.T)),
+    }
+    for precision in ("float64", "float32"):
+        sim = build(case, precision)
+        velocity_error, T_error = errors[precision]
+        T_column = f"{T_error:>10.2e}" if T_error is not None else f"{'-':>10}"
+        print(f"{case:>18} {precision:>10} {mlups(sim):>8.2f} {footprint(sim) / 1e6:>8.1f} {velocity_error:>15.2e} {T_column}")
@@ -0,0 +1,71 @@
+import argparse
+import time
+import numpy as np
+from src.boundaries import outlet_bc, wind_tunnel_inlet_bc
+from src.geometry import Circle
+from src.init import wind_tunnel
+from src.refinement import Block, RefinedSimulation
+from src.simulation import Simulation
+
+# Flow past a cylinder over the same physical time on three lattices: uniform coarse, uniform at twice the resolution,
+# and coarse with a refined block around the cylinder and its wake. Reports the cell updates and wall time per coarse
+# step and how far the wake velocity of each run is from the uniform fine one.
+parser = argparse.ArgumentParser(description="Compare local grid refinement against uniform coarse and fine lattices.")
+parser.add_argument("--nx", type=int, default=400)
+parser.add_argument("--ny", type=int, default=160)
+parser.add_argument("--radius", type=float, default=6)
+parser.add_argument("--steps", type=int, default=1000, help="coarse steps")
+parser.add_argument("--tau", type=float, default=0.56, help="coarse tau_f")
+args = parser.parse_args()
+
+nx, ny, nl = args.nx, args.ny, 9
+wind_speed = 0.05
+center_x, center_y = nx // 4, ny // 2
+
+def cylinder_case(scale, tau_f):
+    # Uniform lattice at scale times the coarse resolution, same physical setup
+    sx, sy = scale * (nx - 1) + 1, scale * (ny - 1) + 1
+    geometry = Circle(scale * center_x, scale * center_y, scale * args.radius)
+    f = wind_tunnel(np.zeros((sx, sy, nl)), sx, sy, nl, wind_speed)
+    return Simulation(f, geometry.rasterize(sx, sy), tau_f, boundaries=[
+        lambda f, g: wind_tunnel_inlet_bc(f, sx, sy, wind_speed),
+        lambda f, g: outlet_bc(sx, sy, nl, f, g, "right"),
+    ])
+
+def refined_case():
+    geometry = Circle(center_x, center_y, args.radius)
+    f = wind_tunnel(np.zeros((nx, ny, nl)), nx, ny, nl, wind_speed)
+    # From 3 radii upstream to 25 radii downstream, 4 radii either side
+    r = int(np.ceil(args.radius))
+    block = Block(center_x - 3 * r, center_y - 4 * r, center_x + 25 * r, center_y + 4 * r)
+    return RefinedSimulation(f, geometry.rasterize(nx, ny), args.tau, blocks=[block], geometry=geometry, boundaries=[
+        lambda f, g: wind_tunnel_inlet_bc(f, nx, ny, wind_speed),
+        lambda f, g: outlet_bc(nx, ny, nl, f, g, "right"),
+    ])
+
+def timed(sim, steps):
+    sim.advance(2) # JIT warm-up, part of the run
+    start = time.perf_counter()
+    sim.advance(steps - 2)
+    return (time.perf_counter() - start) / (steps - 2)
+
+fine_tau = 0.5 + 2 * (args.tau - 0.5)
+runs = {
+    "coarse": (cylinder_case(1, args.tau), 1),
+    "fine": (cylinder_case(2, fine_tau), 2),
+    "refined": (refined_case(), 1),
+}
+results = {}
+for name, (sim, substeps) in runs.items():
+    step_time = timed(sim, args.steps * substeps) * substeps # per coarse step
+    updates = sim.cell_updates() if hasattr(sim, "cell_updates") else sim.nx * sim.ny * substeps
+    # Streamwise velocity on the coarse nodes of a line 5 radii behind the cylinder
+    x = center_x + int(5 * args.radius)
+    v_x = sim.v_x[substeps * x, ::substeps]
+    results[name] = (updates, step_time, v_x)
+
+reference = results["fine"][2]
+print(f"{nx}x{ny} coarse lattice, cylinder radius {args.radius}, {args.steps} coarse steps, tau {args.tau}")
+print(f"{'lattice':>8} {'updates/step':>13} {'ms/step':>8} {'wake error':>11}")
+for name, (updates, step_time, v_x) in results.items():
+    print(f"{name:>8} {updates:>13} {step_time * 1e3:>8.2f} {np.abs(v_x - reference).max() / wind_speed:>11.3%}")
@@ -0,0 +1,41 @@
+import argparse
+import time
+import numpy as np
+from src.init import *
+from src.geometry import *
+
+# Setup time of the initializers and the geometry rasterizer at production grid sizes: a wind tunnel with a grid of
+# cylinders (mask, populations and heated obstacles), Rayleigh-Bernard fields, and a mixed geometry of rotated boxes
+# and airfoils
+parser = argparse.ArgumentParser(description="Time the initial condition and geometry builders.")
+parser.add_argument("--nx", type=int, default=4000)
+parser.add_argument("--ny", type=int, default=2000)
+parser.add_argument("--obstacles", type=int, default=400, help="number of cylinders, on a square grid")
+args = parser.parse_args()
+
+nx, ny, nl = args.nx, args.ny, 9
+side = int(np.ceil(np.sqrt(args.obstacles)))
+spacing = min(nx // 2, ny) // (side + 1)
+radius = max(1, spacing // 4)
+centers = [(nx // 4 + ix * spacing, (iy + 1) * spacing) for ix in range(side) for iy in range(side)][:args.obstacles]
+centers_x = np.array([x for x, _ in centers])
+centers_y = np.array([y for _, y in centers])
+
+def timed(name, build):
+    start = time.perf_counter()
+    build()
+    print(f"{name:>24} {time.perf_counter() - start:>8.3f} s")
+
+print(f"{nx}x{ny}, {len(centers)} cylinders of radius {radius}")
+timed("create_obstacle_mask", lambda: create_obstacle_mask(nx, ny, centers_x, centers_y, len(centers), "cylinder", radius, np.zeros((nx, ny), dtype=bool)))
+timed("thermal_sim", lambda: thermal_sim(nx, ny, nl, 0))
+timed("wind_tunnel", lambda: wind_tunnel(np.zeros((nx, ny, nl)), nx, ny, nl, 0.1))
+f, g = thermal_sim(nx, ny, nl, 0)
+timed("thermal_obstacle_flow", lambda: thermal_obstacle_flow(f, g, len(centers), centers_x, centers_y, radius, nx, ny, nl, "cylinder", 1))
+timed("thermal_bubble", lambda: thermal_bubble(f, g, nx, ny, nl, nx // 2, ny // 4, ny // 10, 1))
+timed("rayleigh_bernard", lambda: rayleigh_bernard(nx, ny, nl, 1, 0.75))
+
+geometry = Geometry()
+for b, (x, y) in enumerate(centers):
+    geometry = geometry | (Box(x, y, 2 * radius, radius, angle=15 * b) if b % 2 else Airfoil(x - radius, y, 2 * radius, angle=5))
+timed("boxes and airfoils", lambda: geometry.rasterize(nx, ny))
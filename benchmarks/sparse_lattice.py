@@ -0,0 +1,46 @@
+import argparse
+import time
+import numpy as np
+from src.init import create_obstacle_mask, wind_tunnel
+from src.simulation import Simulation
+from src.sparse import SparseSimulation
+
+# Dense against sparse storage on cylinder arrays of increasing solid fraction: step time, population memory and
+# the work-normalized throughput (updates of all nx * ny cells per second, so the sparse gain shows directly)
+parser = argparse.ArgumentParser(description="Compare dense and sparse (fluid cells only) lattice storage.")
+parser.add_argument("--nx", type=int, default=1000)
+parser.add_argument("--ny", type=int, default=500)
+parser.add_argument("--steps", type=int, default=20)
+parser.add_argument("--fractions", type=float, nargs="+", default=[0.0, 0.25, 0.5, 0.7])
+args = parser.parse_args()
+
+nx, ny, nl = args.nx, args.ny, 9
+tau_f = 0.7
+spacing = 25
+
+def cylinder_array(fraction):
+    # Square array of cylinders covering roughly fraction of the lattice
+    radius = int(round(spacing * np.sqrt(fraction / np.pi)))
+    centers = np.mgrid[spacing // 2:nx:spacing, spacing // 2:ny:spacing].reshape(2, -1)
+    return create_obstacle_mask(nx, ny, centers[0], centers[1], centers.shape[1], "cylinder", radius, np.zeros((nx, ny), dtype=bool)) if radius > 0 else np.zeros((nx, ny), dtype=bool)
+
+def timed(sim):
+    sim.step() # JIT warm-up
+    start = time.perf_counter()
+    sim.advance(args.steps)
+    return (time.perf_counter() - start) / args.steps
+
+f = wind_tunnel(np.zeros((nx, ny, nl)), nx, ny, nl, 0.05)
+print(f"{nx}x{ny} lattice, periodic cylinder arrays, {args.steps} steps")
+print(f"{'solid':>6} {'dense MLUPS':>12} {'sparse MLUPS':>13} {'speedup':>8} {'dense MB':>9} {'sparse MB':>10}")
+for fraction in args.fractions:
+    solid = cylinder_array(fraction)
+    dense = Simulation(f.copy(), solid, tau_f, periodic="xy")
+    sparse = SparseSimulation(f, solid, tau_f, periodic="xy")
+    dense_time = timed(dense)
+    sparse_time = timed(sparse)
+    # Both population buffers, plus the neighbour tables of the sparse lattice
+    dense_bytes = dense.f.nbytes + dense.f_new.nbytes
+    sparse_bytes = sparse.f.nbytes + sparse.f_new.nbytes + sparse.lattice.nbytes()
+    print(f"{solid.mean():>6.2f} {nx * ny / dense_time / 1e6:>12.2f} {nx * ny / sparse_time / 1e6:>13.2f} "
+          f"{dense_time / sparse_time:>8.2f} {dense_bytes / 1e6:>9.1f} {sparse_bytes / 1e6:>10.1f}")
@@ -0,0 +1,77 @@
+import argparse
+import time
+import numpy as np
+from src.boundaries import lid_bc, outlet_bc, wind_tunnel_inlet_bc
+from src.geometry import Circle
+from src.init import rest, wind_tunnel
+from src.simulation import Simulation
+from src.steady import SpinUp, run_steady
+
+# Steady-state runs (steady.py) of a lid-driven cavity and a low-Re cylinder at a low lattice velocity: steps and time
+# to reach the tolerance, without and with a spin-up at factor times the velocity, and the difference of the two
+# steady velocity fields relative to the largest velocity
+parser = argparse.ArgumentParser(description="Time steady-state convergence with and without spin-up acceleration.")
+parser.add_argument("--n", type=int, default=100, help="cavity size and cylinder channel height")
+parser.add_argument("--speed", type=float, default=0.05, help="lid and inlet velocity")
+parser.add_argument("--factor", type=float, default=3.0, help="spin-up velocity factor")
+parser.add_argument("--tolerance", type=float, default=1e-6)
+parser.add_argument("--check-every", type=int, default=100)
+parser.add_argument("--max-steps", type=int, default=500_000)
+args = parser.parse_args()
+
+n = args.n
+nl = 9
+
+def cavity(speed):
+    # Re 100 on the lid
+    tau_f = 0.5 + 3 * args.speed * n / 100
+    solid = np.zeros((n, n), dtype=bool)
+    solid[0, :] = True
+    solid[n-1, :] = True
+    solid[:, 0] = True
+    return Simulation(rest(nl, np.zeros((n, n, nl))), solid, tau_f, boundaries=cavity_boundaries(speed))
+
+def cavity_boundaries(speed):
+    return [lambda f, g: lid_bc(f, speed, n, n)]
+
+def cylinder(speed):
+    # Re 20 on the diameter, a quarter of the channel height
+    nx = 4 * n
+    radius = n / 8
+    tau_f = 0.5 + 3 * args.speed * 2 * radius / 20
+    solid = Circle(nx / 4, n / 2, radius).rasterize(nx, n)
+    f = wind_tunnel(np.zeros((nx, n, nl)), nx, n, nl, speed)
+    return Simulation(f, solid, tau_f, boundaries=cylinder_boundaries(speed))
+
+def cylinder_boundaries(speed):
+    nx = 4 * n
+    return [
+        lambda f, g: wind_tunnel_inlet_bc(f, nx, n, speed),
+        lambda f, g: outlet_bc(nx, n, nl, f, g, "right"),
+    ]
+
+CASES = {"cavity": (cavity, cavity_boundaries), "cylinder": (cylinder, cylinder_boundaries)}
+
+def converge(case, spin_up):
+    build, boundaries = CASES[case]
+    run_steady(build(args.speed), check_every=1, max_steps=2) # JIT warm-up, with and without the residual
+    sim = build(args.speed)
+    start = time.perf_counter()
+    result = run_steady(sim, args.tolerance, args.check_every, args.max_steps,
+                        spin_up=SpinUp(args.factor, boundaries(args.factor * args.speed)) if spin_up else None)
+    return sim, result, time.perf_counter() - start
+
+print(f"n {n}, velocity {args.speed}, tolerance {args.tolerance}, spin-up factor {args.factor}")
+print(f"{'case':>10} {'spin-up':>8} {'converged':>10} {'steps':>8} {'spin-up steps':>14} {'time [s]':>9} {'difference':>11}")
+for case in CASES:
+    reference = None
+    for spin_up in (False, True):
+        sim, result, elapsed = converge(case, spin_up)
+        if reference is None:
+            reference = sim
+            difference = 0.0
+        else:
+            speed = np.hypot(reference.v_x, reference.v_y)
+            difference = np.hypot(sim.v_x - reference.v_x, sim.v_y - reference.v_y).max() / speed.max()
+        print(f"{case:>10} {'yes' if spin_up else 'no':>8} {str(result.converged):>10} {result.steps:>8} "
+              f"{result.spin_up_steps:>14} {elapsed:>9.2f} {difference:>11.2e}")
@@ -0,0 +1,68 @@
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from benchmarks.cases import rayleigh_bernard_case
+from src.runner import run
+from src.snapshots import SnapshotWriter
+from src.store import Store
+
+# Snapshot output of the Rayleigh-Benard example as one .npz per snapshot against the chunked store (store.py),
+# lossless and quantized: bytes on disk, run time with output, the largest error of T against the float64 fields, and
+# the time to read the T history of one node back, which the store serves from one column of chunks
+parser = argparse.ArgumentParser(description="Compare snapshot files with the chunked compressed store.")
+parser.add_argument("--scale", type=float, default=1.0)
+parser.add_argument("--steps", type=int, default=2000)
+parser.add_argument("--output-every", type=int, default=50)
+args = parser.parse_args()
+
+CONFIGURATIONS = (
+    ("npz", {"format": "npz"}),
+    ("store float64", {"format": "store"}),
+    ("store float32", {"format": "store", "dtype": "float32"}),
+    ("store 16 bit", {"format": "store", "quantize": 16}),
+    ("store 8 bit", {"format": "store", "quantize": 8}),
+)
+
+def disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+def history(directory, format, i, j):
+    # T at node (i, j) over every snapshot
+    if format == "npz":
+        return np.array([np.load(path)["T"][i, j] for path in sorted(glob.glob(os.path.join(directory, "*.npz")))])
+    return Store(directory)["T"][:, i, j]
+
+reference = []
+def keep(snap):
+    reference.append(snap["T"])
+
+root = tempfile.mkdtemp()
+print(f"scale {args.scale}, {args.steps} steps, output every {args.output_every}")
+print(f"{'output':>14} {'MB':>8} {'raw MB':>8} {'run [s]':>8} {'T error':>9} {'history [ms]':>13}")
+try:
+    for name, options in CONFIGURATIONS:
+        np.random.seed(0)
+        sim = rayleigh_bernard_case(args.scale)
+        sim.step() # JIT warm-up
+        directory = os.path.join(root, name.replace(" ", "_"))
+        callbacks = [keep] if not reference else []
+        start = time.perf_counter()
+        with SnapshotWriter(directory, policy="block", **options) as writer:
+            run(sim, args.steps, output_every=args.output_every, callbacks=callbacks + [writer])
+        elapsed = time.perf_counter() - start
+
+        raw = len(reference) * sum(getattr(sim, field).nbytes for field in writer.fields if getattr(sim, field) is not None)
+        i, j = sim.nx // 2, sim.ny // 2
+        start = time.perf_counter()
+        probe = history(directory, options["format"], i, j)
+        read = time.perf_counter() - start
+        error = np.abs(probe - np.array([T[i, j] for T in reference])).max()
+        if options["format"] == "store":
+            error = max(error, np.abs(Store(directory)["T"][:] - np.array(reference)).max())
+        print(f"{name:>14} {disk_usage(directory) / 1e6:>8.2f} {raw / 1e6:>8.2f} {elapsed:>8.2f} {error:>9.2e} {read * 1e3:>13.2f}")
+finally:
+    shutil.rmtree(root)
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import numba
+import numpy as np
+from src.kernels import *
+from src.parallel import max_threads
+from src.profiling import profile
+from benchmarks.cases import CASES
+
+# Throughput of every example configuration at several grid sizes and thread counts. For each run it reports
+#   - the JIT compile time, i.e. how much longer the first step took than a steady state step
+#   - the fused step MLUPS (what Simulation runs) including the boundary conditions
+#   - a per-phase breakdown from the unfused kernel chain: macroscopic, Shan-Chen force, collision, streaming, BCs
+parser = argparse.ArgumentParser(description="Benchmark every example configuration and report MLUPS per phase.")
+parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+parser.add_argument("--scales", nargs="+", type=float, default=[0.5, 1.0, 2.0], help="grid size relative to the example")
+parser.add_argument("--threads", nargs="+", type=int, default=sorted({1, max_threads()}))
+parser.add_argument("--steps", type=int, default=20)
+parser.add_argument("--json", help="write the results to this file")
+args = parser.parse_args()
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def fused_time(sim, steps):
+    start = time.perf_counter()
+    sim.advance(steps)
+    return (time.perf_counter() - start) / steps
+
+def phase_times(sim, steps):
+    # Per-phase mean times of the unfused kernel chain, see src/profiling.py
+    with profile(sim, split_phases=True):
+        sim.step() # the first step compiles the chain
+    with profile(sim, split_phases=True) as profiler:
+        sim.advance(steps)
+
+    measured = profiler.summary()["phases"]
+    phases = {name: measured[name]["mean_s"] if name in measured else 0.0 for name in ("macroscopic", "shan_chen", "collision", "streaming")}
+    phases["boundaries"] = sum(phase["mean_s"] for name, phase in measured.items() if name.startswith("boundary_"))
+    return phases
+
+results = []
+print(f"{'case':>22} {'grid':>10} {'threads':>7} {'JIT [s]':>8} {'MLUPS':>8} {'chain MLUPS':>11}  phase shares (macro/SC/coll/stream/BC)")
+for name in args.cases:
+    for scale in args.scales:
+        sim = CASES[name](scale)
+        cells = sim.nx * sim.ny
+        for n_threads in args.threads:
+            set_num_threads(n_threads)
+
+            start = time.perf_counter()
+            sim.step()
+            first_step = time.perf_counter() - start
+            step_time = fused_time(sim, args.steps)
+            phases = phase_times(sim, args.steps)
+            chain_time = sum(phases.values())
+
+            record = {
+                "case": name,
+                "nx": sim.nx,
+                "ny": sim.ny,
+                "threads": n_threads,
+                "steps": args.steps,
+                "jit_s": max(0.0, first_step - step_time),
+                "step_s": step_time,
+                "mlups": cells / step_time / 1e6,
+                "chain_step_s": chain_time,
+                "chain_mlups": cells / chain_time / 1e6,
+                "phases_s": phases,
+            }
+            results.append(record)
+            shares = "/".join(f"{100 * t / chain_time:.0f}" for t in phases.values())
+            print(f"{name:>22} {f'{sim.nx}x{sim.ny}':>10} {n_threads:>7} {record['jit_s']:>8.2f} {record['mlups']:>8.2f} {record['chain_mlups']:>11.2f}  {shares}")
+
+if args.json:
+    report = {
+        "commit": git_commit(),
+        "numba": numba.__version__,
+        "numpy": np.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.json, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.json}")
@@ -0,0 +1,47 @@
+import argparse
+import time
+import numpy as np
+from src.init import rayleigh_bernard
+from src.kernels import *
+from src.parallel import max_threads
+
+# Thread scaling of the fused step on a Rayleigh-Bernard sized problem, from 1 to N threads
+parser = argparse.ArgumentParser(description="Measure fused step throughput against the number of numba threads.")
+parser.add_argument("--nx", type=int, default=2000)
+parser.add_argument("--ny", type=int, default=1000)
+parser.add_argument("--steps", type=int, default=20)
+parser.add_argument("--max-threads", type=int, default=max_threads())
+args = parser.parse_args()
+
+nx = args.nx
+ny = args.ny
+nl = 9
+tau_f = 0.8
+tau_g = 0.6
+gravity = 0.05
+alpha = 0.4
+T_hot = 1
+T_cold = 0.75
+T_ref = 0.5 * (T_hot + T_cold)
+
+f, g = rayleigh_bernard(nx, ny, nl, T_hot, T_cold)
+solid = np.zeros((nx, ny), dtype=bool)
+
+thread_counts = sorted({n for n in [2 ** p for p in range(args.max_threads.bit_length())] + [args.max_threads] if n <= args.max_threads})
+
+print(f"Fused thermal step on a {nx}x{ny} lattice, {args.steps} steps per thread count")
+print(f"{'threads':>8} {'s/step':>10} {'MLUPS':>10} {'speedup':>10} {'efficiency':>10}")
+base_time = None
+for n_threads in thread_counts:
+    set_num_threads(n_threads)
+    collide_and_stream(f, g, nx, ny, nl, solid, tau_f, tau_g, alpha, T_ref, gravity, None, "x", False) # JIT warm-up
+
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        f, g, _, _, _, _ = collide_and_stream(f, g, nx, ny, nl, solid, tau_f, tau_g, alpha, T_ref, gravity, None, "x", False)
+    step_time = (time.perf_counter() - start) / args.steps
+
+    if base_time is None:
+        base_time = step_time
+    speedup = base_time / step_time
+    print(f"{n_threads:>8} {step_time:>10.4f} {nx * ny / step_time / 1e6:>10.2f} {speedup:>10.2f} {speedup / n_threads:>10.2f}")
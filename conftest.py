@@ -0,0 +1,7 @@
+# Lets pytest import the src package from the repository root, run with
+#     python -m pytest
+
+def pytest_collection_modifyitems(items):
+    # DecomposedSimulation forks its workers, which numba's TBB threading layer only tolerates before this process has
+    # run a parallel kernel, so the decomposition tests go first
+    items.sort(key=lambda item: item.path.name != "test_decomposition.py")
@@ -5,6 +5,7 @@ from tqdm import tqdm
 from src.init import *
 from src.kernels import *
 from src.boundaries import *
+from src.simulation import Simulation
 
 # Simulation parameters
 nx = 500
@@ -37,22 +38,21 @@ for i in range(x_start, x_end):
 viscosity = (tau_f - 0.5) / 3
 reynolds_number = (wind_speed * thickness * 2) / viscosity
 
+# The simulation owns the populations and all work arrays
+sim = Simulation(f, solid, tau_f, boundaries=[
+    lambda f, g: wind_tunnel_inlet_bc(f, nx, ny, wind_speed),
+    lambda f, g: outlet_bc(nx, ny, nl, f, g, "right"),
+])
+
 print(f"Starting flow past an air foil simulation.")
 fig, ax = plt.subplots()
 speed_init = np.zeros((nx, ny))
 im = ax.imshow(speed_init.T, origin = "lower", cmap = "viridis", vmin = 0, vmax = 1.5*wind_speed)
 
 def update(frame):
-    global f
-
-    density, _, v_x, v_y = compute_macroscopic(f, None, nx, ny, nl, solid, None)
-    f, _ = collision(density, None, v_x, v_y, f, None, nx, ny, nl, tau_f, None, None, None, None, None)
-    f_new, _, _ = streaming(f, None, nx, ny, nl, None, None, False)
-    f_new = wind_tunnel_inlet_bc(f_new, nx, ny, wind_speed)
-    f_new = outlet_bc(nx, ny, nl, f_new, None, "right")
-    f = f_new
+    sim.step()
 
-    speed = np.sqrt(v_x ** 2 + v_y ** 2)
+    speed = np.sqrt(sim.v_x ** 2 + sim.v_y ** 2)
     im.set_array(speed.T)
     ax.set_title(f"Flow past airfoil, Re = {reynolds_number:.2e}, Time = {frame}")
     return [im]
@@ -5,6 +5,7 @@ from tqdm import tqdm
 from src.init import *
 from src.kernels import *
 from src.boundaries import *
+from src.simulation import Simulation
 
 # Simulation parameters
 nx = 500
@@ -49,6 +50,10 @@ n_boxes = len(box_centers_x)
 solid = create_obstacle_mask(nx, ny, np.array(box_centers_x), np.array(box_centers_y), n_boxes, "box", width, solid)
 solid[:, 0] = True      # Bottom wall
 solid[:, ny-1] = True   # Top wall
+
+# Solid cells of the heat-flux obstacle bounce-back, built once since the geometry never changes
+cells = obstacle_cells(solid, "box", n_boxes, box_centers_x, box_centers_y, width, T_hot, T_cold)
+
 f, g = thermal_obstacle_flow(f, g, n_boxes, box_centers_x, box_centers_y, width, nx, ny, nl, "box", T_hot)
 
 # Reynolds Number Calculation
@@ -59,24 +64,22 @@ reynolds_number = (wind_speed * width * 2) / viscosity
 diffusivity = (tau_g - 1/2) / 3
 prandtl_number = viscosity / diffusivity
 
+# The simulation owns the populations and all work arrays
+sim = Simulation(f, solid, tau_f, g=g, tau_g=tau_g, alpha=alpha, T_ref=T_cold, gravity=gravity, boundaries=[
+    lambda f, g: obstacle_cell_bc(f, g, cells),
+    lambda f, g: thermal_flow_inlet_bc(ny, nl, wind_speed, f, g, T_cold, solid),
+    lambda f, g: outlet_bc(nx, ny, nl, f, g, "right"),
+])
+
 print(f"Starting thermal flow past a box simulation.")
 fig, ax = plt.subplots()
 T_init = np.zeros((nx, ny))
 im = ax.imshow(T_init.T, origin = "lower", cmap = "magma", vmin = T_cold, vmax = T_hot)
 
 def update(frame):
-    global f, g
-
-    density, T, v_x, v_y = compute_macroscopic(f, g, nx, ny, nl, solid, None)
-    f, g = collision(density, T, v_x, v_y, f, g, nx, ny, nl, tau_f, tau_g, alpha, T_cold, gravity, None)
-    f_new, g_new, _ = streaming(f, g, nx, ny, nl, None, None, False)
-    f_new, g_new = obstacle_bc(solid, nx, ny, nl, f_new, g_new, "box", "heat flux", n_boxes, box_centers_x, box_centers_y, width, T_hot, T_cold)
-    f_new, g_new = thermal_flow_inlet_bc(ny, nl, wind_speed, f_new, g_new, T_cold, solid)
-    f_new, g_new = outlet_bc(nx, ny, nl, f_new, g_new, "right")
-
-    f, g = f_new, g_new
+    sim.step()
 
-    im.set_array(T.T)
+    im.set_array(sim.T.T)
     ax.set_title(f"Thermal flow past box, Re = {reynolds_number:.2e}, Pr = {prandtl_number:.2e}, Time = {frame}")
     return [im]
 
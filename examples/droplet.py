@@ -5,6 +5,7 @@ from tqdm import tqdm
 from src.init import *
 from src.kernels import *
 from src.boundaries import *
+from src.simulation import Simulation
 
 # Simulation parameters
 nx = 400
@@ -32,25 +33,23 @@ for k in range(nl):
     f[:, :, k] = w[k] * density
 solid = np.zeros((nx, ny), dtype=bool)
 
+# The simulation owns the populations and all work arrays
+sim = Simulation(f, solid, tau_f, gravity=gravity, G=G, periodic="x")
+
 print(f"Starting droplet collision simulation.")
 fig, ax = plt.subplots()
 temp_init = np.zeros((nx, ny))
 im = ax.imshow(temp_init.T, origin = "lower", cmap = "Blues", vmin = gas_density, vmax = liquid_density)
 
 def update(frame):
-    global f, density, liquid_density, gas_density, radius, G
-
-    density, _, v_x, v_y = compute_macroscopic(f, None, nx, ny, nl, solid, density)
-    f, _ = collision(density, None, v_x, v_y, f, None, nx, ny, nl, tau_f, None, None, None, gravity, G)
-    f_new, _, density = streaming(f, None, nx, ny, nl, "x", density)
-    f = f_new
+    sim.step()
 
     # Calculation of dimensionless (but time-dependent) Weber number (for formula see: https://en.wikipedia.org/wiki/Weber_number) 
-    U = np.max(np.abs(v_y))
+    U = np.max(np.abs(sim.v_y))
     sigma = (liquid_density - gas_density) ** 2 * abs(G) / 6
     weber_number = liquid_density * U ** 2 * radius / sigma
 
-    im.set_array(density.T)
+    im.set_array(sim.density.T)
     ax.set_title(f"Droplet Collision, We = {weber_number:.2e}, Time = {frame}")
     return [im]
 
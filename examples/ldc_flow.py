@@ -5,6 +5,7 @@ from tqdm import tqdm
 from src.init import rest
 from src.kernels import *
 from src.boundaries import *
+from src.simulation import Simulation
 
 nx = 200
 ny = 200
@@ -26,22 +27,20 @@ solid[:, ny-1] = False
 viscosity = (tau_f - 0.5) / 3
 reynolds_number = (lid_speed * nx) / viscosity
 
+# The simulation owns the populations and all work arrays
+sim = Simulation(f, solid, tau_f, boundaries=[
+    lambda f, g: lid_bc(f, lid_speed * min(1.0, sim.time / 100), nx, ny), # lid is ramped up over the first 100 steps
+])
+
 print(f"Starting lid-driven cavity flow simulation.")
 fig, ax = plt.subplots()
 speed_init = np.zeros((nx, ny))
 im = ax.imshow(speed_init.T, origin = "lower", cmap = "viridis", vmin = 0, vmax = lid_speed)
 
 def update(frame):
-    global f
-
-    density, _, v_x, v_y = compute_macroscopic(f, None, nx, ny, nl, solid, None)
-    f, _ = collision(density, None, v_x, v_y, f, None, nx, ny, nl, tau_f, None, None, None, None, None)
-    f_new, _, _ = streaming(f, None, nx, ny, nl, None, None, False)
-
-    curr_speed = lid_speed * min(1.0, (frame + 1) / 100)
-    f = lid_bc(f_new, curr_speed, nx, ny)
+    sim.step()
 
-    speed = np.sqrt(v_x ** 2 + v_y ** 2)
+    speed = np.sqrt(sim.v_x ** 2 + sim.v_y ** 2)
     im.set_array(speed.T)
     ax.set_title(f"Lid Driven Cavity Flow, Re = {reynolds_number:.2e}, Time = {frame}")
     return [im]
@@ -5,6 +5,7 @@ from tqdm import tqdm
 from src.init import *
 from src.kernels import *
 from src.boundaries import *
+from src.simulation import Simulation
 
 # Simulation parameters
 nx = 500
@@ -31,21 +32,20 @@ viscosity = (tau_f - 1/2) / 3
 diffusivity = (tau_g - 1/2) / 3
 rayleigh_number = gravity * alpha * (T_hot - T_cold) * ny ** 3 / (viscosity * diffusivity)
 
+# The simulation owns the populations and all work arrays
+sim = Simulation(f, solid, tau_f, g=g, tau_g=tau_g, alpha=alpha, T_ref=T_ref, gravity=gravity, periodic="x", boundaries=[
+    lambda f, g: heat_flux_bc(f, g, nx, ny, T_cold, T_hot, None, None),
+])
+
 print(f"Starting Rayleigh-Bernard simulation.")
 fig, ax = plt.subplots()
 temp_init = np.zeros((nx, ny))
 im = ax.imshow(temp_init.T, origin = "lower", cmap = "magma", vmin = T_cold, vmax = T_hot)
 
 def update(frame):
-    global f, g
-
-    density, T, v_x, v_y = compute_macroscopic(f, g, nx, ny, nl, solid, None)
-    f, g = collision(density, T, v_x, v_y, f, g, nx, ny, nl, tau_f, tau_g, alpha, T_ref, gravity, None)
-    f_new, g_new, _ = streaming(f, g, nx, ny, nl, "x", None, False)
-    f_new, g_new = heat_flux_bc(f_new, g_new, nx, ny, T_cold, T_hot, None, None)
-    f, g = f_new, g_new
+    sim.step()
 
-    im.set_array(T.T)
+    im.set_array(sim.T.T)
     ax.set_title(f"Rayleigh-Bernard, Ra = {rayleigh_number:.2e}, Time = {frame}")
     return [im]
 
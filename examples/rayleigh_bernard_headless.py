@@ -0,0 +1,41 @@
+import numpy as np
+from src.init import *
+from src.kernels import *
+from src.boundaries import *
+from src.simulation import Simulation
+from src.runner import run
+from src.snapshots import SnapshotWriter
+
+# Rayleigh-Bernard convection without plotting, e.g. for cluster jobs. Every output_every steps progress is
+# printed and the fields are appended to the time series store rayleigh_bernard_snapshots/ by a background thread,
+# read it back with src.store.Store
+nx = 500
+ny = 100
+nl = 9
+tau_f = 0.8
+tau_g = 0.6
+iterations = 5000
+output_every = 500
+gravity = 0.05
+alpha = 0.4
+T_hot = 1
+T_cold = 0.75
+T_ref = 0.5 * (T_hot + T_cold)
+
+f, g = rayleigh_bernard(nx, ny, nl, T_hot, T_cold)
+solid = np.zeros((nx, ny), dtype=bool)
+solid[:, 0] = True
+solid[:, ny-1] = True
+
+sim = Simulation(f, solid, tau_f, g=g, tau_g=tau_g, alpha=alpha, T_ref=T_ref, gravity=gravity, periodic="x", boundaries=[
+    lambda f, g: heat_flux_bc(f, g, nx, ny, T_cold, T_hot, None, None),
+])
+
+def report(snap):
+    speed = np.sqrt(snap["v_x"] ** 2 + snap["v_y"] ** 2)
+    print(f"Time = {snap['time']}, max speed = {speed.max():.4e}, mean T = {snap['T'].mean():.4f}")
+
+print(f"Starting headless Rayleigh-Bernard simulation.")
+with SnapshotWriter("rayleigh_bernard_snapshots", format="store", policy="block") as writer:
+    run(sim, iterations, output_every=output_every, callbacks=[report, writer])
+print(f"Simulation completed successfully, {writer.written} snapshots saved in rayleigh_bernard_snapshots/.")
@@ -5,6 +5,7 @@ from tqdm import tqdm
 from src.init import *
 from src.kernels import *
 from src.boundaries import *
+from src.simulation import Simulation
 
 # Simulation parameters
 nx = 200
@@ -33,22 +34,21 @@ viscosity = (tau_f - 1/2) / 3
 diffusivity = (tau_g - 1/2) / 3
 rayleigh_number = gravity * alpha * (T_hot - T_cold) * ny ** 3 / (viscosity * diffusivity)
 
+# The simulation owns the populations and all work arrays
+sim = Simulation(f, solid, tau_f, g=g, tau_g=tau_g, alpha=alpha, T_ref=T_ref, gravity=gravity, periodic="x", boundaries=[
+    lambda f, g: heat_flux_bc(f, g, nx, ny, T_cold, T_hot, source_start, source_end),
+    lambda f, g: outlet_bc(nx, ny, nl, f, g, "top"),
+])
+
 print(f"Starting rising smoke simulation.")
 fig, ax = plt.subplots()
 temp_init = np.zeros((nx, ny))
 im = ax.imshow(temp_init.T, origin = "lower", cmap = "magma", vmin = T_cold, vmax = T_hot)
 
 def update(frame):
-    global f, g
-
-    density, T, v_x, v_y = compute_macroscopic(f, g, nx, ny, nl, solid, None)
-    f, g = collision(density, T, v_x, v_y, f, g, nx, ny, nl, tau_f, tau_g, alpha, T_ref, gravity, None)
-    f_new, g_new, _ = streaming(f, g, nx, ny, nl, "x", None, False)
-    f_new, g_new = heat_flux_bc(f_new, g_new, nx, ny, T_cold, T_hot, source_start, source_end)
-    f_new, g_new = outlet_bc(nx, ny, nl, f_new, g_new, "top")
-    f, g = f_new, g_new
+    sim.step()
 
-    im.set_array(T.T)
+    im.set_array(sim.T.T)
     ax.set_title(f"Rising Smoke, Ra = {rayleigh_number:.2e}, Time = {frame}")
     return [im]
 
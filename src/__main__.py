@@ -0,0 +1,15 @@
+import sys
+
+# Command line entry point, `python -m src <command>`
+COMMANDS = ("precompile",)
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(f"usage: python -m src {{{','.join(COMMANDS)}}} [options]")
+        sys.exit(2)
+
+    if sys.argv[1] == "precompile":
+        from .precompile import main as precompile
+        precompile(sys.argv[2:])
+
+main()
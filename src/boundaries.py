@@ -1,48 +1,148 @@
+from numba import njit, prange
 import numpy as np
 from .constants import *
 
-# Encode error handling here later
+# String options are resolved to the integer codes in constants.py here, the compiled kernels only see integers
+def resolve_option(value, options, name):
+    if value not in options:
+        raise ValueError(f"{name} can only be one of {', '.join(repr(option) for option in options)}, got {value!r}.")
+    return options[value]
+
+# Temperature conditions of obstacle_bc: None bounces back f only, "heat flux" also sets g on the obstacle surfaces
+TEMP_CONDS = (None, "heat flux")
+
 def obstacle_bc(solid, nx, ny, nl, f, g, obstacle, temp_cond, n_obstacles, obstacle_centers_x, obstacle_centers_y, length, T_hot, T_cold):
+    if temp_cond not in TEMP_CONDS:
+        raise ValueError(f"temp_cond can only be one of {', '.join(repr(cond) for cond in TEMP_CONDS)}, got {temp_cond!r}.")
 
     if temp_cond == "heat flux":
-        for i in range(nx):
-            for j in range(ny):
-                if solid[i, j]:
-                    if obstacle is not None:
-                        is_obstacle = False
-                        for b in range(n_obstacles):
-                            if obstacle == "cylinder":
-                                if ((i - obstacle_centers_x[b]) ** 2
-                                + (j - obstacle_centers_y[b]) ** 2) < (length + 1) ** 2:
-                                    is_obstacle = True
-                                    break
-                            
-                            elif obstacle == "box":
-                                if (np.abs((i - obstacle_centers_x[b]) + (j - obstacle_centers_y[b])) +
-                                np.abs((i - obstacle_centers_x[b]) - (j - obstacle_centers_y[b])) < length):
-                                    is_obstacle = True
-                                    break
-                            
-                            else:
-                                print("Obstacle can only be 'cylinder' or 'box'.")
-                            
-                        
-                        T_target = T_hot if is_obstacle else T_cold
-
-                        for k in range(nl):
-                            f[i, j, opp_dir[k]] = f[i, j, k]
-                            g[i, j, opp_dir[k]] = 2 * w[k] * T_target - g[i, j, k]
+        if obstacle is not None:
+            shape = resolve_option(obstacle, OBSTACLES, "Obstacle")
+            obstacle_heat_flux_bc_kernel(solid, nx, ny, nl, f, g, shape, n_obstacles, np.asarray(obstacle_centers_x), 
+                                         np.asarray(obstacle_centers_y), length, T_hot, T_cold)
         
         return f, g
 
     else:
-        for i in range(nx):
-            for j in range(ny):
-                if solid[i, j]:
-                    for k in range(nl):
-                        f[i, j, opp_dir[k]] = f[i, j, k]
+        obstacle_bc_kernel(solid, nx, ny, nl, f)
         return f
 
+@njit(cache=True)
+def is_inside_obstacle(i, j, shape, n_obstacles, obstacle_centers_x, obstacle_centers_y, length):
+    for b in range(n_obstacles):
+        if shape == CYLINDER:
+            if ((i - obstacle_centers_x[b]) ** 2
+            + (j - obstacle_centers_y[b]) ** 2) < (length + 1) ** 2:
+                return True
+        
+        elif shape == BOX:
+            if (np.abs((i - obstacle_centers_x[b]) + (j - obstacle_centers_y[b])) +
+            np.abs((i - obstacle_centers_x[b]) - (j - obstacle_centers_y[b])) < length):
+                return True
+    
+    return False
+
+@njit(parallel=True, cache=True)
+def obstacle_heat_flux_bc_kernel(solid, nx, ny, nl, f, g, shape, n_obstacles, obstacle_centers_x, obstacle_centers_y, length, T_hot, T_cold):
+    for i in prange(nx):
+        for j in range(ny):
+            if solid[i, j]:
+                is_obstacle = is_inside_obstacle(i, j, shape, n_obstacles, obstacle_centers_x, obstacle_centers_y, length)
+                T_target = T_hot if is_obstacle else T_cold
+
+                for k in range(nl):
+                    f[i, j, opp_dir[k]] = f[i, j, k]
+                    g[i, j, opp_dir[k]] = 2 * w[k] * T_target - g[i, j, k]
+
+@njit(parallel=True, cache=True)
+def obstacle_bc_kernel(solid, nx, ny, nl, f):
+    for i in prange(nx):
+        for j in range(ny):
+            if solid[i, j]:
+                for k in range(nl):
+                    f[i, j, opp_dir[k]] = f[i, j, k]
+
+def obstacle_cells(solid, obstacle, n_obstacles, obstacle_centers_x, obstacle_centers_y, length, T_hot, T_cold):
+    # Cell index of obstacle_bc with "heat flux", built once at setup: every solid cell with the temperature of its
+    # wall (T_hot inside an obstacle, T_cold otherwise), so each step skips the grid scan and the geometry tests
+    shape = resolve_option(obstacle, OBSTACLES, "Obstacle")
+    cell_i, cell_j = np.nonzero(solid)
+    cell_i = cell_i.astype(np.int64)
+    cell_j = cell_j.astype(np.int64)
+    cell_T = obstacle_link_temperatures(cell_i, cell_j, shape, n_obstacles, np.asarray(obstacle_centers_x),
+                                        np.asarray(obstacle_centers_y), length, T_hot, T_cold)
+    return cell_i, cell_j, cell_T
+
+@njit(parallel=True, cache=True)
+def obstacle_cell_bc(f, g, cells):
+    # obstacle_bc with "heat flux" on the precomputed cells, bit for bit: the populations inside each solid cell are
+    # bounced back for f and anti-bounced-back at the wall temperature for g
+    cell_i, cell_j, cell_T = cells
+    for c in prange(len(cell_i)):
+        i = cell_i[c]
+        j = cell_j[c]
+        for k in range(f.shape[2]):
+            f[i, j, opp_dir[k]] = f[i, j, k]
+            g[i, j, opp_dir[k]] = 2 * w[k] * cell_T[c] - g[i, j, k]
+
+    return f, g
+
+def obstacle_links(solid, nx, ny, obstacle, n_obstacles, obstacle_centers_x, obstacle_centers_y, length, T_hot, T_cold):
+    # Boundary index built once at setup: every fluid cell (link_i, link_j) whose neighbour in direction link_k 
+    # is solid, with the temperature of that wall (T_hot inside an obstacle, T_cold otherwise or when obstacle is None)
+    padded = np.zeros((nx + 2, ny + 2), dtype=bool) # links leaving the domain are handled by streaming
+    padded[1:-1, 1:-1] = solid
+
+    link_i = []
+    link_j = []
+    link_k = []
+    for k in range(1, len(c_x)):
+        neighbor_solid = padded[1 + c_x[k]:nx + 1 + c_x[k], 1 + c_y[k]:ny + 1 + c_y[k]]
+        i, j = np.nonzero(~solid & neighbor_solid)
+        link_i.append(i)
+        link_j.append(j)
+        link_k.append(np.full(len(i), k))
+
+    link_i = np.concatenate(link_i).astype(np.int64)
+    link_j = np.concatenate(link_j).astype(np.int64)
+    link_k = np.concatenate(link_k).astype(np.int64)
+
+    if obstacle is not None:
+        shape = resolve_option(obstacle, OBSTACLES, "Obstacle")
+        link_T = obstacle_link_temperatures(link_i + c_x[link_k], link_j + c_y[link_k], shape, n_obstacles, 
+                                            np.asarray(obstacle_centers_x), np.asarray(obstacle_centers_y), length, T_hot, T_cold)
+    else:
+        link_T = np.full(len(link_i), T_cold, dtype=np.float64)
+
+    return link_i, link_j, link_k, link_T
+
+@njit(cache=True)
+def obstacle_link_temperatures(solid_i, solid_j, shape, n_obstacles, obstacle_centers_x, obstacle_centers_y, length, T_hot, T_cold):
+    link_T = np.empty(len(solid_i))
+    for l in range(len(solid_i)):
+        is_obstacle = is_inside_obstacle(solid_i[l], solid_j[l], shape, n_obstacles, obstacle_centers_x, obstacle_centers_y, length)
+        link_T[l] = T_hot if is_obstacle else T_cold
+    return link_T
+
+@njit(parallel=True, cache=True)
+def obstacle_link_bc(f, g, links):
+    # Halfway bounce-back (and anti-bounce-back for g at the wall temperature) on the precomputed links: a population
+    # that streamed from a fluid cell into a solid one is sent back to the fluid cell in the opposite direction
+    link_i, link_j, link_k, link_T = links
+    for l in prange(len(link_i)):
+        i = link_i[l]
+        j = link_j[l]
+        k = link_k[l]
+        solid_i = i + c_x[k]
+        solid_j = j + c_y[k]
+
+        f[i, j, opp_dir[k]] = f[solid_i, solid_j, k]
+        if g is not None:
+            g[i, j, opp_dir[k]] = 2 * w[k] * link_T[l] - g[solid_i, solid_j, k]
+
+    return f, g
+
+@njit(cache=True)
 def thermal_flow_inlet_bc(ny, nl, wind_speed, f, g, T_cold, solid):
     for j in range(1, ny-1):
         if not solid[0, j]:
@@ -53,6 +153,7 @@ def thermal_flow_inlet_bc(ny, nl, wind_speed, f, g, T_cold, solid):
     
     return f, g
 
+@njit(cache=True)
 def wind_tunnel_inlet_bc(f, nx, ny, wind_speed):
     for i in range(nx):
         # No slip, bounce-back velocity boundary conditions
@@ -74,6 +175,7 @@ def wind_tunnel_inlet_bc(f, nx, ny, wind_speed):
         
     return f    
 
+@njit(cache=True)
 def lid_bc(f, lid_speed, nx, ny):
     j = ny - 1
     for i in range(nx):
@@ -91,27 +193,31 @@ def lid_bc(f, lid_speed, nx, ny):
     
 
 def outlet_bc(nx, ny, nl, f, g, wall):
-    if wall == "right":
-        for k in range(nl):
-            f[nx-1, :, k] = f[nx-2, :, k]
-            if g is not None:
-                g[nx-1, :, k] = g[nx-2, :, k]
-
-    elif wall == "top":
-        for i in range(nx):
-            for k in range(nl):
-                f[i, ny-1, k] = f[i, ny-2, k]
-            for k in [4, 7, 8]:
-                g[i, ny-1, k] = g[i, ny-2, k]
-    
-    else:
-        print("Please choose either 'right' or 'top' for outlet wall conditions.")
+    outlet_bc_kernel(nx, ny, nl, f, g, resolve_option(wall, OUTLET_WALLS, "Outlet wall"))
     
     if g is not None:
         return f, g
     else:
         return f
 
+@njit(cache=True)
+def outlet_bc_kernel(nx, ny, nl, f, g, wall):
+    if wall == RIGHT:
+        for j in range(ny):
+            for k in range(nl):
+                f[nx-1, j, k] = f[nx-2, j, k]
+                if g is not None:
+                    g[nx-1, j, k] = g[nx-2, j, k]
+
+    elif wall == TOP:
+        for i in range(nx):
+            for k in range(nl):
+                f[i, ny-1, k] = f[i, ny-2, k]
+            if g is not None:
+                for k in (4, 7, 8):
+                    g[i, ny-1, k] = g[i, ny-2, k]
+
+@njit(cache=True)
 def heat_flux_bc(f, g, nx, ny, T_cold, T_hot, source_start, source_end):
     for i in range(nx):
         # No slip, bounce-back velocity boundary conditions
@@ -125,17 +231,8 @@ def heat_flux_bc(f, g, nx, ny, T_cold, T_hot, source_start, source_end):
             f[i, ny-1, 4] = f[i, ny-1, 2]
             f[i, ny-1, 7] = f[i, ny-1, 5]
             f[i, ny-1, 8] = f[i, ny-1, 6]
-        
-        else:
-            is_source = (i >= source_start and i <= source_end)
-            noise = 1 + 0.1 * (np.random.rand() - 0.5)
-            if is_source:
-                T_local = T_hot #* noise
-            else:
-                T_local = T_cold
 
-        if g is not None:
-            if source_start is None:
+            if g is not None:
                 # Anti-bounce back, temperature boundary conditions
                 # Bottom wall
                 g[i, 0, 2] = 2 * w[2] * T_hot - g[i, 0, 4]
@@ -146,7 +243,12 @@ def heat_flux_bc(f, g, nx, ny, T_cold, T_hot, source_start, source_end):
                 g[i, ny-1, 4] = 2 * w[4] * T_cold - g[i, ny-1, 2]
                 g[i, ny-1, 7] = 2 * w[7] * T_cold - g[i, ny-1, 5]
                 g[i, ny-1, 8] = 2 * w[8] * T_cold - g[i, ny-1, 6]
-            else:
+        
+        else:
+            is_source = (i >= source_start and i <= source_end)
+            T_local = T_hot if is_source else T_cold
+
+            if g is not None:
                 # Enforce local temperature distribution boundary on bottom wall where source is
                 g[i, 0, 2] = 2 * w[2] * T_local - g[i, 0, 4]
                 g[i, 0, 5] = 2 * w[5] * T_local - g[i, 0, 7]
@@ -154,15 +256,16 @@ def heat_flux_bc(f, g, nx, ny, T_cold, T_hot, source_start, source_end):
 
     return f, g
 
+@njit(cache=True)
 def wall_bc(f, g, nx, ny, w, opp, T_cold):
     for i in range(nx):
         # bottom wall
-        for k in [2,5,6]:
+        for k in (2, 5, 6):
             f[i,0,k] = f[i,0,opp[k]]
             g[i,0,k] = 2*w[k]*T_cold - g[i,0,opp[k]]
 
         # top wall
-        for k in [4,7,8]:
+        for k in (4, 7, 8):
             f[i,ny-1,k] = f[i,ny-1,opp[k]]
             g[i,ny-1,k] = 2*w[k]*T_cold - g[i,ny-1,opp[k]]
-    return f, g
\ No newline at end of file
+    return f, g
@@ -0,0 +1,91 @@
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+from .eos import PsiTable
+from .layout import is_soa, soa_storage
+from .simulation import Simulation
+
+# Checkpoints are directories holding the populations and solid mask as .npy files plus a state.json with
+# the step count and every physical parameter of the Simulation. Saving is one copy of each array into
+# a memory-mapped file; loading maps the files back copy-on-write, so pages are only read from disk as the
+# first step touches them and a restarted run never writes into its checkpoint.
+#
+# Loading with overridden parameters (any of PARAMETERS, or psi_table) forks a run from a spun-up state,
+# e.g. for a parameter sweep:
+#     for tau_f in (0.6, 0.7, 0.8):
+#         sim = load_checkpoint("spun_up", boundaries=..., tau_f=tau_f)
+PARAMETERS = ("tau_f", "tau_g", "alpha", "T_ref", "gravity", "G", "periodic", "multiphase", "collision", "magic", "moment_rates",
+              "precision")
+STATE = "state.json"
+
+def save_checkpoint(sim, path):
+    # state.json is removed first and written last, so a crash mid-save leaves a directory
+    # that load_checkpoint refuses instead of a checkpoint with mismatched arrays
+    os.makedirs(path, exist_ok=True)
+    state_path = os.path.join(path, STATE)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+    # float32 populations are saved as absolute float64 values, from which the deviations are recovered exactly
+    f, g = sim.populations()
+    arrays = {"f": f, "solid": sim.solid}
+    if g is not None:
+        arrays["g"] = g
+    if sim.psi_table is not None:
+        arrays["psi_table"] = sim.psi_table.values
+    for name, value in arrays.items():
+        # SoA populations are stored as their contiguous (nl, nx, ny) planes
+        data = soa_storage(value) if is_soa(value) else value
+        mapped = open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=data.dtype, shape=data.shape)
+        mapped[...] = data
+        mapped.flush()
+        del mapped
+
+    state = {
+        "time": sim.time,
+        "layout": "soa" if sim.soa else "aos",
+        "arrays": list(arrays),
+        "parameters": {name: getattr(sim, name) for name in PARAMETERS},
+    }
+    if sim.psi_table is not None:
+        state["psi_inv_step"] = sim.psi_table.inv_step
+        state["psi_G"] = sim.psi_table.G
+    temp_path = state_path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(state, file, indent=2)
+    os.replace(temp_path, state_path)
+
+def load_checkpoint(path, boundaries=(), mode="c", **parameters):
+    # Boundary conditions are callables and are not saved, they are passed again on restart.
+    # mode "c" maps the files copy-on-write (default), "copy" reads them fully into memory. The files are
+    # never mapped writable since the ping-pong buffers would leave them holding alternate steps.
+    state_path = os.path.join(path, STATE)
+    if not os.path.exists(state_path):
+        raise FileNotFoundError(f"no complete checkpoint in {path}")
+    with open(state_path) as file:
+        state = json.load(file)
+
+    unknown = set(parameters) - set(PARAMETERS) - {"psi_table"}
+    if unknown:
+        raise ValueError(f"unknown simulation parameters {sorted(unknown)}, expected some of {PARAMETERS}")
+    if mode not in ("c", "copy"):
+        raise ValueError(f"mode must be 'c' or 'copy', got {mode!r}")
+
+    def read(name):
+        # Files a previous checkpoint left in the directory are ignored
+        if name not in state["arrays"]:
+            return None
+        file_path = os.path.join(path, f"{name}.npy")
+        data = np.load(file_path) if mode == "copy" else np.load(file_path, mmap_mode=mode)
+        if name in ("f", "g") and state["layout"] == "soa":
+            data = data.transpose(1, 2, 0)
+        return data
+
+    values = dict(state["parameters"])
+    if "psi_inv_step" in state:
+        values["psi_table"] = PsiTable(read("psi_table"), state["psi_inv_step"], state["psi_G"])
+    values.update(parameters)
+    sim = Simulation(read("f"), np.asarray(read("solid")), g=read("g"), boundaries=boundaries, **values)
+    sim.time = state["time"]
+    return sim
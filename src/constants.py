@@ -7,4 +7,14 @@ w = np.array([4/9, 1/9, 1/9,
 c_x = np.array([0, 1, 0, -1, 0, 1, -1, -1, 1], dtype=np.int64)
 c_y = np.array([0, 0, 1, 0, -1, 1, 1, -1, -1], dtype=np.int64)
 opp_dir = np.array([0, 3, 4, 1, 2, 7, 8, 5, 6], dtype=np.int64) # opposite particle velocity directions on the D2Q9 grid (ex: 1 - east and 3 - west are opposite to each other)
-cs2 = 1/3 # LBM speed of sound
\ No newline at end of file
+cs2 = 1/3 # LBM speed of sound
+Q = len(w) # number of lattice directions, a compile-time constant inside the kernels
+
+# Integer codes for the string options of the boundary conditions, resolved before entering the compiled kernels
+CYLINDER = 0
+BOX = 1
+OBSTACLES = {"cylinder": CYLINDER, "box": BOX}
+
+RIGHT = 0
+TOP = 1
+OUTLET_WALLS = {"right": RIGHT, "top": TOP}
@@ -0,0 +1,339 @@
+import multiprocessing
+import threading
+import traceback
+import warnings
+import numba
+import numpy as np
+from multiprocessing import shared_memory
+from .kernels import *
+from .layout import is_soa
+from .parallel import set_num_threads
+from .simulation import Simulation, as_float
+
+# Domain decomposition over worker processes on one machine. The lattice is cut into slabs along x and every
+# process advances its slab with an ordinary Simulation (same kernels, same layout) on a padded copy that carries
+# halo columns from its neighbours. All slabs live in shared memory: after every step each process copies the
+# owned edge columns of its neighbours into its own halo columns, so no data goes through pipes while stepping.
+#
+# Boundary conditions are created inside every process by a factory boundaries(domain) that gets the Subdomain
+# of that process and returns the list of bc(f, g) callables for its slab, for example
+#     def boundaries(domain):
+#         bcs = [lambda f, g: outlet_bc(domain.nx, ny, nl, f, g, "right")]
+#         if domain.first:
+#             bcs.append(lambda f, g: wind_tunnel_inlet_bc(f, domain.nx, ny, wind_speed))
+#         return bcs
+# domain.nx is the padded local width, the BCs of boundaries.py that only touch the first and last column can be
+# used unchanged since on inner slabs those columns are halos that get overwritten by the exchange.
+
+class Subdomain:
+    # One slab: global columns [x_start, x_end) owned by this process, stored in a local array with left and right
+    # halo columns, local column 0 is global column x0 (modulo nx when x is periodic)
+    def __init__(self, rank, size, x_start, x_end, left, right, nx_global, ny, nl):
+        self.rank = rank
+        self.size = size
+        self.x_start = x_start
+        self.x_end = x_end
+        self.left = left # halo widths
+        self.right = right
+        self.x0 = x_start - left
+        self.nx = left + (x_end - x_start) + right
+        self.nx_global = nx_global
+        self.ny = ny
+        self.nl = nl
+        self.first = rank == 0 and left == 0 # slab touches the global x = 0 edge
+        self.last = rank == size - 1 and right == 0 # slab touches the global x = nx-1 edge
+        self.simulation = None # set once the local Simulation is built
+
+    @property
+    def time(self):
+        return self.simulation.time
+
+    @property
+    def owned(self):
+        return slice(self.left, self.left + self.x_end - self.x_start)
+
+    def global_columns(self):
+        return np.arange(self.x0, self.x0 + self.nx) % self.nx_global
+
+    def owns(self, x):
+        return self.x_start <= x < self.x_end
+
+    def local_x(self, x):
+        return x - self.x0
+
+    def local_links(self, links):
+        # Keeps the fluid-solid links (see obstacle_links) whose fluid cell is owned, shifted to local columns
+        link_i, link_j, link_k, link_T = links
+        keep = (link_i >= self.x_start) & (link_i < self.x_end)
+        return (np.ascontiguousarray(link_i[keep] - self.x0), np.ascontiguousarray(link_j[keep]),
+                np.ascontiguousarray(link_k[keep]), np.ascontiguousarray(link_T[keep]))
+
+def slab_streaming(periodic, multiphase):
+    # Streaming rules of every slab: x never wraps locally since the halos hold the neighbouring columns (populations
+    # leaving a halo column are overwritten by the next exchange), y and the drops follow the whole lattice
+    _, wrap_y, drop_x, drop_y = streaming_rules(periodic, multiphase)
+    return False, wrap_y, drop_x, drop_y
+
+def slab_bounds(nx, processes):
+    # Splits nx columns into contiguous slabs whose widths differ by at most one
+    edges = [nx * r // processes for r in range(processes + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+def shared_array(shape, dtype=np.float64, soa=False):
+    # Returns (block, array) for an array in a new shared memory block, populations in SoA are allocated as
+    # (nl, nx, ny) storage and returned as the transposed (nx, ny, nl) view like layout.to_soa
+    storage_shape = (shape[2], shape[0], shape[1]) if soa else shape
+    block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(storage_shape)) * np.dtype(dtype).itemsize))
+    array = np.ndarray(storage_shape, dtype=dtype, buffer=block.buf)
+    return block, (array.transpose(1, 2, 0) if soa else array)
+
+def tbb_running():
+    # The workers are forked so the boundary factory can be any callable, TBB only tolerates that if it was never started
+    try:
+        return numba.threading_layer() == "tbb"
+    except ValueError: # no parallel kernel has run yet
+        return False
+
+class DecomposedSimulation:
+    # Same arguments and stepping interface as Simulation, except boundaries is a factory (see above) and the
+    # parallel layout is set by processes and by threads, the number of numba threads in every process.
+    # The global fields (f, g, density, v_x, v_y, T) are gathered from the slabs when read and are copies.
+    def __init__(self, f, solid, tau_f, g=None, tau_g=None, alpha=None, T_ref=None, gravity=None, G=None,
+                 periodic=None, multiphase=False, boundaries=None, psi_table=None, collision="bgk", magic=None,
+                 moment_rates=None, processes=2, threads=1):
+        check_parameters(f, g, solid, tau_f, tau_g, alpha, T_ref, gravity, G, psi_table)
+        check_collision(collision, magic, moment_rates)
+        thermal, shan_chen, periodic, multiphase = step_config(g, G, periodic, multiphase)
+        self.nx, self.ny, self.nl = f.shape
+        processes = int(processes)
+        if not 1 <= processes <= self.nx:
+            raise ValueError(f"Number of processes must be between 1 and nx = {self.nx}, got {processes}.")
+        wrap_x = periodic in ("x", "xy")
+        if shan_chen and not wrap_x:
+            # The Shan-Chen force is periodic in x (see fill_psi_halo) while the streaming is not, the edge
+            # slabs would need the opposite edge as a halo for the force only
+            raise ValueError("Decomposition with a Shan-Chen force requires periodic x.")
+        # Halos are two columns wide with Shan-Chen: the force on the inner halo column needs psi one column further
+        # out. A halo is copied from the owned columns of one neighbour, so no slab can be narrower than it.
+        halo = 2 if shan_chen else 1
+        if self.nx // processes < halo:
+            raise ValueError(f"Every slab must be at least {halo} columns wide (the halo width), {processes} processes "
+                             f"on nx = {self.nx} give slabs of {self.nx // processes}.")
+
+        self.solid = solid
+        self.tau_f = as_float(tau_f)
+        self.tau_g = as_float(tau_g)
+        self.alpha = as_float(alpha)
+        self.T_ref = as_float(T_ref)
+        self.gravity = as_float(gravity)
+        self.G = as_float(G)
+        self.periodic = periodic
+        self.multiphase = multiphase
+        self.psi_table = psi_table
+        self.collision = collision
+        self.magic = as_float(magic)
+        self.moment_rates = moment_rates
+        self.soa = is_soa(f)
+        if g is not None and is_soa(g) != self.soa:
+            raise ValueError("f and g must use the same memory layout")
+        self.thermal = thermal
+        self.processes = processes
+        self.time = 0
+        self.profiler = None # profiling.py only times single-process simulations
+
+        # Without periodic x the global edges need no halo.
+        self.domains = []
+        for rank, (x_start, x_end) in enumerate(slab_bounds(self.nx, processes)):
+            left = halo if wrap_x or rank > 0 else 0
+            right = halo if wrap_x or rank < processes - 1 else 0
+            self.domains.append(Subdomain(rank, processes, x_start, x_end, left, right, self.nx, self.ny, self.nl))
+
+        # Ping-pong buffers and macroscopic fields of every slab, the workers inherit the mappings when forked
+        self.blocks = []
+        self.arrays = []
+        for domain in self.domains:
+            columns = domain.global_columns()
+            arrays = {}
+            for name, source in (("f", f), ("g", g)):
+                if source is None:
+                    arrays[name] = None
+                    continue
+                buffers = []
+                for _ in range(2):
+                    block, array = shared_array((domain.nx, self.ny, self.nl), soa=self.soa)
+                    self.blocks.append(block)
+                    array[...] = source[columns]
+                    buffers.append(array)
+                arrays[name] = buffers
+            for name in ("density", "v_x", "v_y", "T"):
+                if name == "T" and g is None:
+                    arrays[name] = None
+                    continue
+                block, array = shared_array((domain.nx, self.ny))
+                self.blocks.append(block)
+                array[...] = 0.0
+                arrays[name] = array
+            self.arrays.append(arrays)
+
+        if tbb_running():
+            warnings.warn("numba's TBB threading layer is already running in this process, forking the workers can make it "
+                          "hang at exit. Create the DecomposedSimulation before running parallel kernels or set "
+                          "NUMBA_THREADING_LAYER=omp or workqueue.", RuntimeWarning, stacklevel=2)
+        context = multiprocessing.get_context("fork")
+        self.barrier = context.Barrier(processes)
+        self.pipes = []
+        self.workers = []
+        for domain in self.domains:
+            parent, child = context.Pipe()
+            worker = context.Process(target=self.worker, args=(domain, child, solid[domain.global_columns()],
+                                                                boundaries, threads), daemon=True)
+            worker.start()
+            child.close()
+            self.pipes.append(parent)
+            self.workers.append(worker)
+        self.closed = False
+        self.collect() # raises if a worker failed to build its simulation
+
+    def worker(self, domain, pipe, solid, boundaries, threads):
+        # Runs in the forked process: builds the local Simulation on the shared buffers and steps on command
+        try:
+            set_num_threads(threads)
+            arrays = self.arrays[domain.rank]
+            g = arrays["g"]
+            sim = Simulation(arrays["f"][0], solid, self.tau_f, g=g[0] if g is not None else None, tau_g=self.tau_g,
+                             alpha=self.alpha, T_ref=self.T_ref, gravity=self.gravity, G=self.G, periodic=self.periodic,
+                             multiphase=self.multiphase, psi_table=self.psi_table, collision=self.collision,
+                             magic=self.magic, moment_rates=self.moment_rates,
+                             streaming=slab_streaming(self.periodic, self.multiphase))
+            sim.f_new = arrays["f"][1]
+            sim.g_new = g[1] if g is not None else None
+            sim.density, sim.v_x, sim.v_y, sim.T = arrays["density"], arrays["v_x"], arrays["v_y"], arrays["T"]
+            domain.simulation = sim
+            sim.boundaries = list(boundaries(domain)) if boundaries is not None else []
+            pipe.send(("ready",))
+        except Exception:
+            pipe.send(("error", traceback.format_exc()))
+            return
+
+        while True:
+            command = pipe.recv()
+            if command[0] == "stop":
+                break
+            try:
+                for _ in range(command[1]):
+                    sim.step()
+                    self.barrier.wait() # every slab has stepped and applied its BCs
+                    self.exchange_halos(domain, sim.time % 2)
+                    self.barrier.wait() # every halo is filled before the next step reads it
+                pipe.send(("ready",))
+            except threading.BrokenBarrierError:
+                pipe.send(("aborted",)) # another process failed and reports why
+            except Exception:
+                self.barrier.abort() # releases the processes waiting on this one
+                pipe.send(("error", traceback.format_exc()))
+
+    def exchange_halos(self, domain, current):
+        # Copies the owned edge columns of the neighbouring slabs (current ping-pong buffer) into the halos of domain
+        rank, size = domain.rank, domain.size
+        for name in ("f", "g"):
+            if self.arrays[rank][name] is None:
+                continue
+            local = self.arrays[rank][name][current]
+            if domain.left:
+                neighbor = self.domains[(rank - 1) % size]
+                source = self.arrays[neighbor.rank][name][current]
+                end = neighbor.owned.stop
+                local[:domain.left] = source[end - domain.left:end]
+            if domain.right:
+                neighbor = self.domains[(rank + 1) % size]
+                source = self.arrays[neighbor.rank][name][current]
+                start = neighbor.owned.start
+                local[domain.nx - domain.right:] = source[start:start + domain.right]
+
+    def collect(self):
+        errors = []
+        for pipe in self.pipes:
+            message = pipe.recv()
+            if message[0] == "error":
+                errors.append(message[1])
+        if errors:
+            self.close()
+            raise RuntimeError("Decomposed simulation failed in a worker process:\n" + errors[0])
+
+    def advance(self, steps):
+        if self.closed:
+            raise RuntimeError("Decomposed simulation is closed")
+        for pipe in self.pipes:
+            pipe.send(("advance", int(steps)))
+        self.time += int(steps)
+        self.collect()
+
+    def step(self):
+        self.advance(1)
+
+    def gather(self, name):
+        if self.arrays[0][name] is None:
+            return None
+        populations = name in ("f", "g")
+        if populations:
+            out = np.empty((self.nl, self.nx, self.ny)).transpose(1, 2, 0) if self.soa else np.empty((self.nx, self.ny, self.nl))
+        else:
+            out = np.empty((self.nx, self.ny))
+        for domain, arrays in zip(self.domains, self.arrays):
+            array = arrays[name][self.time % 2] if populations else arrays[name]
+            out[domain.x_start:domain.x_end] = array[domain.owned]
+        return out
+
+    @property
+    def f(self):
+        return self.gather("f")
+
+    @property
+    def g(self):
+        return self.gather("g")
+
+    @property
+    def density(self):
+        return self.gather("density")
+
+    @property
+    def v_x(self):
+        return self.gather("v_x")
+
+    @property
+    def v_y(self):
+        return self.gather("v_y")
+
+    @property
+    def T(self):
+        return self.gather("T")
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for pipe, worker in zip(self.pipes, self.workers):
+            if worker.is_alive():
+                try:
+                    pipe.send(("stop",))
+                except (BrokenPipeError, OSError):
+                    pass
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self.arrays = []
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, "blocks", None):
+            self.close()
@@ -0,0 +1,210 @@
+import io
+import os
+import numpy as np
+from .kernels import *
+from .layout import is_soa, to_soa
+from .runner import FIELDS
+from .simulation import Simulation
+from .decomposition import Subdomain, slab_bounds, slab_streaming
+
+# MPI variant of decomposition.py for runs across nodes (requires mpi4py). Every rank owns one x slab of the
+# lattice and steps it with an ordinary Simulation on a padded copy with halo columns, using the same kernels. A step
+#   1. posts non-blocking sends of its owned edge columns and receives into its halo columns,
+#   2. collides and streams the interior columns, which need no halo data, while the messages are in flight,
+#   3. waits for the halos and steps the remaining edge columns, then applies its boundary conditions.
+# Every rank runs the same script: the global initial arrays are passed on every rank and only the slab is kept, so
+# they must be identical on every rank (seed np.random before a randomly perturbed initialization).
+# Boundary conditions come from a factory boundaries(domain) exactly like DecomposedSimulation. The fields
+# (f, g, density, v_x, v_y, T) are the owned columns of this rank only, nothing is ever gathered: write
+# output with ParallelSnapshotWriter below. For example, run with mpirun -n 4 python3 -m examples.my_case
+#     sim = MPISimulation(f, solid, tau_f, boundaries=boundaries)
+#     writer = ParallelSnapshotWriter(sim, "output")
+#     run(sim, 10000, output_every=100, callbacks=[writer])
+# mpi4py is only imported once an MPISimulation is built, so the module imports without it.
+
+def mpi():
+    try:
+        from mpi4py import MPI
+    except ImportError as error:
+        raise ImportError("MPI runs need mpi4py, which is not in requirements.txt: pip install mpi4py") from error
+    return MPI
+
+class MPISimulation:
+    def __init__(self, f, solid, tau_f, g=None, tau_g=None, alpha=None, T_ref=None, gravity=None, G=None,
+                 periodic=None, multiphase=False, boundaries=None, psi_table=None, collision="bgk", magic=None,
+                 moment_rates=None, comm=None):
+        check_parameters(f, g, solid, tau_f, tau_g, alpha, T_ref, gravity, G, psi_table)
+        thermal, shan_chen, periodic, multiphase = step_config(g, G, periodic, multiphase)
+        self.mpi = mpi()
+        self.comm = comm if comm is not None else self.mpi.COMM_WORLD
+        rank, size = self.comm.Get_rank(), self.comm.Get_size()
+        self.nx, self.ny, self.nl = f.shape
+        if size > self.nx:
+            raise ValueError(f"Number of ranks can be at most nx = {self.nx}, got {size}.")
+        wrap_x = periodic in ("x", "xy")
+        if shan_chen and not wrap_x:
+            raise ValueError("Decomposition with a Shan-Chen force requires periodic x.")
+
+        # Same slabs and halos as DecomposedSimulation
+        halo = 2 if shan_chen else 1
+        if self.nx // size < halo:
+            raise ValueError(f"Every slab must be at least {halo} columns wide (the halo width), {size} ranks "
+                             f"on nx = {self.nx} give slabs of {self.nx // size}.")
+        x_start, x_end = slab_bounds(self.nx, size)[rank]
+        left = halo if wrap_x or rank > 0 else 0
+        right = halo if wrap_x or rank < size - 1 else 0
+        self.domain = Subdomain(rank, size, x_start, x_end, left, right, self.nx, self.ny, self.nl)
+        self.left_rank = (rank - 1) % size if left else self.mpi.PROC_NULL
+        self.right_rank = (rank + 1) % size if right else self.mpi.PROC_NULL
+
+        columns = self.domain.global_columns()
+        local_f = self.local_populations(f, columns)
+        local_g = self.local_populations(g, columns) if g is not None else None
+        self.simulation = Simulation(local_f, solid[columns], tau_f, g=local_g, tau_g=tau_g, alpha=alpha, T_ref=T_ref,
+                                     gravity=gravity, G=G, periodic=periodic, multiphase=multiphase, psi_table=psi_table,
+                                     collision=collision, magic=magic, moment_rates=moment_rates,
+                                     streaming=slab_streaming(periodic, multiphase))
+        self.domain.simulation = self.simulation
+        self.simulation.boundaries = list(boundaries(self.domain)) if boundaries is not None else []
+        self.time = 0
+
+        # Interior columns only read populations of this rank: every cell but the halos, and with Shan-Chen not the
+        # owned column next to a halo either since its force needs psi of the halo
+        inner = 1 if shan_chen else 0
+        nx_local = self.domain.nx
+        start = left + inner if left else 0
+        end = nx_local - right - inner if right else nx_local
+        end = max(start, end)
+        self.interior = (start, end)
+        self.edges = [(i_start, i_end) for i_start, i_end in ((0, start), (end, nx_local)) if i_start < i_end]
+
+        # Contiguous message buffers, one set per distribution: [to left, to right, from left, from right]
+        self.buffers = {}
+        for name in ("f", "g"):
+            if name == "g" and g is None:
+                continue
+            self.buffers[name] = [np.empty((width, self.ny, self.nl)) for width in (left, right, left, right)]
+
+    def local_populations(self, f, columns):
+        local = np.ascontiguousarray(f[columns])
+        return to_soa(local) if is_soa(f) else local
+
+    def start_halo_exchange(self):
+        # Posts the sends of the owned edge columns and the receives of the halo columns of every distribution
+        domain = self.domain
+        owned = domain.owned
+        requests = []
+        for index, (name, (to_left, to_right, from_left, from_right)) in enumerate(self.buffers.items()):
+            f = getattr(self.simulation, name)
+            # Tags tell the two directions apart when both neighbours are the same rank
+            right_tag = 2 * index
+            left_tag = 2 * index + 1
+            if domain.left:
+                requests.append(self.comm.Irecv(from_left, source=self.left_rank, tag=right_tag))
+                to_left[...] = f[owned.start:owned.start + domain.left]
+                requests.append(self.comm.Isend(to_left, dest=self.left_rank, tag=left_tag))
+            if domain.right:
+                requests.append(self.comm.Irecv(from_right, source=self.right_rank, tag=left_tag))
+                to_right[...] = f[owned.stop - domain.right:owned.stop]
+                requests.append(self.comm.Isend(to_right, dest=self.right_rank, tag=right_tag))
+        return requests
+
+    def finish_halo_exchange(self, requests):
+        self.mpi.Request.Waitall(requests)
+        domain = self.domain
+        for name, (_, _, from_left, from_right) in self.buffers.items():
+            f = getattr(self.simulation, name)
+            if domain.left:
+                f[:domain.left] = from_left
+            if domain.right:
+                f[domain.nx - domain.right:] = from_right
+
+    def step(self):
+        sim = self.simulation
+        requests = self.start_halo_exchange()
+        if self.interior[0] < self.interior[1]:
+            sim.run_kernels(*self.interior)
+        self.finish_halo_exchange(requests)
+        for i_start, i_end in self.edges:
+            sim.run_kernels(i_start, i_end)
+
+        sim.swap()
+        self.time = sim.time
+        sim.apply_boundaries()
+
+    def advance(self, steps):
+        for _ in range(steps):
+            self.step()
+
+    def owned(self, array):
+        return array[self.domain.owned] if array is not None else None
+
+    @property
+    def f(self):
+        return self.owned(self.simulation.f)
+
+    @property
+    def g(self):
+        return self.owned(self.simulation.g)
+
+    @property
+    def density(self):
+        return self.owned(self.simulation.density)
+
+    @property
+    def v_x(self):
+        return self.owned(self.simulation.v_x)
+
+    @property
+    def v_y(self):
+        return self.owned(self.simulation.v_y)
+
+    @property
+    def T(self):
+        return self.owned(self.simulation.T)
+
+class ParallelSnapshotWriter:
+    # Collective snapshot output: every field of a snapshot goes to one standard .npy file,
+    # {prefix}_{time:08d}_{field}.npy, that every rank writes its own rows of with MPI-IO, so the files load with
+    # np.load (or mmap_mode="r" to read part of a field) and no rank ever holds the global field. Can be passed to
+    # run() as a callback or called with capture(sim). Every rank must take part in every write.
+    def __init__(self, sim, directory, fields=FIELDS, prefix="snapshot"):
+        self.sim = sim
+        self.directory = directory
+        self.fields = tuple(fields)
+        self.prefix = prefix
+        self.written = 0
+        if sim.comm.Get_rank() == 0:
+            os.makedirs(directory, exist_ok=True)
+        sim.comm.Barrier()
+
+    def __call__(self, snap):
+        self.write(snap["time"], {name: snap[name] for name in self.fields if snap.get(name) is not None})
+
+    def capture(self, sim=None):
+        sim = sim if sim is not None else self.sim
+        self.write(sim.time, {name: getattr(sim, name) for name in self.fields if getattr(sim, name) is not None})
+
+    def write(self, time, fields):
+        domain = self.sim.domain
+        comm, MPI = self.sim.comm, self.sim.mpi
+        for name, rows in fields.items():
+            rows = np.ascontiguousarray(rows)
+            shape = (domain.nx_global,) + rows.shape[1:]
+            header = npy_header(shape, rows.dtype)
+            row_bytes = rows.itemsize * int(np.prod(rows.shape[1:], dtype=np.int64))
+            path = os.path.join(self.directory, f"{self.prefix}_{time:08d}_{name}.npy")
+            handle = MPI.File.Open(comm, path, MPI.MODE_WRONLY | MPI.MODE_CREATE)
+            handle.Set_size(len(header) + row_bytes * domain.nx_global)
+            if comm.Get_rank() == 0:
+                handle.Write_at(0, np.frombuffer(header, dtype=np.uint8))
+            handle.Write_at_all(len(header) + row_bytes * domain.x_start, rows)
+            handle.Close()
+        self.written += 1
+
+def npy_header(shape, dtype):
+    # Header of a C-ordered .npy file, the same bytes on every rank
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                  "fortran_order": False, "shape": tuple(shape)})
+    return buffer.getvalue()
@@ -0,0 +1,181 @@
+import numpy as np
+from .kernels import *
+from .layout import is_soa
+from .runner import FIELDS, snapshot
+
+# Batched parameter sweeps: many simulations of the same configuration (thermal, Shan-Chen, periodic, multiphase)
+# and lattice size stepped together by one kernel launch, see make_ensemble_step. Populations get a leading member
+# axis, f[m, i, j, k], and every physical parameter may be a scalar shared by all members or a sequence with one
+# value per member. The solid mask is (nx, ny) shared or (members, nx, ny). The collision operator and the MRT
+# moment_rates are shared, the TRT magic parameter may differ per member. Members are stored in float64.
+#
+# Boundary conditions are built per member by a factory boundaries(member) that returns the list of bc(f, g)
+# callables of that member, called on its own (nx, ny, nl) populations, for example
+#     def boundaries(member):
+#         return [lambda f, g: wind_tunnel_inlet_bc(f, nx, ny, wind_speeds[member.index])]
+# Ensemble.from_simulations batches existing Simulation objects instead and reuses their boundary conditions.
+PARAMETERS = ("tau_f", "tau_g", "alpha", "T_ref", "gravity", "G", "magic")
+
+class Member:
+    # The view of one member handed to the boundary factory
+    def __init__(self, ensemble, index):
+        self.ensemble = ensemble
+        self.index = index
+
+    @property
+    def time(self):
+        return self.ensemble.time
+
+    @property
+    def parameters(self):
+        return self.ensemble.parameters(self.index)
+
+def member_values(value, members, name):
+    # One float per member from a scalar or a sequence, None stays None
+    if value is None:
+        return None
+    if np.ndim(value) == 1 and any(v is None for v in value):
+        raise ValueError(f"{name} must be given for every member or for none, got {list(value)}")
+    values = np.asarray(value, dtype=np.float64)
+    if values.ndim == 0:
+        return np.full(members, float(values))
+    if values.shape != (members,):
+        raise ValueError(f"{name} must be a scalar or have one value per member ({members}), got shape {values.shape}")
+    return values.copy()
+
+class Ensemble:
+    def __init__(self, f, solid, tau_f, g=None, tau_g=None, alpha=None, T_ref=None, gravity=None, G=None,
+                 periodic=None, multiphase=False, boundaries=None, psi_table=None, collision="bgk", magic=None,
+                 moment_rates=None):
+        if f.ndim != 4:
+            raise ValueError(f"ensemble populations must have shape (members, nx, ny, {Q}), got {f.shape}")
+        if g is not None and g.shape != f.shape:
+            raise ValueError(f"g has shape {g.shape} but f has shape {f.shape}")
+        self.members = f.shape[0]
+        if solid.ndim == 2:
+            solid = np.broadcast_to(solid, (self.members,) + solid.shape)
+        if solid.shape[0] != self.members:
+            raise ValueError(f"solid must be (nx, ny) or have one mask per member ({self.members}), got shape {solid.shape}")
+        check_parameters(f[0], g[0] if g is not None else None, solid[0], tau_f, tau_g, alpha, T_ref, gravity, G, psi_table)
+        check_collision(collision, None, moment_rates)
+        if magic is not None and collision != "trt":
+            raise ValueError("the magic parameter only applies to the trt collision")
+        config = step_config(g, G, periodic, multiphase)
+        _, self.nx, self.ny, self.nl = f.shape
+        self.solid = np.ascontiguousarray(solid)
+        self.tau_f = member_values(tau_f, self.members, "tau_f")
+        self.tau_g = member_values(tau_g, self.members, "tau_g")
+        self.alpha = member_values(alpha, self.members, "alpha")
+        self.T_ref = member_values(T_ref, self.members, "T_ref")
+        self.gravity = member_values(force_gravity(gravity, G), self.members, "gravity")
+        self.G = member_values(G, self.members, "G")
+        self.periodic = periodic
+        self.multiphase = config[3]
+        self.psi_table = psi_table
+        self.collision = collision
+        if np.ndim(magic) == 1:
+            # A member without a magic parameter uses the default of collision_rates, as a Simulation does
+            magic = [TRT_MAGIC if value is None else value for value in magic]
+        self.magic = member_values(magic, self.members, "magic")
+        self.moment_rates = tuple(float(rate) for rate in moment_rates) if moment_rates is not None else None
+        self.rates = None
+        if collision != "bgk":
+            self.rates = np.stack([collision_rates(collision, self.tau_f[m], self.magic[m] if self.magic is not None else None,
+                                                   self.moment_rates) for m in range(self.members)])
+        self.time = 0
+
+        # Every member uses the layout of the populations that were passed in, see layout.py
+        self.soa = is_soa(f[0])
+        if g is not None and is_soa(g[0]) != self.soa:
+            raise ValueError("f and g must use the same memory layout")
+        self.f = f
+        self.kernel = make_ensemble_step(*config, soa=self.soa, collision=collision)
+        self.f_new = np.empty_like(f)
+        self.g = g
+        self.g_new = np.empty_like(g) if g is not None else None
+
+        shape = (self.members, self.nx, self.ny)
+        self.density = np.zeros(shape)
+        self.v_x = np.zeros(shape)
+        self.v_y = np.zeros(shape)
+        self.T = np.zeros(shape) if g is not None else None
+        self.psi_halo = np.empty((self.members, self.nx + 2, self.ny + 2)) if G is not None else None
+        self.cells = np.empty((self.members, self.nx, 2, Q)) if collision != "bgk" else None
+
+        self.simulations = None # set by from_simulations
+        self.boundaries = [list(boundaries(Member(self, m))) if boundaries is not None else [] for m in range(self.members)]
+
+    @classmethod
+    def from_simulations(cls, simulations):
+        # Batches Simulation objects that share the configuration and lattice size, copying their state. Their boundary
+        # conditions are reused, and their time is kept in step with the ensemble for conditions that read sim.time.
+        first = simulations[0]
+        for sim in simulations:
+            if sim.precision != "float64":
+                # The ensemble step has no shifted float32 storage, stacking would silently promote the members
+                raise ValueError(f"ensemble members must use float64 precision, got {sim.precision!r}")
+        for sim in simulations[1:]:
+            if (sim.f.shape, sim.g is None, sim.G is None, sim.periodic, sim.multiphase, sim.soa, sim.psi_table, sim.collision, sim.moment_rates) != \
+               (first.f.shape, first.g is None, first.G is None, first.periodic, first.multiphase, first.soa, first.psi_table, first.collision, first.moment_rates):
+                raise ValueError("ensemble members must share the lattice size, configuration, layout, psi_table and collision")
+
+        def stacked(arrays):
+            batch = np.empty((len(arrays),) + arrays[0].shape)
+            if first.soa:
+                batch = np.empty((len(arrays), arrays[0].shape[2]) + arrays[0].shape[:2]).transpose(0, 2, 3, 1)
+            for m, array in enumerate(arrays):
+                batch[m] = array
+            return batch
+
+        values = {name: [getattr(sim, name) for sim in simulations] for name in PARAMETERS}
+        values["gravity"] = [force_gravity(sim.gravity, sim.G) for sim in simulations]
+        values = {name: None if all(v is None for v in value) else value for name, value in values.items()}
+        populations = [sim.populations() for sim in simulations]
+        ensemble = cls(stacked([f for f, g in populations]), np.stack([sim.solid for sim in simulations]),
+                       g=stacked([g for f, g in populations]) if first.g is not None else None,
+                       periodic=first.periodic, multiphase=first.multiphase, psi_table=first.psi_table,
+                       collision=first.collision, moment_rates=first.moment_rates, **values)
+        ensemble.time = first.time
+        ensemble.simulations = list(simulations)
+        ensemble.boundaries = [list(sim.boundaries) for sim in simulations]
+        return ensemble
+
+    def parameters(self, m):
+        return {name: float(getattr(self, name)[m]) if getattr(self, name) is not None else None for name in PARAMETERS}
+
+    def step(self):
+        self.run_kernels()
+        self.f, self.f_new = self.f_new, self.f
+        self.g, self.g_new = self.g_new, self.g
+        self.time += 1
+
+        if self.simulations is not None:
+            for sim in self.simulations:
+                sim.time = self.time
+        for m, boundaries in enumerate(self.boundaries):
+            f = self.f[m]
+            g = self.g[m] if self.g is not None else None
+            for bc in boundaries:
+                bc(f, g)
+
+    def run_kernels(self):
+        f, g, f_new, g_new = self.f, self.g, self.f_new, self.g_new
+        if self.soa:
+            # (members, nl, nx, ny) storage, every member is then indexed like layout.soa_storage
+            f, f_new = f.transpose(0, 3, 1, 2), f_new.transpose(0, 3, 1, 2)
+            if g is not None:
+                g, g_new = g.transpose(0, 3, 1, 2), g_new.transpose(0, 3, 1, 2)
+        self.kernel(f, g, f_new, g_new, self.density, self.T, self.v_x, self.v_y, self.psi_halo, self.cells, self.nx, self.ny, self.solid,
+                    self.tau_f, self.tau_g, self.alpha, self.T_ref, self.gravity, self.G, self.rates, *table_arrays(self.psi_table))
+
+    def advance(self, steps):
+        for _ in range(steps):
+            self.step()
+
+    def split(self, snap):
+        # Demultiplexes a batched snapshot (runner.snapshot of the ensemble) into one snapshot per member, with its parameters
+        return [{"time": snap["time"], "member": m, "parameters": self.parameters(m),
+                 **{name: value[m] for name, value in snap.items() if name != "time"}} for m in range(self.members)]
+
+    def snapshots(self, fields=FIELDS):
+        return self.split(snapshot(self, fields))
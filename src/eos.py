@@ -0,0 +1,54 @@
+import numpy as np
+from .constants import cs2
+
+# Equation-of-state pseudopotentials for the Shan-Chen model. The default pseudopotential is
+# psi = 1 - exp(-rho), evaluated directly in the kernels. An EOS pseudopotential is chosen so that the
+# Shan-Chen pressure p = cs2 * rho + G * cs2 / 2 * psi^2 matches a real-gas equation of state:
+#     psi = sqrt(2 * (p_eos(rho) - cs2 * rho) / (G * cs2))
+# Evaluating it needs a square root and a division per cell, so it is tabulated once over density and
+# linearly interpolated in the kernels (see psi_lookup in kernels.py).
+class PsiTable:
+    # values[n] is psi at density n / inv_step; densities past the table are extrapolated from its last interval.
+    # psi depends on G, so the table keeps the G it was built for and a simulation with another G is rejected.
+    def __init__(self, values, inv_step, G):
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.inv_step = float(inv_step)
+        self.G = float(G)
+
+def carnahan_starling_pressure(rho, T, a=1.0, b=4.0, R=1.0):
+    eta = b * rho / 4
+    return rho * R * T * (1 + eta + eta ** 2 - eta ** 3) / (1 - eta) ** 3 - a * rho ** 2
+
+def carnahan_starling_critical_temperature(a=1.0, b=4.0, R=1.0):
+    return 0.3773 * a / (b * R)
+
+def peng_robinson_pressure(rho, T, a=2/49, b=2/21, R=1.0, omega=0.344):
+    T_c = peng_robinson_critical_temperature(a, b, R)
+    alpha = (1 + (0.37464 + 1.54226 * omega - 0.26992 * omega ** 2) * (1 - np.sqrt(T / T_c))) ** 2
+    return rho * R * T / (1 - b * rho) - a * alpha * rho ** 2 / (1 + 2 * b * rho - (b * rho) ** 2)
+
+def peng_robinson_critical_temperature(a=2/49, b=2/21, R=1.0):
+    return 0.0778 * a / (0.45724 * b * R)
+
+def psi_table(pressure, G, rho_max, points=4096):
+    # Tabulates the pseudopotential of the equation of state pressure(rho) on [0, rho_max]. Where the
+    # EOS pressure is above the ideal gas one the square root has no real value and psi is clipped to 0.
+    if G is None or G >= 0:
+        raise ValueError(f"EOS pseudopotentials need an attractive interaction, G < 0, got {G}")
+    if rho_max <= 0 or points < 2:
+        raise ValueError("the table needs a positive rho_max and at least 2 points")
+    rho = np.linspace(0.0, rho_max, points)
+    values = np.sqrt(np.maximum(0.0, 2 * (pressure(rho) - cs2 * rho) / (G * cs2)))
+    return PsiTable(values, (points - 1) / rho_max, G)
+
+def carnahan_starling(T_ratio, G=-1.0, rho_max=1.0, points=4096, a=1.0, b=4.0, R=1.0):
+    # Carnahan-Starling hard-sphere EOS at temperature T_ratio * T_c. With the default a, b the liquid
+    # density is below 0.5 for T_ratio > 0.6, the EOS diverges at rho = 4 / b.
+    T = T_ratio * carnahan_starling_critical_temperature(a, b, R)
+    return psi_table(lambda rho: carnahan_starling_pressure(rho, T, a, b, R), G, min(rho_max, 0.99 * 4 / b), points)
+
+def peng_robinson(T_ratio, G=-1.0, rho_max=8.0, points=4096, a=2/49, b=2/21, R=1.0, omega=0.344):
+    # Peng-Robinson EOS at temperature T_ratio * T_c, omega is the acentric factor (0.344 for water).
+    # The EOS diverges at rho = 1 / b.
+    T = T_ratio * peng_robinson_critical_temperature(a, b, R)
+    return psi_table(lambda rho: peng_robinson_pressure(rho, T, a, b, R, omega), G, min(rho_max, 0.99 / b), points)
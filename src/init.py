@@ -1,69 +1,49 @@
 import numpy as np
 from .constants import *
+from .geometry import Circle, obstacles
+from .layout import to_layout
 
-def rayleigh_bernard(nx, ny, nl, T_hot, T_cold):
-    f = np.zeros((nx, ny, nl), dtype=np.float64)
-    g = np.zeros_like(f)
+def rayleigh_bernard(nx, ny, nl, T_hot, T_cold, layout="aos"):
     noise = 0.005 * np.random.randn(nx, ny)
     num_cells = 4
-    k = 1
+    i = np.arange(nx)[:, None]
+    j = np.arange(ny)[None, :]
 
-    for i in range(nx):
-        for j in range(ny):
-            # Linear temperature gradient where y = 0, T = T_hot and y = 1, T = T_cold
-            T_init = T_hot + (T_cold - T_hot) * (j/ny)
+    # Linear temperature gradient where y = 0, T = T_hot and y = 1, T = T_cold
+    T_init = T_hot + (T_cold - T_hot) * (j/ny)
 
-            # # Sigmoid temperature gradient where y = 0, T = T_hot and y = 1, T = T_cold
-            # T_init = (T_cold - T_hot) / (1 + np.exp(-k*(j/ny - ny // 2))) + T_cold
+    # # Sigmoid temperature gradient where y = 0, T = T_hot and y = 1, T = T_cold
+    # T_init = (T_cold - T_hot) / (1 + np.exp(-k*(j/ny - ny // 2))) + T_cold
 
-            # Sine wave with num_cells peaks across the simulation width (x-direction)
-            T_init += 0.005 * np.sin(num_cells * 2 * np.pi * i / nx)
-            T_init += noise[i, j] # break symmetry with noise
+    # Sine wave with num_cells peaks across the simulation width (x-direction)
+    T_init = T_init + 0.005 * np.sin(num_cells * 2 * np.pi * i / nx)
+    T_init = T_init + noise # break symmetry with noise
 
-            for k in range(nl):
-                f[i, j, k] = w[k]
-                g[i, j, k] = w[k] * T_init
-    
-    return f, g
+    f = np.empty((nx, ny, nl), dtype=np.float64)
+    f[...] = w[:nl]
+    g = w[:nl] * T_init[:, :, None]
+    return to_layout(f, layout), to_layout(g, layout)
 
-def thermal_sim(nx, ny, nl, T_cold):
-    f = np.zeros((nx, ny, nl), dtype=np.float64)
-    g = np.zeros_like(f)
-
-    for i in range(nx):
-        for j in range(ny):
-            for k in range(nl):
-                f[i, j, k] = w[k]
-                g[i, j, k] = w[k] * T_cold
+def thermal_sim(nx, ny, nl, T_cold, layout="aos"):
+    f = np.empty((nx, ny, nl), dtype=np.float64)
+    g = np.empty_like(f)
+    f[...] = w[:nl]
+    g[...] = w[:nl] * T_cold
     
-    return f, g
+    return to_layout(f, layout), to_layout(g, layout)
 
 def thermal_bubble(f, g, nx, ny, nl, bubble_center_x, bubble_center_y, radius, T_hot):
-    for i in range(nx):
-        for j in range(ny):
-            if ((i - bubble_center_x) ** 2
-                    + (j - bubble_center_y) ** 2) < (radius + 1) ** 2:
-                for k in range(nl):
-                    g[i, j, k] = w[k] * T_hot
+    bubble = Circle(bubble_center_x, bubble_center_y, radius + 1).rasterize(nx, ny)
+    g[bubble] = w[:nl] * T_hot
 
     return f, g
 
 def thermal_obstacle_flow(f, g, n_obstacles, obstacle_centers_x, obstacle_centers_y, length, nx, ny, nl, obstacle, T_hot):
-    for b in range(n_obstacles):
-        for i in range(nx):
-            for j in range(ny):
-                if obstacle == "cylinder":
-                    if ((i - obstacle_centers_x[b]) ** 2
-                                + (j - obstacle_centers_y[b]) ** 2) < (length + 1) ** 2:
-                        for k in range(nl):
-                            g[i, j, k] = w[k] * T_hot
-                elif obstacle == "box":
-                    if (np.abs((i - obstacle_centers_x[b]) + (j - obstacle_centers_y[b])) +
-                                np.abs((i - obstacle_centers_x[b]) - (j - obstacle_centers_y[b])) < length):
-                        for k in range(nl):
-                            g[i, j, k] = w[k] * T_hot
-                else:
-                    print("Obstacle can only be 'cylinder' or 'box'.")
+    # Heats the cells of the obstacles, cylinders one cell wider than the solid mask
+    if obstacle == "cylinder":
+        length = length + 1
+    hot = obstacles(obstacle, obstacle_centers_x[:n_obstacles], obstacle_centers_y[:n_obstacles], length).rasterize(nx, ny)
+    g[hot] = w[:nl] * T_hot
 
     return f, g
 
@@ -79,27 +59,12 @@ def droplet_collision(nx, ny, density, liquid_density, gas_density, droplet_cent
     return density
 
 def create_obstacle_mask(nx, ny, obstacle_centers_x, obstacle_centers_y, n_obstacles, obstacle, length, solid):
-    for i in range(nx):
-        for j in range(ny):
-            for b in range(n_obstacles):
-                if obstacle == "cylinder":
-                    if ((i - obstacle_centers_x[b]) ** 2 + (j - obstacle_centers_y[b]) ** 2) < length ** 2:
-                        solid[i, j] = True
-                        break
-                
-                if obstacle == "box":
-                    if (np.abs((i - obstacle_centers_x[b]) + (j - obstacle_centers_y[b])) +
-                    np.abs((i - obstacle_centers_x[b]) - (j - obstacle_centers_y[b])) < length):
-                        solid[i, j] = True
-                        break
-    return solid
+    # Adds the obstacles to solid, see geometry.py for other shapes
+    return obstacles(obstacle, obstacle_centers_x[:n_obstacles], obstacle_centers_y[:n_obstacles], length).rasterize(nx, ny, solid)
 
 def wind_tunnel(f, nx, ny, nl, wind_speed):
-    for i in range(nx):
-        for j in range(ny):
-            for k in range(nl):
-                v_x0 = c_x[k] * wind_speed
-                f[i, j, k] = w[k] * (1 + v_x0 / cs2 + (v_x0 ** 2) / (2 * cs2 ** 2) - (wind_speed ** 2) / (2 * cs2))
+    v_x0 = c_x[:nl] * wind_speed
+    f[...] = w[:nl] * (1 + v_x0 / cs2 + (v_x0 ** 2) / (2 * cs2 ** 2) - (wind_speed ** 2) / (2 * cs2))
     
     return f
 
@@ -0,0 +1,265 @@
+import numpy as np
+from numba import njit, prange, float64, boolean, int64
+from numba.experimental import jitclass
+from .kernels import *
+from .layout import is_soa, soa_storage
+from .simulation import as_float
+
+# In-place streaming with the AA pattern: one population array per distribution instead of the ping-pong pair of
+# Simulation, so a thermal run keeps two nx * ny * 9 arrays alive instead of four. Steps alternate between two kernels
+# that each read and write the same 9 slots per cell, so cells never race and no second buffer is needed:
+#   even step (time even)  reads the populations of the cell in place, collides and writes population k back into
+#                          slot opp_dir[k] of the same cell, i.e. collided but not streamed yet
+#   odd step (time odd)    reads the population k arriving at the cell from slot opp_dir[k] of the upwind cell,
+#                          collides and pushes population k into slot k of the downwind cell, the layout of Simulation
+# Populations leaving the domain are stored back into slot opp_dir[k] of their own cell (or zeroed where the axis
+# drops them) in both steps, which is the bounce-back and drop of the dense streaming. Results are identical to
+# Simulation with the same boundary conditions.
+#
+# Boundary conditions are the bc(f, g) callables of Simulation and see the streamed populations either way: after an
+# odd step they get the arrays themselves, after an even step AAField views that index the streamed state, f[i, j, k],
+# in the swapped storage. The compiled boundary conditions of boundaries.py run on both unchanged; slicing is not
+# supported. sim.populations() returns the streamed f and g as ordinary arrays, e.g. for a checkpoint.
+#     sim = InPlaceSimulation(f, solid, tau_f, g=g, tau_g=tau_g, alpha=alpha, T_ref=T_ref, gravity=gravity,
+#                             boundaries=[lambda f, g: obstacle_link_bc(f, g, links)])
+INPLACE_KERNELS = {}
+
+@jitclass([("data", float64[:, :, :]), ("nx", int64), ("ny", int64), ("wrap_x", boolean), ("wrap_y", boolean)])
+class AAField:
+    # Streamed f[i, j, k] indexing of populations left by an even step: population k of (i, j) is still in slot
+    # opp_dir[k] of the upwind cell, or in slot k of (i, j) itself when the upwind cell is outside the domain
+    def __init__(self, data, nx, ny, wrap_x, wrap_y):
+        self.data = data
+        self.nx = nx
+        self.ny = ny
+        self.wrap_x = wrap_x
+        self.wrap_y = wrap_y
+
+    def slot(self, i, j, k):
+        # Indices are cast so unsigned loop indices (prange) do not promote the arithmetic to float
+        i, j, k = np.int64(i), np.int64(j), np.int64(k)
+        source_i = i - c_x[k]
+        source_j = j - c_y[k]
+        if self.wrap_x:
+            source_i = source_i % self.nx
+        if self.wrap_y:
+            source_j = source_j % self.ny
+        if source_i < 0 or source_i >= self.nx or source_j < 0 or source_j >= self.ny:
+            return i, j, k
+        return source_i, source_j, opp_dir[k]
+
+    def __getitem__(self, key):
+        i, j, k = self.slot(key[0], key[1], key[2])
+        return self.data[i, j, k]
+
+    def __setitem__(self, key, value):
+        i, j, k = self.slot(key[0], key[1], key[2])
+        self.data[i, j, k] = value
+
+class InPlaceSimulation:
+    # Simulation with AA-pattern streaming, with the same constructor, step/advance and macroscopic fields. f and g are
+    # stepped in place, so arrays passed in are modified; between steps they hold the streamed populations only when
+    # time is even, see populations().
+    def __init__(self, f, solid, tau_f, g=None, tau_g=None, alpha=None, T_ref=None, gravity=None, G=None,
+                 periodic=None, multiphase=False, boundaries=(), psi_table=None):
+        check_parameters(f, g, solid, tau_f, tau_g, alpha, T_ref, gravity, G, psi_table)
+        config = step_config(g, G, periodic, multiphase)
+        self.nx, self.ny, self.nl = f.shape
+        self.solid = solid
+        self.tau_f = as_float(tau_f)
+        self.tau_g = as_float(tau_g)
+        self.alpha = as_float(alpha)
+        self.T_ref = as_float(T_ref)
+        self.gravity = as_float(gravity)
+        self.G = as_float(G)
+        self.periodic = periodic
+        self.multiphase = config[3]
+        self.psi_table = psi_table
+        self.boundaries = list(boundaries)
+        self.time = 0
+
+        self.soa = is_soa(f)
+        if g is not None and is_soa(g) != self.soa:
+            raise ValueError("f and g must use the same memory layout")
+        self.f = f
+        self.g = g
+        self.kernels = make_inplace_step(*config, soa=self.soa)
+        wrap_x, wrap_y, _, _ = streaming_rules(periodic, self.multiphase)
+        # The views handed to the boundary conditions after an even step
+        self.f_view = AAField(f, self.nx, self.ny, wrap_x, wrap_y)
+        self.g_view = AAField(g, self.nx, self.ny, wrap_x, wrap_y) if g is not None else None
+
+        self.density = np.zeros((self.nx, self.ny))
+        self.v_x = np.zeros((self.nx, self.ny))
+        self.v_y = np.zeros((self.nx, self.ny))
+        self.T = np.zeros((self.nx, self.ny)) if g is not None else None
+        self.psi_halo = psi_buffer(self.nx, self.ny, G)
+        # Scratch for the populations of the cell being collided, one (2, Q) cell per column
+        self.cells = np.empty((self.nx, 2, Q))
+
+    def step(self):
+        self.run_kernels()
+        self.time += 1
+
+        f, g = (self.f_view, self.g_view) if self.time % 2 else (self.f, self.g)
+        with uncached_views():
+            for bc in self.boundaries:
+                bc(f, g)
+
+    def run_kernels(self):
+        f, g = self.f, self.g
+        if self.soa:
+            f, g = soa_storage(f), soa_storage(g)
+        self.kernels[self.time % 2](f, g, self.density, self.T, self.v_x, self.v_y, self.psi_halo, self.cells, self.nx, self.ny, self.solid,
+                                    self.tau_f, self.tau_g, self.alpha, self.T_ref, force_gravity(self.gravity, self.G), self.G,
+                                    *table_arrays(self.psi_table))
+
+    def advance(self, steps):
+        for _ in range(steps):
+            self.step()
+
+    def populations(self):
+        # The streamed f and g as ordinary arrays: the arrays themselves when time is even, copies otherwise
+        if self.time % 2 == 0:
+            return self.f, self.g
+        return streamed(self.f, self.f_view), streamed(self.g, self.g_view) if self.g is not None else None
+
+def streamed(data, view):
+    dense = np.empty_like(data)
+    streamed_into(view, dense)
+    return dense
+
+# Not cached on disk like the other kernels: it is only ever compiled for AAField views, and numba cannot cache a
+# function that takes a jitclass, so cache=True would only add a warning on every compile
+@njit(parallel=True)
+def streamed_into(view, dense):
+    nx, ny, nl = dense.shape
+    for i in prange(nx):
+        for j in range(ny):
+            for k in range(nl):
+                dense[i, j, k] = view[i, j, k]
+
+def make_inplace_step(thermal, shan_chen, periodic, multiphase, soa=False):
+    # Returns (even_step, odd_step), each step(f, g, density, T, v_x, v_y, psi_halo, cells, nx, ny, solid, tau_f, tau_g,
+    # alpha, T_ref, gravity, G, psi_table, psi_inv_step) on a single population array per distribution, with cells an
+    # (nx, 2, Q) scratch array. The physics is the fused step of make_step; the even/odd loads and stores replace its
+    # push into f_new.
+    key = (thermal, shan_chen, periodic, as_flag(multiphase, "multiphase"), soa)
+    if key in INPLACE_KERNELS:
+        return INPLACE_KERNELS[key]
+
+    THERMAL = thermal
+    SHAN_CHEN = shan_chen
+    step_config(None, None, periodic, multiphase)
+    WRAP_X, WRAP_Y, DROP_X, DROP_Y = streaming_rules(periodic, key[3])
+    load = load_soa if soa else load_aos
+    store = store_soa if soa else store_aos
+
+    def make_parity(ODD):
+        @njit(cache=True)
+        def load_in(f, i, j, k, nx, ny):
+            # Population k arriving at (i, j)
+            if not ODD:
+                return load(f, i, j, k)
+            source_i = i - c_x[k]
+            source_j = j - c_y[k]
+            if WRAP_X:
+                source_i = source_i % nx
+            if WRAP_Y:
+                source_j = source_j % ny
+            if source_i < 0 or source_i >= nx or source_j < 0 or source_j >= ny:
+                return load(f, i, j, k)
+            return load(f, source_i, source_j, opp_dir[k])
+
+        @njit(cache=True)
+        def store_out(f, i, j, k, nx, ny, value):
+            # Collided population k leaving (i, j)
+            next_i = i + c_x[k]
+            next_j = j + c_y[k]
+            if WRAP_X:
+                next_i = next_i % nx
+            if WRAP_Y:
+                next_j = next_j % ny
+            if next_i < 0 or next_i >= nx:
+                if DROP_X:
+                    value = 0.0
+            elif next_j < 0 or next_j >= ny:
+                if DROP_Y:
+                    value = 0.0
+            elif ODD:
+                store(f, next_i, next_j, k, value)
+                return
+            store(f, i, j, opp_dir[k], value)
+
+        @njit(cache=True)
+        def update_column(f, g, density, T, v_x, v_y, psi_halo, nx, ny, solid, tau_f, tau_g, alpha, T_ref, gravity, G, cell, i):
+            # Moments, collision and in-place store of column i. The 9 populations of a cell are loaded into the (2, Q)
+            # scratch cell before any is stored, since a store can land in a slot another direction of the same cell
+            # still has to read.
+            omega_f = 1 - 0.5 / tau_f
+            f_cell = cell[0]
+            g_cell = cell[1]
+            for j in range(ny):
+                rho = 0.0
+                u_x = 0.0
+                u_y = 0.0
+                temp = 0.0
+                for k in range(Q):
+                    f_k = load_in(f, i, j, k, nx, ny)
+                    f_cell[k] = f_k
+                    rho += f_k
+                    u_x += c_x[k] * f_k
+                    u_y += c_y[k] * f_k
+                    if THERMAL:
+                        g_cell[k] = load_in(g, i, j, k, nx, ny)
+                        temp += g_cell[k]
+
+                if rho > 0: # avoid division by zero
+                    u_x /= rho
+                    u_y /= rho
+
+                if solid[i, j]:
+                    u_x = 0.0
+                    u_y = 0.0
+
+                if not SHAN_CHEN:
+                    density[i, j] = rho
+                v_x[i, j] = u_x
+                v_y[i, j] = u_y
+                if THERMAL:
+                    T[i, j] = temp
+
+                shan_chen_x = 0.0
+                shan_chen_y = 0.0
+                if SHAN_CHEN:
+                    shan_chen_x, shan_chen_y = shan_chen_stencil(psi_halo, i, j, G)
+                force_x, force_y, u_x, u_y = cell_force(g, G, density[i, j], temp, u_x, u_y, alpha, T_ref, gravity, shan_chen_x, shan_chen_y)
+
+                usq = (u_x ** 2 + u_y ** 2) / (2 * cs2)
+                for k in range(Q):
+                    poly = velocity_poly(k, u_x, u_y, usq)
+                    store_out(f, i, j, k, nx, ny, bgk_collide(k, f_cell[k], w[k] * rho * poly, u_x, u_y, force_x, force_y, tau_f, omega_f))
+                    if THERMAL:
+                        g_k = g_cell[k]
+                        store_out(g, i, j, k, nx, ny, g_k - (g_k - w[k] * temp * poly) / tau_g)
+
+        @njit(parallel=True, cache=True)
+        def step(f, g, density, T, v_x, v_y, psi_halo, cells, nx, ny, solid, tau_f, tau_g, alpha, T_ref, gravity, G, psi_table, psi_inv_step):
+            # Every column is read for psi before any is collided, so the Shan-Chen pre-pass sees the old populations
+            if SHAN_CHEN:
+                for i in prange(nx):
+                    for j in range(ny):
+                        rho = 0.0
+                        for k in range(Q):
+                            rho += load_in(f, i, j, k, nx, ny)
+                        density[i, j] = rho
+                        psi_halo[i + 1, j + 1] = pseudopotential(rho, psi_table, psi_inv_step)
+                fill_psi_halo(psi_halo, nx, ny, WRAP_Y)
+
+            for i in prange(nx):
+                update_column(f, g, density, T, v_x, v_y, psi_halo, nx, ny, solid, tau_f, tau_g, alpha, T_ref, gravity, G, cells[i], i)
+
+        return step
+
+    INPLACE_KERNELS[key] = (make_parity(False), make_parity(True))
+    return INPLACE_KERNELS[key]
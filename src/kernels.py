@@ -1,8 +1,30 @@
-from numba import njit 
+import contextlib
+import warnings
+from numba import njit, prange, types
+from numba.core.errors import NumbaWarning
+from numba.extending import overload
 import numpy as np
 from .constants import *
+from .parallel import set_num_threads, get_num_threads
+from .layout import is_soa, soa_storage
+
+# Every lattice kernel comes in two flavours: the original allocating function, and an `_into`
+# variant that writes into caller-provided arrays and runs its outer loop over x with prange.
+# The allocating functions stay in Python since numba mixes up the None/array specializations
+# of a parallel kernel when it is called from another jitted function.
+#
+# All kernels are cached on disk (__pycache__ next to the sources), so each None/array specialization
+# is compiled once per machine rather than on every launch; `python -m src precompile` warms the cache.
+
+@contextlib.contextmanager
+def uncached_views():
+    # Compiled functions called with a jitclass view (SparseField, AAField, ShiftedField) cannot be cached on disk and
+    # are compiled once per process instead; this silences numba's warning about it around the calls that pass views
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="Cannot cache compiled function .* as it uses dynamic globals",
+                                category=NumbaWarning)
+        yield
 
-@njit
 def compute_macroscopic(f, g, nx, ny, nl, solid, density):
     density = np.zeros((nx, ny))
 
@@ -14,98 +36,221 @@ def compute_macroscopic(f, g, nx, ny, nl, solid, density):
     else:
         T = None
     
-    for i in range(nx):
+    compute_macroscopic_into(f, g, density, T, v_x, v_y, nx, ny, nl, solid)
+
+    return density, T, v_x, v_y
+
+@njit(parallel=True, cache=True)
+def compute_macroscopic_into(f, g, density, T, v_x, v_y, nx, ny, nl, solid):
+    for i in prange(nx):
         for j in range(ny):
+            rho = 0.0
+            u_x = 0.0
+            u_y = 0.0
+            temp = 0.0
             for k in range(nl):
-                density[i, j] += f[i, j, k]
-                v_x[i, j] += c_x[k] * f[i, j, k]
-                v_y[i, j] += c_y[k] * f[i, j, k]
+                rho += f[i, j, k]
+                u_x += c_x[k] * f[i, j, k]
+                u_y += c_y[k] * f[i, j, k]
 
                 if g is not None:
-                    T[i, j] += g[i, j, k]
+                    temp += g[i, j, k]
             
-            if density[i, j] > 0: # avoid division by zero
-                v_x[i, j] /= density[i, j]
-                v_y[i, j] /= density[i, j]
+            if rho > 0: # avoid division by zero
+                u_x /= rho
+                u_y /= rho
             
             if solid[i, j]:
-                v_x[i, j] = 0.0
-                v_y[i, j] = 0.0
+                u_x = 0.0
+                u_y = 0.0
 
-    return density, T, v_x, v_y
+            density[i, j] = rho
+            v_x[i, j] = u_x
+            v_y[i, j] = u_y
+            if g is not None:
+                T[i, j] = temp
 
-@njit
+@njit(cache=True)
 def psi(density: np.ndarray):
     return 1 - np.exp(-density)
 
-@njit
-def compute_shan_chen_force(density, nx, ny, nl, G):
+def compute_shan_chen_force(density, nx, ny, nl, G, psi_table=None):
+    # psi_table is an eos.PsiTable for an equation-of-state pseudopotential, 1 - exp(-rho) without one
     Fx = np.zeros_like(density)
     Fy = np.zeros_like(density)
+    psi_halo = np.empty((nx + 2, ny + 2))
+
+    table, inv_step = table_arrays(psi_table)
+    psi_halo_into(density, psi_halo, nx, ny, table, inv_step)
+    shan_chen_stencil_into(psi_halo, Fx, Fy, nx, ny, G)
+    return Fx, Fy
 
-    for i in range(nx):
+def table_arrays(psi_table):
+    if psi_table is None:
+        return None, 0.0
+    return psi_table.values, psi_table.inv_step
+
+# The Shan-Chen force from a psi buffer padded with a one cell halo: psi is evaluated once per cell
+# instead of once per neighbour, and the halo (periodic copies in x, zeros beyond the y walls, or
+# periodic copies in y too when the lattice wraps in y) lets the gradient stencil run without modulo
+# or bounds checks.
+@njit(cache=True)
+def psi_lookup(rho, table, inv_step):
+    # Linear interpolation in a pseudopotential table, see eos.py
+    x = rho * inv_step
+    n = min(max(int(x), 0), len(table) - 2)
+    t = x - n
+    return table[n] + t * (table[n + 1] - table[n])
+
+@njit(cache=True)
+def pseudopotential(rho, table, inv_step):
+    if table is None:
+        return psi(rho)
+    return psi_lookup(rho, table, inv_step)
+
+@njit(cache=True)
+def fill_psi_halo(psi_halo, nx, ny, wrap_y):
+    # x is always periodic; y is periodic when the streaming wraps it, otherwise there is nothing to interact with
+    for i in range(nx + 2):
+        if wrap_y:
+            psi_halo[i, 0] = psi_halo[i, ny]
+            psi_halo[i, ny + 1] = psi_halo[i, 1]
+        else:
+            psi_halo[i, 0] = 0.0
+            psi_halo[i, ny + 1] = 0.0
+    for j in range(ny + 2):
+        psi_halo[0, j] = psi_halo[nx, j]
+        psi_halo[nx + 1, j] = psi_halo[1, j]
+
+@njit(parallel=True, cache=True)
+def psi_halo_into(density, psi_halo, nx, ny, table, inv_step, wrap_y=False):
+    for i in prange(nx):
         for j in range(ny):
-            center_psi = psi(density[i, j])
-            fx = 0.0
-            fy = 0.0
+            psi_halo[i + 1, j + 1] = pseudopotential(density[i, j], table, inv_step)
+    fill_psi_halo(psi_halo, nx, ny, wrap_y)
 
-            for k in range(1, nl):
-                
-                x_new = (i + c_x[k]) % nx
-                y_new = j + c_y[k]
+@njit(cache=True)
+def shan_chen_stencil(psi_halo, i, j, G):
+    fx = 0.0
+    fy = 0.0
+    for k in range(1, Q):
+        neighbor_psi = psi_halo[i + 1 + c_x[k], j + 1 + c_y[k]]
+        fx += w[k] * neighbor_psi * c_x[k]
+        fy += w[k] * neighbor_psi * c_y[k]
 
-                if 0 <= y_new < ny:
-                    neighbor_psi = psi(density[x_new, y_new])
-                    fx += w[k] * neighbor_psi * c_x[k]
-                    fy += w[k] * neighbor_psi * c_y[k]
-                
-            Fx[i, j] = -G * center_psi * fx
-            Fy[i, j] = -G * center_psi * fy
-    return Fx, Fy
+    center_psi = psi_halo[i + 1, j + 1]
+    return -G * center_psi * fx, -G * center_psi * fy
+
+@njit(parallel=True, cache=True)
+def shan_chen_stencil_into(psi_halo, Fx, Fy, nx, ny, G):
+    for i in prange(nx):
+        for j in range(ny):
+            Fx[i, j], Fy[i, j] = shan_chen_stencil(psi_halo, i, j, G)
+
+@njit(cache=True)
+def cell_force(g, G, rho, temp, u_x, u_y, alpha, T_ref, gravity, shan_chen_x, shan_chen_y):
+    # Body force (buoyancy, gravity and the Shan-Chen force shan_chen_x, shan_chen_y) on a cell, and the velocity used
+    # in its equilibrium. g and G only select the terms: no buoyancy without g, no gravity or Shan-Chen without G
+    if g is not None:
+        buoyancy_force = alpha * (temp - T_ref) * gravity
+    else:
+        buoyancy_force = 0.0
+
+    if G is not None:
+        force_x = shan_chen_x
+        force_y = shan_chen_y + buoyancy_force - gravity * rho
+        u_x = u_x + (0.5 * force_x) / rho
+        u_y = u_y + (0.5 * force_y) / rho
+    else:
+        force_x = 0.0
+        force_y = buoyancy_force
+
+    return force_x, force_y, u_x, u_y
+
+@njit(cache=True)
+def bgk_collide(k, f_k, f_eq, u_x, u_y, force_x, force_y, tau, omega):
+    # BGK collision of direction k with the Guo source of the body force, omega = 1 - 0.5 / tau
+    return f_k - (f_k - f_eq) / tau + omega * guo_source(k, u_x, u_y, force_x, force_y)
 
-@njit
 def collision(density, T, v_x, v_y, f, g, nx, ny, nl, tau_f, tau_g, alpha, T_ref, gravity, G):
     f_new = np.zeros_like(f)
 
     if g is not None:
         g_new = np.zeros_like(g)
-        buoyancy_force = alpha * (T - T_ref) * gravity
-    
     else:
         g_new = None
-        buoyancy_force = np.zeros((nx, ny))
-    
+
     if G is not None:
         Fx, Fy = compute_shan_chen_force(density, nx, ny, nl, G)
-        Fy += buoyancy_force - gravity * density
-        v_x = v_x + (0.5 * Fx) / density
-        v_y = v_y + (0.5 * Fy) / density
-
     else:
-        Fx = np.zeros((nx, ny))
-        Fy = buoyancy_force
+        Fx = Fy = None
     
-    for k in range(nl):
-        cdotv = c_x[k] * v_x + c_y[k] * v_y
-
-        f_eq = w[k] * density * (1 + cdotv/cs2 + (cdotv ** 2) / (2 * cs2 ** 2) - (v_x ** 2 + v_y ** 2) / (2 * cs2))
-        collision_term = -(f[:, :, k] - f_eq) / tau_f
-
-        # if g is not None: Fx = 0, Fy = 0, source_term = 0
-        source_term = (1 - 0.5 / tau_f) * w[k] * (
-        ((c_x[k] - v_x) * Fx + (c_y[k] - v_y) * Fy) / cs2 + 
-        (cdotv * (c_x[k] * Fx + c_y[k] * Fy) / cs2 ** 2))
- 
-        
-        f_new[:, :, k] = f[:, :, k] + collision_term + source_term
-
-        if g is not None:
-            g_eq = w[k] * T * (1 + cdotv/cs2 + (cdotv ** 2) / (2 * cs2 ** 2) - (v_x ** 2 + v_y ** 2) / (2 * cs2))
-            g_new[:, :, k] = g[:, :, k] - (g[:, :, k] - g_eq) / tau_g
+    collision_into(density, T, v_x, v_y, f, g, f_new, g_new, nx, ny, nl, tau_f, tau_g, alpha, T_ref, gravity, G, Fx, Fy)
             
     return f_new, g_new
 
-@njit
+@njit(parallel=True, cache=True)
+def collision_into(density, T, v_x, v_y, f, g, f_new, g_new, nx, ny, nl, tau_f, tau_g, alpha, T_ref, gravity, G, Fx, Fy):
+    # Fx, Fy: the Shan-Chen force of every cell (see shan_chen_stencil_into), None without G
+    omega_f = 1 - 0.5 / tau_f
+    for i in prange(nx):
+        for j in range(ny):
+            rho = density[i, j]
+            temp = T[i, j] if g is not None else 0.0
+            shan_chen_x = Fx[i, j] if G is not None else 0.0
+            shan_chen_y = Fy[i, j] if G is not None else 0.0
+            force_x, force_y, u_x, u_y = cell_force(g, G, rho, temp, v_x[i, j], v_y[i, j], alpha, T_ref, gravity, shan_chen_x, shan_chen_y)
+
+            usq = (u_x ** 2 + u_y ** 2) / (2 * cs2)
+            for k in range(nl):
+                poly = velocity_poly(k, u_x, u_y, usq)
+                f_new[i, j, k] = bgk_collide(k, f[i, j, k], w[k] * rho * poly, u_x, u_y, force_x, force_y, tau_f, omega_f)
+                if g is not None:
+                    g_new[i, j, k] = g[i, j, k] - (g[i, j, k] - w[k] * temp * poly) / tau_g
+
+def as_flag(value, name):
+    # Boolean options used to be passed as the strings "True"/"False", both spellings are accepted
+    if value in (True, "True"):
+        return True
+    if value in (False, "False", None):
+        return False
+    raise ValueError(f"{name} must be True or False, got {value!r}")
+
+def flag_enabled(flag):
+    return as_flag(flag, "flag")
+
+@overload(flag_enabled)
+def flag_enabled_overload(flag):
+    # Compiled as_flag, resolved on the argument type
+    if isinstance(flag, types.Boolean):
+        return lambda flag: flag
+    if isinstance(flag, types.UnicodeType):
+        return lambda flag: flag == "True"
+    if isinstance(flag, (types.NoneType, types.Omitted)):
+        return lambda flag: False
+
+@njit(cache=True)
+def streaming_rules(periodic, multiphase):
+    # Resolves the periodic/multiphase flags into (wrap_x, wrap_y, drop_x, drop_y). Populations leaving
+    # through a wrapped axis re-enter on the other side, through a dropped axis they are lost,
+    # otherwise they bounce back.
+    wrap_x = False
+    wrap_y = False
+    drop_x = False
+    drop_y = False
+    if periodic == "x":
+        wrap_x = True
+        if flag_enabled(multiphase):
+            drop_y = True
+    elif periodic == "y":
+        wrap_y = True
+        drop_x = True
+    elif periodic == "xy":
+        wrap_x = True
+        wrap_y = True
+
+    return wrap_x, wrap_y, drop_x, drop_y
+
 def streaming(f, g, nx, ny, nl, periodic, density, multiphase):
     f_new = np.zeros_like(f)
 
@@ -114,44 +259,470 @@ def streaming(f, g, nx, ny, nl, periodic, density, multiphase):
     else:
         g_new = None
 
-    for i in range(nx):
+    streaming_into(f, g, f_new, g_new, nx, ny, nl, periodic, density, multiphase)
+
+    return f_new, g_new, density
+
+@njit(parallel=True, cache=True)
+def streaming_into(f, g, f_new, g_new, nx, ny, nl, periodic, density, multiphase):
+    # Pull formulation: every cell gathers its incoming populations, so each thread only writes the
+    # columns it owns and the scatter can never race
+    wrap_x, wrap_y, drop_x, drop_y = streaming_rules(periodic, multiphase)
+
+    for i in prange(nx):
         for j in range(ny):
+            rho = 0.0
             for k in range(nl):
-                next_i = i + c_x[k]
-                next_j = j + c_y[k]
+                prev_i = i - c_x[k]
+                prev_j = j - c_y[k]
+                if wrap_x:
+                    prev_i = prev_i % nx
+                if wrap_y:
+                    prev_j = prev_j % ny
 
-                if periodic == "x":
-                    next_i = next_i % nx
-
-                    if multiphase == "True":
-                        if next_j < 0 or next_j >= ny:
-                            continue
+                if prev_i < 0 or prev_i >= nx:
+                    # the population would have left this cell through an x boundary
+                    if drop_x:
+                        f_new[i, j, k] = 0.0
+                        if g is not None:
+                            g_new[i, j, k] = 0.0
+                    else:
+                        f_new[i, j, k] = f[i, j, opp_dir[k]]
+                        if g is not None:
+                            g_new[i, j, k] = g[i, j, opp_dir[k]]
+                elif prev_j < 0 or prev_j >= ny:
+                    if drop_y:
+                        f_new[i, j, k] = 0.0
+                        if g is not None:
+                            g_new[i, j, k] = 0.0
+                    else:
+                        # bounce-back
+                        f_new[i, j, k] = f[i, j, opp_dir[k]]
+                        if g is not None:
+                            g_new[i, j, k] = g[i, j, opp_dir[k]]
+                else:
+                    # normal streaming
+                    f_new[i, j, k] = f[prev_i, prev_j, k]
+                    if g is not None:
+                        g_new[i, j, k] = g[prev_i, prev_j, k]
                 
-                elif periodic == "y":
-                    next_j = next_j % ny
+                rho += f_new[i, j, k]
 
-                    if next_i < 0 or next_i >= nx:
-                        continue
-                
-                elif periodic == "xy":
+            if density is not None:
+                density[i, j] = rho
+
+def collide_and_stream(f, g, nx, ny, nl, solid, tau_f, tau_g, alpha, T_ref, gravity, G, periodic, multiphase, psi_table=None):
+    # Fused replacement for the compute_macroscopic -> collision -> streaming chain
+    f_new = np.empty_like(f)
+    density = np.empty((nx, ny))
+    v_x = np.empty((nx, ny))
+    v_y = np.empty((nx, ny))
+
+    if g is not None:
+        g_new = np.empty_like(g)
+        T = np.empty((nx, ny))
+    else:
+        g_new = None
+        T = None
+
+    if is_soa(f):
+        fused_step_soa(soa_storage(f), soa_storage(g), soa_storage(f_new), soa_storage(g_new), density, T, v_x, v_y,
+                       nx, ny, nl, solid, tau_f, tau_g, alpha, T_ref, gravity, G, periodic, multiphase, psi_table)
+    else:
+        fused_step(f, g, f_new, g_new, density, T, v_x, v_y, nx, ny, nl, solid, tau_f, tau_g, alpha, T_ref, gravity, G, periodic, multiphase, psi_table)
+
+    return f_new, g_new, density, T, v_x, v_y
+
+# Specialized step kernels. make_step compiles one fused step per physics configuration, with the
+# thermal/Shan-Chen switches and the streaming rules baked in as compile-time constants, so the per-cell
+# loop carries no runtime flag tests and numba prunes the unused code paths. Kernels are cached in
+# STEP_KERNELS for the process and on disk like every other kernel.
+PERIODIC = (None, "x", "y", "xy")
+COLLISIONS = ("bgk", "trt", "mrt")
+TRT_MAGIC = 3 / 16 # places the bounce-back wall exactly halfway between nodes for Poiseuille flow
+# s_e, s_eps, s_q of the mrt collision. The (1.64, 1.54, 1.9) of Lallemand & Luo, Phys. Rev. E 61, 6546 (2000), blow up
+# before BGK does in the cylinder benchmarks as tau_f approaches 0.5, a smaller s_q keeps the run stable much longer.
+MRT_RATES = (1.4, 1.4, 1.2)
+STEP_KERNELS = {}
+ENSEMBLE_KERNELS = {}
+
+def step_config(g, G, periodic, multiphase):
+    # Validates the configuration up front and returns its make_step key (thermal, shan_chen, periodic, multiphase)
+    if periodic not in PERIODIC:
+        raise ValueError(f"periodic must be one of {PERIODIC}, got {periodic!r}")
+    return g is not None, G is not None, periodic, as_flag(multiphase, "multiphase")
+
+def check_parameters(f, g, solid, tau_f, tau_g, alpha, T_ref, gravity, G, psi_table=None):
+    # Parameters the configuration needs, and array shapes that agree with each other
+    if tau_f is None:
+        raise ValueError("tau_f is required")
+    if psi_table is not None and G is None:
+        raise ValueError("a pseudopotential table needs the Shan-Chen interaction strength G")
+    if psi_table is not None and np.any(np.asarray(G, dtype=np.float64) != psi_table.G):
+        raise ValueError(f"the pseudopotential table was built for G = {psi_table.G}, got G = {G}")
+    if g is not None:
+        missing = [name for name, value in (("tau_g", tau_g), ("alpha", alpha), ("T_ref", T_ref), ("gravity", gravity)) if value is None]
+        if missing:
+            raise ValueError(f"a thermal simulation (g given) also needs {', '.join(missing)}")
+        if g.shape != f.shape:
+            raise ValueError(f"g has shape {g.shape} but f has shape {f.shape}")
+    if f.ndim != 3 or f.shape[2] != Q:
+        raise ValueError(f"populations must have shape (nx, ny, {Q}), got {f.shape}")
+    if solid.shape != f.shape[:2]:
+        raise ValueError(f"solid has shape {solid.shape} but the lattice is {f.shape[:2]}")
+
+def check_collision(collision, magic=None, moment_rates=None):
+    if collision not in COLLISIONS:
+        raise ValueError(f"collision must be one of {COLLISIONS}, got {collision!r}")
+    if magic is not None and collision != "trt":
+        raise ValueError("the magic parameter only applies to the trt collision")
+    if moment_rates is not None and collision != "mrt":
+        raise ValueError("moment_rates only apply to the mrt collision")
+    if moment_rates is not None and len(moment_rates) != len(MRT_RATES):
+        raise ValueError(f"moment_rates must be the {len(MRT_RATES)} rates (s_e, s_eps, s_q), got {moment_rates!r}")
+
+def collision_rates(collision, tau_f, magic=None, moment_rates=None):
+    # The relaxation rates the step kernel takes for a collision operator: None for BGK, (omega_plus, omega_minus)
+    # for TRT and the rate of every moment of mrt_collide for MRT. The shear moments relax with 1 / tau_f, so the
+    # viscosity is the BGK one. The conserved moments have no non-equilibrium part and only see the forcing, which
+    # is exact for any rate, so they also use 1 / tau_f and MRT with every rate 1 / tau_f is BGK.
+    check_collision(collision, magic, moment_rates)
+    omega = 1 / tau_f
+    if collision == "trt":
+        # magic = (1 / omega_plus - 1/2) * (1 / omega_minus - 1/2)
+        magic = TRT_MAGIC if magic is None else magic
+        return np.array([omega, 1 / (magic / (tau_f - 0.5) + 0.5)])
+    if collision == "mrt":
+        s_e, s_eps, s_q = MRT_RATES if moment_rates is None else moment_rates
+        return np.array([omega, s_e, s_eps, omega, s_q, omega, s_q, omega, omega], dtype=np.float64)
+    return None
+
+@njit(cache=True)
+def velocity_poly(k, u_x, u_y, usq):
+    # Velocity polynomial of the equilibrium of direction k, shared by f and g: f_eq = w[k] * rho * poly
+    cdotv = c_x[k] * u_x + c_y[k] * u_y
+    return 1 + cdotv/cs2 + (cdotv ** 2) / (2 * cs2 ** 2) - usq
+
+@njit(cache=True)
+def equilibrium(k, rho, u_x, u_y, usq):
+    return w[k] * rho * velocity_poly(k, u_x, u_y, usq)
+
+@njit(cache=True)
+def guo_source(k, u_x, u_y, force_x, force_y):
+    # Guo forcing term of direction k, before the (1 - rate / 2) factor of the collision
+    cdotv = c_x[k] * u_x + c_y[k] * u_y
+    return w[k] * (((c_x[k] - u_x) * force_x + (c_y[k] - u_y) * force_y) / cs2 +
+                   (cdotv * (c_x[k] * force_x + c_y[k] * force_y) / cs2 ** 2))
+
+@njit(cache=True)
+def relaxed(moment, source_moment, rate, norm):
+    return (-rate * moment + (1 - 0.5 * rate) * source_moment) / norm
+
+@njit(cache=True)
+def mrt_collide(neq, source, rates):
+    # Replaces neq (f - f_eq) by the MRT change of the populations, f_post - f, given the Guo source of every
+    # direction. Moments are those of Lallemand & Luo in the order rho, e, eps, j_x, q_x, j_y, q_y, p_xx, p_xy; the
+    # transform and its inverse (transpose over the squared row norms 9, 36, 36, 6, 12, 6, 12, 4, 4) are unrolled
+    # for the D2Q9 directions of constants.py.
+    d0, d1, d2, d3, d4, d5, d6, d7, d8 = neq[0], neq[1], neq[2], neq[3], neq[4], neq[5], neq[6], neq[7], neq[8]
+    s0, s1, s2, s3, s4, s5, s6, s7, s8 = source[0], source[1], source[2], source[3], source[4], source[5], source[6], source[7], source[8]
+    axis = d1 + d2 + d3 + d4
+    diagonal = d5 + d6 + d7 + d8
+    axis_s = s1 + s2 + s3 + s4
+    diagonal_s = s5 + s6 + s7 + s8
+    # Relaxed change of every moment, scaled by the inverse squared norm of its row
+    rho = relaxed(d0 + axis + diagonal, s0 + axis_s + diagonal_s, rates[0], 9.0)
+    e = relaxed(-4 * d0 - axis + 2 * diagonal, -4 * s0 - axis_s + 2 * diagonal_s, rates[1], 36.0)
+    eps = relaxed(4 * d0 - 2 * axis + diagonal, 4 * s0 - 2 * axis_s + diagonal_s, rates[2], 36.0)
+    j_x = relaxed(d1 - d3 + d5 - d6 - d7 + d8, s1 - s3 + s5 - s6 - s7 + s8, rates[3], 6.0)
+    q_x = relaxed(-2 * d1 + 2 * d3 + d5 - d6 - d7 + d8, -2 * s1 + 2 * s3 + s5 - s6 - s7 + s8, rates[4], 12.0)
+    j_y = relaxed(d2 - d4 + d5 + d6 - d7 - d8, s2 - s4 + s5 + s6 - s7 - s8, rates[5], 6.0)
+    q_y = relaxed(-2 * d2 + 2 * d4 + d5 + d6 - d7 - d8, -2 * s2 + 2 * s4 + s5 + s6 - s7 - s8, rates[6], 12.0)
+    p_xx = relaxed(d1 - d2 + d3 - d4, s1 - s2 + s3 - s4, rates[7], 4.0)
+    p_xy = relaxed(d5 - d6 + d7 - d8, s5 - s6 + s7 - s8, rates[8], 4.0)
+
+    axis = rho - e - 2 * eps
+    diagonal = rho + 2 * e + eps
+    neq[0] = rho - 4 * e + 4 * eps
+    neq[1] = axis + j_x - 2 * q_x + p_xx
+    neq[2] = axis + j_y - 2 * q_y - p_xx
+    neq[3] = axis - j_x + 2 * q_x + p_xx
+    neq[4] = axis - j_y + 2 * q_y - p_xx
+    neq[5] = diagonal + j_x + q_x + j_y + q_y + p_xy
+    neq[6] = diagonal - j_x - q_x + j_y + q_y - p_xy
+    neq[7] = diagonal - j_x - q_x - j_y - q_y + p_xy
+    neq[8] = diagonal + j_x + q_x - j_y - q_y - p_xy
+
+def make_step(thermal, shan_chen, periodic, multiphase, soa=False, collision="bgk", shifted=False, streaming=None):
+    # Returns step(f, g, f_new, g_new, density, T, v_x, v_y, psi_halo, cells, nx, ny, solid, tau_f, tau_g, alpha, T_ref,
+    # gravity, G, rates, residual, psi_table, psi_inv_step, i_start, i_end), the fused step of fused_step below for one
+    # configuration.
+    # With soa the populations are passed as their (nl, nx, ny) storage, see layout.py. psi_halo is the (nx + 2, ny + 2)
+    # Shan-Chen work buffer and psi_table/psi_inv_step an optional pseudopotential table (table_arrays). rates are the
+    # relaxation rates of the trt or mrt collision of f (collision_rates); g always relaxes with BGK and tau_g.
+    # cells is their (nx, 2, Q) work buffer (collision_buffer).
+    # residual is an optional (nx, 4) output: for every column the sums over j of |u - u_old| ** 2, |u| ** 2,
+    # (T - T_old) ** 2 and T ** 2, with u_old and T_old the fields the step overwrites (see steady.py).
+    # With shifted the populations are stored as their deviations f - w[k] and g - w[k] * T_ref, e.g. in float32 (see
+    # precision.py); they are loaded into float64 locals, so the moments and collision are computed in double precision.
+    # Arguments the configuration does not use may be None.
+    # Only the columns i_start <= i < i_end are collided and pushed (0, nx for the whole lattice), so a lattice can be
+    # stepped in parts, e.g. the interior of a subdomain while its halos are in flight. With Shan-Chen the density and
+    # psi are gathered one column further on each side, which must already hold the current populations.
+    # streaming is an explicit (wrap_x, wrap_y, drop_x, drop_y) in place of the streaming_rules of periodic and
+    # multiphase, e.g. for the slabs of decomposition.py, which never wrap x but keep the y rules of the whole lattice.
+    check_collision(collision)
+    step_config(None, None, periodic, multiphase)
+    streaming = resolved_streaming(periodic, multiphase, streaming)
+    key = (thermal, shan_chen, streaming, soa, collision, shifted)
+    if key in STEP_KERNELS:
+        return STEP_KERNELS[key]
+
+    THERMAL = thermal
+    SHAN_CHEN = shan_chen
+    TRT = collision == "trt"
+    MRT = collision == "mrt"
+    SHIFTED = shifted
+    WRAP_X, WRAP_Y, DROP_X, DROP_Y = streaming
+    load_stored = load_soa if soa else load_aos
+    store_stored = store_soa if soa else store_aos
+
+    # Absolute populations in and out of storage, offset is 1 for f and T_ref for g
+    @njit(cache=True)
+    def load(f, i, j, k, offset=1.0):
+        if SHIFTED:
+            return load_stored(f, i, j, k) + w[k] * offset
+        return load_stored(f, i, j, k)
+
+    @njit(cache=True)
+    def store(f, i, j, k, value, offset=1.0):
+        if SHIFTED:
+            store_stored(f, i, j, k, value - w[k] * offset)
+        else:
+            store_stored(f, i, j, k, value)
+
+    @njit(cache=True)
+    def gather_psi(f, density, psi_halo, ny, psi_table, psi_inv_step, i):
+        # Density and psi of column i, the Shan-Chen pre-pass
+        for j in range(ny):
+            rho = 0.0
+            for k in range(Q):
+                rho += load(f, i, j, k)
+            density[i, j] = rho
+            psi_halo[i + 1, j + 1] = pseudopotential(rho, psi_table, psi_inv_step)
+
+    @njit(cache=True)
+    def update_column(f, g, f_new, g_new, density, T, v_x, v_y, psi_halo, cells, nx, ny, solid, tau_f, tau_g, alpha, T_ref, gravity, G, rates, residual, i):
+        # Moments, collision and push of column i
+        omega_f = 1 - 0.5 / tau_f
+        change_u = 0.0
+        norm_u = 0.0
+        change_T = 0.0
+        norm_T = 0.0
+        if TRT or MRT:
+            # f - f_eq and the Guo source of every direction of a cell, which the collision combines across directions
+            neq = cells[i, 0]
+            source = cells[i, 1]
+        for j in range(ny):
+            rho = 0.0
+            u_x = 0.0
+            u_y = 0.0
+            temp = 0.0
+            for k in range(Q):
+                f_k = load(f, i, j, k)
+                rho += f_k
+                u_x += c_x[k] * f_k
+                u_y += c_y[k] * f_k
+                if THERMAL:
+                    temp += load(g, i, j, k, T_ref)
+
+            if rho > 0: # avoid division by zero
+                u_x /= rho
+                u_y /= rho
+
+            if solid[i, j]:
+                u_x = 0.0
+                u_y = 0.0
+
+            if residual is not None:
+                # Change of the fields since the previous step, read before they are overwritten
+                change_u += (u_x - v_x[i, j]) ** 2 + (u_y - v_y[i, j]) ** 2
+                norm_u += u_x ** 2 + u_y ** 2
+                if THERMAL:
+                    change_T += (temp - T[i, j]) ** 2
+                    norm_T += temp ** 2
+
+            if not SHAN_CHEN:
+                density[i, j] = rho
+            v_x[i, j] = u_x
+            v_y[i, j] = u_y
+            if THERMAL:
+                T[i, j] = temp
+
+            shan_chen_x = 0.0
+            shan_chen_y = 0.0
+            if SHAN_CHEN:
+                shan_chen_x, shan_chen_y = shan_chen_stencil(psi_halo, i, j, G)
+            force_x, force_y, u_x, u_y = cell_force(g, G, density[i, j], temp, u_x, u_y, alpha, T_ref, gravity, shan_chen_x, shan_chen_y)
+
+            usq = (u_x ** 2 + u_y ** 2) / (2 * cs2)
+            if TRT or MRT:
+                for k in range(Q):
+                    neq[k] = load(f, i, j, k) - equilibrium(k, rho, u_x, u_y, usq)
+                    source[k] = guo_source(k, u_x, u_y, force_x, force_y)
+            if MRT:
+                mrt_collide(neq, source, rates)
+
+            for k in range(Q):
+                poly = velocity_poly(k, u_x, u_y, usq)
+                f_k = load(f, i, j, k)
+                if MRT:
+                    f_post = f_k + neq[k]
+                elif TRT:
+                    # Symmetric and antisymmetric parts of the pair (k, opp_dir[k]) relax with their own rate
+                    k_opp = opp_dir[k]
+                    f_post = (f_k - rates[0] * 0.5 * (neq[k] + neq[k_opp]) - rates[1] * 0.5 * (neq[k] - neq[k_opp])
+                                  + (1 - 0.5 * rates[0]) * 0.5 * (source[k] + source[k_opp])
+                                  + (1 - 0.5 * rates[1]) * 0.5 * (source[k] - source[k_opp]))
+                else:
+                    f_post = bgk_collide(k, f_k, w[k] * rho * poly, u_x, u_y, force_x, force_y, tau_f, omega_f)
+
+                g_post = 0.0
+                if THERMAL:
+                    g_k = load(g, i, j, k, T_ref)
+                    g_post = g_k - (g_k - w[k] * temp * poly) / tau_g
+
+                next_i = i + c_x[k]
+                next_j = j + c_y[k]
+                if WRAP_X:
                     next_i = next_i % nx
+                if WRAP_Y:
                     next_j = next_j % ny
-                
-                # check if next cell is out-of-bounds (non-periodic) or solid
-                if (next_i < 0 or next_i >= nx or next_j < 0 or next_j >= ny):
-                    # bounce-back
-                    f_new[i, j, opp_dir[k]] = f[i, j, k]
-                    if g is not None:
-                        g_new[i, j, opp_dir[k]] = g[i, j, k]
+
+                if next_i < 0 or next_i >= nx:
+                    if DROP_X:
+                        # nothing streams into the slot the bounce-back would have filled
+                        f_post = 0.0
+                        g_post = 0.0
+                    store(f_new, i, j, opp_dir[k], f_post)
+                    if THERMAL:
+                        store(g_new, i, j, opp_dir[k], g_post, T_ref)
+                elif next_j < 0 or next_j >= ny:
+                    if DROP_Y:
+                        f_post = 0.0
+                        g_post = 0.0
+                    store(f_new, i, j, opp_dir[k], f_post)
+                    if THERMAL:
+                        store(g_new, i, j, opp_dir[k], g_post, T_ref)
                 else:
-                    # normal streaming
-                    f_new[next_i, next_j, k] = f[i, j, k]
-                    if g is not None:
-                        g_new[next_i, next_j, k] = g[i, j, k]
-    
-    if density is not None:
-        density[:, :] = 0
-        for k in range(nl):
-            density += f_new[:, :, k]
+                    store(f_new, next_i, next_j, k, f_post)
+                    if THERMAL:
+                        store(g_new, next_i, next_j, k, g_post, T_ref)
+
+        if residual is not None:
+            residual[i, 0] = change_u
+            residual[i, 1] = norm_u
+            residual[i, 2] = change_T
+            residual[i, 3] = norm_T
+
+    @njit(parallel=True, cache=True)
+    def step(f, g, f_new, g_new, density, T, v_x, v_y, psi_halo, cells, nx, ny, solid, tau_f, tau_g, alpha, T_ref, gravity, G, rates, residual, psi_table, psi_inv_step, i_start, i_end):
+        # Shan-Chen forces need psi of the neighbours, so density and psi are gathered before the fused pass
+        if SHAN_CHEN:
+            for i in prange(max(i_start - 1, 0), min(i_end + 1, nx)):
+                gather_psi(f, density, psi_halo, ny, psi_table, psi_inv_step, i)
+            fill_psi_halo(psi_halo, nx, ny, WRAP_Y)
+
+        for i in prange(i_start, i_end):
+            update_column(f, g, f_new, g_new, density, T, v_x, v_y, psi_halo, cells, nx, ny, solid, tau_f, tau_g, alpha, T_ref, gravity, G, rates, residual, i)
+
+    @njit(parallel=True, cache=True)
+    def ensemble_step(f, g, f_new, g_new, density, T, v_x, v_y, psi_halo, cells, nx, ny, solid, tau_f, tau_g, alpha, T_ref, gravity, G, rates, psi_table, psi_inv_step):
+        # step for a batch of lattices: every array has a leading member axis and every parameter is an array with one
+        # value per member. Members and columns are flattened into one parallel loop, so small lattices still fill the cores.
+        members = f.shape[0]
+        if SHAN_CHEN:
+            for index in prange(members * nx):
+                m = index // nx
+                gather_psi(f[m], density[m], psi_halo[m], ny, psi_table, psi_inv_step, index % nx)
+            for m in prange(members):
+                fill_psi_halo(psi_halo[m], nx, ny, WRAP_Y)
+
+        for index in prange(members * nx):
+            m = index // nx
+            update_column(f[m], member(g, m), f_new[m], member(g_new, m), density[m], member(T, m), v_x[m], v_y[m],
+                          member(psi_halo, m), member(cells, m), nx, ny, solid[m], tau_f[m], member(tau_g, m), member(alpha, m),
+                          member(T_ref, m), member(gravity, m), member(G, m), member(rates, m), None, index % nx)
+
+    STEP_KERNELS[key] = step
+    ENSEMBLE_KERNELS[key] = ensemble_step
+    return step
+
+def make_ensemble_step(thermal, shan_chen, periodic, multiphase, soa=False, collision="bgk"):
+    # Returns ensemble_step(f, g, f_new, g_new, density, T, v_x, v_y, psi_halo, cells, nx, ny, solid, tau_f, tau_g, alpha,
+    # T_ref, gravity, G, rates, psi_table, psi_inv_step), the step of make_step for a batch of members that share the configuration
+    # and lattice size. Arrays carry a leading member axis, parameters are (members,) arrays or None when unused, and
+    # rates is (members, rates) for trt and mrt.
+    make_step(thermal, shan_chen, periodic, multiphase, soa, collision)
+    return ENSEMBLE_KERNELS[(thermal, shan_chen, resolved_streaming(periodic, multiphase), soa, collision, False)]
+
+def resolved_streaming(periodic, multiphase, streaming=None):
+    # The (wrap_x, wrap_y, drop_x, drop_y) rules a step kernel is compiled for
+    if streaming is None:
+        streaming = streaming_rules(periodic, as_flag(multiphase, "multiphase"))
+    return tuple(bool(rule) for rule in streaming)
+
+def member(array, m):
+    return array[m] if array is not None else None
+
+@overload(member)
+def member_overload(array, m):
+    # Compiled member, resolved on the argument type: arguments a configuration does not use stay None
+    if isinstance(array, (types.NoneType, types.Omitted)):
+        return lambda array, m: None
+    return lambda array, m: array[m]
+
+@njit(cache=True)
+def load_aos(f, i, j, k):
+    return f[i, j, k]
+
+@njit(cache=True)
+def store_aos(f, i, j, k, value):
+    f[i, j, k] = value
+
+@njit(cache=True)
+def load_soa(f, i, j, k):
+    return f[k, i, j]
+
+@njit(cache=True)
+def store_soa(f, i, j, k, value):
+    f[k, i, j] = value
+
+def fused_step(f, g, f_new, g_new, density, T, v_x, v_y, nx, ny, nl, solid, tau_f, tau_g, alpha, T_ref, gravity, G, periodic, multiphase, psi_table=None):
+    # Computes moments, BGK-collides with the Guo forcing term and pushes the populations to the
+    # neighbours in one pass. Every (cell, direction) destination is written by exactly one source,
+    # so columns can run in parallel without races. Every slot of f_new/g_new is written, so they can be reused
+    # between steps without clearing.
+    step = make_step(*step_config(g, G, periodic, multiphase))
+    step(f, g, f_new, g_new, density, T, v_x, v_y, psi_buffer(nx, ny, G), None, nx, ny, solid, tau_f, tau_g, alpha, T_ref,
+         force_gravity(gravity, G), G, None, None, *table_arrays(psi_table), 0, nx)
+
+def fused_step_soa(f, g, f_new, g_new, density, T, v_x, v_y, nx, ny, nl, solid, tau_f, tau_g, alpha, T_ref, gravity, G, periodic, multiphase, psi_table=None):
+    # fused_step on (nl, nx, ny) storage, indexed f[k, i, j]; see layout.py
+    step = make_step(*step_config(g, G, periodic, multiphase), soa=True)
+    step(f, g, f_new, g_new, density, T, v_x, v_y, psi_buffer(nx, ny, G), None, nx, ny, solid, tau_f, tau_g, alpha, T_ref,
+         force_gravity(gravity, G), G, None, None, *table_arrays(psi_table), 0, nx)
+
+def psi_buffer(nx, ny, G):
+    # Shan-Chen work buffer of the step kernels, only needed when G is set
+    return np.empty((nx + 2, ny + 2)) if G is not None else None
+
+def collision_buffer(nx, collision):
+    # trt and mrt work buffer of the step kernels, f - f_eq and the Guo source of a cell for every column
+    return np.empty((nx, 2, Q)) if collision != "bgk" else None
 
-    return f_new, g_new, density
\ No newline at end of file
+def force_gravity(gravity, G):
+    # Shan-Chen subtracts gravity * rho, treat a missing gravity as none at all
+    if G is not None and gravity is None:
+        return 0.0
+    return gravity
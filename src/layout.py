@@ -0,0 +1,34 @@
+import numpy as np
+
+# Populations are always indexed f[i, j, k], but the memory behind them can be laid out two ways:
+#   "aos" (array of structures): (nx, ny, nl) storage, the 9 populations of a cell sit next to each other
+#   "soa" (structure of arrays): (nl, nx, ny) storage, one contiguous plane per lattice direction
+# An SoA array is handed around as the transposed view of its (nl, nx, ny) storage, so init functions and
+# boundary conditions work on it unchanged and np.empty_like keeps the layout. The SoA step kernel reads
+# the storage directly, where the streaming loads and stores of one direction are contiguous.
+LAYOUTS = ("aos", "soa")
+
+def is_soa(f):
+    # Direction index has the largest stride
+    return f.ndim == 3 and f.strides[2] > f.strides[0]
+
+def to_soa(f):
+    if f is None or is_soa(f):
+        return f
+    return np.ascontiguousarray(f.transpose(2, 0, 1)).transpose(1, 2, 0)
+
+def to_aos(f):
+    if f is None:
+        return f
+    return np.ascontiguousarray(f)
+
+def to_layout(f, layout):
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}, got {layout!r}")
+    return to_soa(f) if layout == "soa" else to_aos(f)
+
+def soa_storage(f):
+    # The contiguous (nl, nx, ny) array behind an SoA population view
+    if f is None:
+        return f
+    return f.transpose(2, 0, 1)
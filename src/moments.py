@@ -0,0 +1,21 @@
+import numpy as np
+from .constants import *
+
+# NumPy moments and BGK equilibria of whole population arrays, outside the kernels: for building and rescaling
+# populations at setup, e.g. the spin-up of steady.py and the coarse-fine transfers of refinement.py.
+
+def moments_of(f):
+    # Density and velocity of populations (..., nl)
+    rho = f.sum(axis=-1)
+    safe = np.where(rho > 0, rho, 1.0)
+    return rho, (f @ c_x) / safe, (f @ c_y) / safe
+
+def equilibrium_of(f):
+    # The BGK equilibrium of populations (..., nl) at their own density and velocity
+    return equilibrium_at(*moments_of(f))
+
+def equilibrium_at(rho, u_x, u_y):
+    # The BGK equilibrium populations (..., nl) of density and velocity fields (...)
+    cdotv = u_x[..., None] * c_x + u_y[..., None] * c_y
+    usq = (u_x ** 2 + u_y ** 2)[..., None]
+    return w * rho[..., None] * (1 + cdotv / cs2 + cdotv ** 2 / (2 * cs2 ** 2) - usq / (2 * cs2))
@@ -0,0 +1,19 @@
+import os
+import numba
+
+# Number of threads used by the prange loops in the kernels. Can be set before launch with the
+# SCALD_NUM_THREADS environment variable or at runtime with set_num_threads.
+def max_threads():
+    return numba.config.NUMBA_NUM_THREADS
+
+def get_num_threads():
+    return numba.get_num_threads()
+
+def set_num_threads(n_threads):
+    n_threads = int(n_threads)
+    if not 1 <= n_threads <= max_threads():
+        raise ValueError(f"Number of threads must be between 1 and {max_threads()}, got {n_threads}.")
+    numba.set_num_threads(n_threads)
+
+if os.environ.get("SCALD_NUM_THREADS"):
+    set_num_threads(os.environ["SCALD_NUM_THREADS"])
@@ -0,0 +1,59 @@
+import numpy as np
+from numba import float32, float64
+from numba.experimental import jitclass
+from .constants import *
+
+# Single precision storage. The step is memory bound, so storing the populations and macroscopic fields as float32
+# halves both the memory of a lattice and the bytes a step moves. float32 keeps about 7 significant digits, and the
+# information of a population sits in its small departure from the rest equilibrium w[k] * rho (u ~ 0.1 moves it by
+# a few percent, the viscous stress by far less), so a float32 Simulation stores the deviations
+#     f[i, j, k] - w[k]            and            g[i, j, k] - w[k] * T_ref
+# instead, which spends the mantissa on the departure rather than on the part every cell shares. The step kernel
+# loads the deviations into float64 locals and adds the offsets back, so moments, equilibria and collision are
+# computed (and accumulated) in double precision and only the stored values are rounded.
+#
+# Simulation(..., precision="float32") converts float64 populations from the init functions once at setup. Boundary
+# conditions are the bc(f, g) callables of Simulation and get ShiftedField views that read and write the absolute
+# populations, f[i, j, k], so the compiled boundary conditions of boundaries.py run unchanged; slicing is not
+# supported. sim.populations() returns the absolute f and g as float64 arrays, e.g. for a checkpoint.
+PRECISIONS = {"float64": np.float64, "float32": np.float32}
+
+@jitclass([("data", float32[:, :, :]), ("offset", float64[:])])
+class ShiftedField:
+    # Absolute f[i, j, k] indexing of float32 deviations from offset[k]
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+
+    def __getitem__(self, key):
+        i, j, k = key
+        return self.data[i, j, k] + self.offset[k]
+
+    def __setitem__(self, key, value):
+        i, j, k = key
+        self.data[i, j, k] = value - self.offset[k]
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {tuple(PRECISIONS)}, got {precision!r}")
+
+def population_offsets(T_ref):
+    # The per-direction offsets of f and g (None for an isothermal run), the rest equilibria at density 1 and T_ref
+    return w.copy(), w * T_ref if T_ref is not None else None
+
+def to_deviations(f, offset):
+    # float32 deviations of populations from offset, in the memory layout of f
+    if f is None:
+        return None
+    stored = np.empty_like(f, dtype=np.float32)
+    stored[...] = f - offset
+    return stored
+
+def from_deviations(stored, offset):
+    # Absolute float64 populations, in the memory layout of stored
+    if stored is None:
+        return None
+    f = np.empty_like(stored, dtype=np.float64)
+    f[...] = stored
+    f += offset
+    return f
@@ -0,0 +1,124 @@
+import argparse
+import time
+import numpy as np
+from numba.core.registry import CPUDispatcher
+from . import boundaries, inplace, kernels, sparse
+from .boundaries import *
+from .constants import *
+from .ensemble import Ensemble
+from .eos import carnahan_starling
+from .inplace import InPlaceSimulation
+from .kernels import PERIODIC
+from .layout import to_layout
+from .profiling import profile
+from .simulation import Simulation
+from .sparse import SparseSimulation
+
+# Warms the on-disk numba cache for every kernel specialization a Simulation can hit, and the boundary
+# conditions as the examples call them, by running them once on a tiny lattice. Later launches then load
+# machine code from the cache instead of compiling it. Run with
+#     python -m src precompile
+nx = 8
+ny = 8
+nl = 9
+
+# (name, keyword arguments of Simulation) for every None/float combination of the physics parameters
+PHYSICS = (
+    ("isothermal", {}),
+    ("isothermal gravity", {"gravity": 0.0005}),
+    ("shan-chen gravity", {"gravity": 0.0005, "G": -5.5}),
+    ("shan-chen eos", {"gravity": 0.0, "G": -1.0, "psi_table": carnahan_starling(0.9)}),
+    ("thermal", {"tau_g": 0.6, "alpha": 0.4, "T_ref": 0.75, "gravity": 0.05}),
+    ("thermal shan-chen", {"tau_g": 0.6, "alpha": 0.4, "T_ref": 0.75, "gravity": 0.05, "G": -5.5}),
+)
+
+def compile_stats():
+    # (cache hits, cache misses) summed over every compiled kernel
+    hits = 0
+    misses = 0
+    dispatchers = [value for module in (kernels, boundaries) for value in vars(module).values() if isinstance(value, CPUDispatcher)]
+    dispatchers += list(kernels.STEP_KERNELS.values()) + list(kernels.ENSEMBLE_KERNELS.values()) + list(sparse.SPARSE_KERNELS.values())
+    dispatchers += [step for steps in inplace.INPLACE_KERNELS.values() for step in steps]
+    for dispatcher in dispatchers:
+        hits += sum(dispatcher.stats.cache_hits.values())
+        misses += sum(dispatcher.stats.cache_misses.values())
+    return hits, misses
+
+def populations(thermal, layout):
+    f = np.ones((nx, ny, nl)) * w
+    g = np.ones((nx, ny, nl)) * w * 0.75 if thermal else None
+    return to_layout(f, layout), to_layout(g, layout) if g is not None else None
+
+def warm_simulation(physics, layout):
+    thermal = "tau_g" in physics
+    f, g = populations(thermal, layout)
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[:, 0] = True
+    for periodic in PERIODIC:
+        for multiphase in ((False, True) if periodic == "x" else (False,)):
+            sim = Simulation(f.copy(order="K"), solid, 0.8, g=g.copy(order="K") if thermal else None, periodic=periodic,
+                             multiphase=multiphase, **physics)
+            sim.step()
+            sim.residual = np.empty((nx, 4)) # the residual sums of steady.py
+            sim.step()
+            sim.residual = None
+            Ensemble.from_simulations([sim]).step() # the batched kernel of ensemble.py
+            for collision in ("trt", "mrt"):
+                Simulation(f.copy(order="K"), solid, 0.8, g=g.copy(order="K") if thermal else None, periodic=periodic,
+                           multiphase=multiphase, collision=collision, **physics).step()
+            Simulation(f.copy(order="K"), solid, 0.8, g=g.copy(order="K") if thermal else None, periodic=periodic,
+                       multiphase=multiphase, precision="float32", **physics).step() # the deviation storage of precision.py
+            InPlaceSimulation(f.copy(order="K"), solid, 0.8, g=g.copy(order="K") if thermal else None, periodic=periodic,
+                              multiphase=multiphase, **physics).advance(2) # both AA-pattern kernels of inplace.py
+            if layout == "aos": # the fluid-cell kernel of sparse.py, which runs Shan-Chen only without solid cells
+                sparse_solid = np.zeros_like(solid) if "G" in physics else solid
+                SparseSimulation(f, sparse_solid, 0.8, g=g, periodic=periodic, multiphase=multiphase, **physics).step()
+            # The unfused kernel chain, which covers sim: bgk, float64 and the streaming rules of periodic and multiphase
+            with profile(sim, split_phases=True):
+                sim.step()
+
+def warm_boundaries(layout):
+    # Argument types follow the examples, e.g. integer temperatures
+    f, g = populations(True, layout)
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[:, 0] = True
+    for T_hot, T_cold in ((1, 0), (1, 0.75)):
+        centers_x = [nx // 2]
+        centers_y = [ny // 2]
+        for obstacle in ("cylinder", "box"):
+            links = obstacle_links(solid, nx, ny, obstacle, 1, centers_x, centers_y, 2, T_hot, T_cold)
+            obstacle_link_bc(f, g, links)
+            obstacle_cell_bc(f, g, obstacle_cells(solid, obstacle, 1, centers_x, centers_y, 2, T_hot, T_cold))
+            obstacle_bc(solid, nx, ny, nl, f, g, obstacle, "heat flux", 1, centers_x, centers_y, 2, T_hot, T_cold)
+            obstacle_bc(solid, nx, ny, nl, f, None, obstacle, None, 1, centers_x, centers_y, 2, T_hot, T_cold)
+        thermal_flow_inlet_bc(ny, nl, 0.1, f, g, T_cold, solid)
+        heat_flux_bc(f, g, nx, ny, T_cold, T_hot, None, None)
+        heat_flux_bc(f, g, nx, ny, T_cold, T_hot, 2, 4)
+    wind_tunnel_inlet_bc(f, nx, ny, 0.1)
+    lid_bc(f, 0.2, nx, ny)
+    lid_bc(f, 0.0, nx, ny)
+    for wall in ("right", "top"):
+        outlet_bc(nx, ny, nl, f, g, wall)
+        outlet_bc(nx, ny, nl, f, None, wall)
+
+def precompile(layouts=("aos", "soa")):
+    print(f"{'configuration':>28} {'time [s]':>9} {'compiled':>9} {'cached':>7}")
+    jobs = [(f"{name} {layout}", warm_simulation, (physics, layout)) for layout in layouts for name, physics in PHYSICS]
+    jobs += [(f"boundaries {layout}", warm_boundaries, (layout,)) for layout in layouts]
+
+    total = 0.0
+    for name, job, job_args in jobs:
+        hits, misses = compile_stats()
+        start = time.perf_counter()
+        job(*job_args)
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        new_hits, new_misses = compile_stats()
+        print(f"{name:>28} {elapsed:>9.2f} {new_misses - misses:>9} {new_hits - hits:>7}")
+    print(f"Done in {total:.1f} s, kernels are cached in src/__pycache__")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src precompile", description="Compile and cache every kernel specialization ahead of time.")
+    parser.add_argument("--layouts", nargs="+", default=["aos", "soa"], choices=["aos", "soa"])
+    args = parser.parse_args(argv)
+    precompile(args.layouts)
@@ -0,0 +1,179 @@
+import json
+import time
+import tracemalloc
+import numpy as np
+from .kernels import *
+
+# Opt-in per-phase profiling of a Simulation. A Simulation only checks whether it has a profiler attached,
+# so leaving this module unused costs nothing. With a profiler attached every step records:
+#   - wall time per phase: the fused kernel and each boundary condition, or with split_phases=True the
+#     macroscopic, shan_chen, collision and streaming kernels separately
+#   - the peak memory allocated during the step (track_allocations=True, through tracemalloc, which sees
+#     numpy and Python allocations but not the ones made inside compiled code)
+# and the summary adds the achieved MLUPS and the memory bandwidth implied by the population traffic.
+#
+# Split phases run the unfused kernel chain, which gives the same results as the fused kernel but needs an
+# extra population buffer and writes the Shan-Chen force to arrays the collision reads back, so a split step
+# is slower than a production step.
+#
+#     with profile(sim, split_phases=True) as profiler:
+#         sim.advance(100)
+#     profiler.dump_json("profile.json")
+#     profiler.dump_chrome_trace("trace.json") # open in chrome://tracing or Perfetto
+class Profiler:
+    def __init__(self, split_phases=False, track_allocations=False, max_events=100000):
+        self.split_phases = split_phases
+        self.track_allocations = track_allocations
+        self.max_events = max_events
+        self.steps = 0
+        self.cells = 0
+        self.bytes_per_step = 0
+        self.phase_totals = {}
+        self.step_total = 0
+        self.peak_allocated = []
+        self.events = [] # (name, start_ns, duration_ns) for the Chrome trace, at most max_events
+        self._started_tracemalloc = False
+        self._f_post = None
+        self._g_post = None
+
+    def start(self):
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _record(self, name, start, end):
+        self.phase_totals[name] = self.phase_totals.get(name, 0) + end - start
+        if len(self.events) < self.max_events:
+            self.events.append((name, start, end - start))
+
+    def profile_step(self, sim):
+        # Runs one step of sim, recording every phase. Called by Simulation.step.
+        self.cells = sim.nx * sim.ny
+        # Every population is read once and written once, plus the macroscopic fields written each step
+        n_distributions = 1 if sim.g is None else 2
+        n_fields = 3 if sim.g is None else 4
+        self.bytes_per_step = self.cells * (2 * n_distributions * sim.nl + n_fields) * sim.f.itemsize
+
+        if self.track_allocations:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+
+        step_start = time.perf_counter_ns()
+        if self.split_phases:
+            self._split_kernels(sim)
+        else:
+            start = time.perf_counter_ns()
+            sim.run_kernels()
+            self._record("fused_step", start, time.perf_counter_ns())
+
+        sim.swap()
+        sim.apply_boundaries(self._record)
+
+        step_end = time.perf_counter_ns()
+        self.step_total += step_end - step_start
+        if len(self.events) < self.max_events:
+            self.events.append(("step", step_start, step_end - step_start))
+        self.steps += 1
+
+        if self.track_allocations:
+            _, peak = tracemalloc.get_traced_memory()
+            self.peak_allocated.append(peak - base)
+
+    def _split_kernels(self, sim):
+        if sim.collision != "bgk":
+            raise ValueError("split phases only support the bgk collision")
+        if sim.shifted:
+            raise ValueError("split phases only support float64 populations")
+        if sim.streaming != resolved_streaming(sim.periodic, sim.multiphase):
+            raise ValueError("split phases only support the streaming rules of periodic and multiphase")
+        if self._f_post is None or self._f_post.shape != sim.f.shape:
+            self._f_post = np.empty_like(sim.f)
+            self._g_post = np.empty_like(sim.g) if sim.g is not None else None
+            self._Fx = np.empty((sim.nx, sim.ny))
+            self._Fy = np.empty((sim.nx, sim.ny))
+
+        start = time.perf_counter_ns()
+        compute_macroscopic_into(sim.f, sim.g, sim.density, sim.T, sim.v_x, sim.v_y, sim.nx, sim.ny, sim.nl, sim.solid)
+        end = time.perf_counter_ns()
+        self._record("macroscopic", start, end)
+
+        if sim.G is not None:
+            start = time.perf_counter_ns()
+            table, inv_step = table_arrays(sim.psi_table)
+            psi_halo_into(sim.density, sim.psi_halo, sim.nx, sim.ny, table, inv_step, sim.streaming[1])
+            shan_chen_stencil_into(sim.psi_halo, self._Fx, self._Fy, sim.nx, sim.ny, sim.G)
+            end = time.perf_counter_ns()
+            self._record("shan_chen", start, end)
+
+        start = time.perf_counter_ns()
+        collision_into(sim.density, sim.T, sim.v_x, sim.v_y, sim.f, sim.g, self._f_post, self._g_post, sim.nx, sim.ny, sim.nl,
+                       sim.tau_f, sim.tau_g, sim.alpha, sim.T_ref, force_gravity(sim.gravity, sim.G), sim.G,
+                       self._Fx if sim.G is not None else None, self._Fy if sim.G is not None else None)
+        end = time.perf_counter_ns()
+        self._record("collision", start, end)
+
+        start = time.perf_counter_ns()
+        streaming_into(self._f_post, self._g_post, sim.f_new, sim.g_new, sim.nx, sim.ny, sim.nl, sim.periodic, None, sim.multiphase)
+        end = time.perf_counter_ns()
+        self._record("streaming", start, end)
+
+    def summary(self):
+        steps = max(self.steps, 1)
+        step_time = self.step_total / steps / 1e9
+        phases = {name: {"total_s": total / 1e9,
+                         "mean_s": total / steps / 1e9,
+                         "share": total / self.step_total if self.step_total else 0.0}
+                  for name, total in self.phase_totals.items()}
+        summary = {
+            "steps": self.steps,
+            "cells": self.cells,
+            "step_s": step_time,
+            "mlups": self.cells / step_time / 1e6 if step_time else 0.0,
+            "bandwidth_gbs": self.bytes_per_step / step_time / 1e9 if step_time else 0.0,
+            "phases": phases,
+        }
+        if self.track_allocations:
+            summary["peak_allocated_bytes"] = {
+                "mean": float(np.mean(self.peak_allocated)) if self.peak_allocated else 0.0,
+                "max": int(max(self.peak_allocated, default=0)),
+            }
+        return summary
+
+    def dump_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def dump_chrome_trace(self, path):
+        # Chrome trace event format, timestamps in microseconds
+        events = [{"name": name, "ph": "X", "ts": start / 1e3, "dur": duration / 1e3, "pid": 0, "tid": 0 if name == "step" else 1}
+                  for name, start, duration in self.events]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def __str__(self):
+        summary = self.summary()
+        lines = [f"{summary['steps']} steps, {summary['mlups']:.2f} MLUPS, {summary['bandwidth_gbs']:.2f} GB/s"]
+        for name, phase in sorted(summary["phases"].items(), key=lambda item: -item[1]["total_s"]):
+            lines.append(f"{name:>14} {1e3 * phase['mean_s']:>10.3f} ms/step {100 * phase['share']:>6.1f}%")
+        return "\n".join(lines)
+
+class profile:
+    # Attaches a Profiler to sim for the duration of a with block, a new one built from options unless
+    # an existing profiler is passed to keep accumulating into
+    def __init__(self, sim, profiler=None, **options):
+        self.sim = sim
+        self.profiler = profiler if profiler is not None else Profiler(**options)
+
+    def __enter__(self):
+        self.profiler.start()
+        self.sim.profiler = self.profiler
+        return self.profiler
+
+    def __exit__(self, *exc):
+        self.sim.profiler = None
+        self.profiler.stop()
@@ -0,0 +1,227 @@
+import numpy as np
+from .constants import *
+from .moments import equilibrium_of
+from .kernels import check_collision
+from .simulation import Simulation, as_float
+
+# Local grid refinement: nested blocks with a 2:1 ratio, for external flows that only need fine resolution around the
+# obstacles and in the wake. Every level is an ordinary Simulation (same fused step kernel, boundary conditions and
+# collision operator) and is sub-cycled, stepping twice per step of its parent, so the cell updates per coarse step are
+# the coarse cells plus 2 * 4 = 8 times the cells each block covers, instead of 8 times the whole lattice.
+#
+# A block covers the parent nodes x_start <= x <= x_end, y_start <= y <= y_end and has its own nodes at half the
+# spacing, the even ones on top of the parent nodes (vertex centred). Velocity and density are the same in both lattice
+# units (acoustic scaling) and the viscosity is kept by tau_fine = 1/2 + 2 * (tau - 1/2). At the interfaces the
+# populations are rescaled by splitting them into equilibrium and non-equilibrium parts (Dupuis & Chopard, Phys. Rev.
+# E 67, 066707 (2003)), the non-equilibrium part scaling with tau_fine / (2 * tau):
+#   - before each fine sub-step, the ring of nodes on the block edge is set from the parent, interpolated linearly
+#     along the edge and in time between the parent states before and after its step
+#   - after the two sub-steps, the parent nodes inside the block are replaced by the fine nodes on top of them
+# Blocks only support isothermal single-phase flows and must lie inside their parent with at least one parent node
+# between them and the parent's edge.
+#
+# The obstacles of a block are sampled from geometry (geometry.py) at the fine nodes when given, otherwise a fine node
+# is solid when the parent nodes on both sides of it are. Boundary conditions of a block are built by its boundaries
+# factory from the Level, like DecomposedSimulation; the domain boundary conditions only act on the coarse lattice.
+#     geometry = Circle(100, 50, 8)
+#     sim = RefinedSimulation(f, geometry.rasterize(nx, ny), 0.52, blocks=[Block(80, 30, 160, 70, blocks=[Block(20, 20, 80, 60)])],
+#                             geometry=geometry, boundaries=[lambda f, g: wind_tunnel_inlet_bc(f, nx, ny, wind_speed)])
+#     fine = sim.levels[1].sim.v_x # fields of the first block
+RATIO = 2
+
+class Block:
+    # A refined region of its parent, in parent node coordinates, with nested blocks in its own node coordinates.
+    # boundaries(level) returns the bc(f, g) callables of the block.
+    def __init__(self, x_start, y_start, x_end, y_end, blocks=(), boundaries=None):
+        self.x_start, self.y_start, self.x_end, self.y_end = (int(value) for value in (x_start, y_start, x_end, y_end))
+        self.blocks = list(blocks)
+        self.boundaries = boundaries
+
+    @property
+    def shape(self):
+        return (RATIO * (self.x_end - self.x_start) + 1, RATIO * (self.y_end - self.y_start) + 1)
+
+class Level:
+    # One lattice of the hierarchy: its Simulation, the parent level, its depth (0 for the coarse lattice) and where
+    # its nodes are in coarse lattice coordinates, x = origin_x + i * spacing
+    def __init__(self, sim, block, parent, depth, origin_x, origin_y, spacing):
+        self.sim = sim
+        self.block = block
+        self.parent = parent
+        self.depth = depth
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.spacing = spacing
+        self.children = []
+
+    @property
+    def nx(self):
+        return self.sim.nx
+
+    @property
+    def ny(self):
+        return self.sim.ny
+
+    def coordinates(self):
+        # Coarse lattice coordinates of every node, broadcastable (nx, 1) and (1, ny)
+        return (self.origin_x + self.spacing * np.arange(self.nx)[:, None], self.origin_y + self.spacing * np.arange(self.ny)[None, :])
+
+    def parent_edges(self):
+        # Copies of the parent populations on the four edges of the block, (left, right, bottom, top)
+        f = self.parent.sim.f
+        block = self.block
+        x_range = slice(block.x_start, block.x_end + 1)
+        y_range = slice(block.y_start, block.y_end + 1)
+        return (f[block.x_start, y_range].copy(), f[block.x_end, y_range].copy(),
+                f[x_range, block.y_start].copy(), f[x_range, block.y_end].copy())
+
+    def set_ring(self, before, after, weight):
+        # The populations of the block edge from the parent edges at the fraction weight of the parent step
+        factor = self.sim.tau_f / (RATIO * self.parent.sim.tau_f)
+        f = self.sim.f
+        left, right, bottom, top = (rescaled(refine_line((1 - weight) * b + weight * a), factor) for b, a in zip(before, after))
+        f[0, :] = left
+        f[-1, :] = right
+        f[:, 0] = bottom
+        f[:, -1] = top
+
+    def restrict(self):
+        # The parent nodes strictly inside the block from the fine nodes on top of them
+        block = self.block
+        factor = RATIO * self.parent.sim.tau_f / self.sim.tau_f
+        self.parent.sim.f[block.x_start + 1:block.x_end, block.y_start + 1:block.y_end] = \
+            rescaled(self.sim.f[RATIO:-1:RATIO, RATIO:-1:RATIO], factor)
+
+    def cells(self):
+        return self.nx * self.ny
+
+class RefinedSimulation:
+    # A coarse Simulation with refined blocks, stepped and read like a Simulation: step/advance advance the coarse
+    # lattice by one step each (every block by 2 ** depth sub-steps) and f, density, v_x, v_y are those of the coarse
+    # lattice. levels lists every level, coarse first, depth first through the nested blocks.
+    def __init__(self, f, solid, tau_f, blocks=(), geometry=None, periodic=None, boundaries=(), collision="bgk",
+                 magic=None, moment_rates=None):
+        check_collision(collision, magic, moment_rates)
+        self.geometry = geometry
+        self.collision = collision
+        self.magic = as_float(magic)
+        self.moment_rates = moment_rates
+        self.time = 0
+        coarse = Simulation(f, solid, tau_f, periodic=periodic, boundaries=boundaries, collision=collision, magic=magic,
+                            moment_rates=moment_rates)
+        self.root = Level(coarse, None, None, 0, 0.0, 0.0, 1.0)
+        self.levels = [self.root]
+        for block in blocks:
+            self.add_block(self.root, block)
+
+    def add_block(self, parent, block):
+        if block.x_end - block.x_start < 2 or block.y_end - block.y_start < 2:
+            raise ValueError(f"a block must span at least 2 parent nodes in x and y, got {block.x_start}..{block.x_end}, "
+                             f"{block.y_start}..{block.y_end}")
+        if block.x_start < 1 or block.y_start < 1 or block.x_end > parent.nx - 2 or block.y_end > parent.ny - 2:
+            raise ValueError(f"block {block.x_start}..{block.x_end}, {block.y_start}..{block.y_end} must lie inside its "
+                             f"{parent.nx}x{parent.ny} parent with a node to spare on every side")
+        for other in parent.children:
+            if block.x_start <= other.block.x_end and other.block.x_start <= block.x_end and \
+               block.y_start <= other.block.y_end and other.block.y_start <= block.y_end:
+                raise ValueError("blocks of the same parent must not overlap")
+
+        spacing = parent.spacing / RATIO
+        origin_x = parent.origin_x + block.x_start * parent.spacing
+        origin_y = parent.origin_y + block.y_start * parent.spacing
+        window = (slice(block.x_start, block.x_end + 1), slice(block.y_start, block.y_end + 1))
+        if self.geometry is not None:
+            x = origin_x + spacing * np.arange(block.shape[0])[:, None]
+            y = origin_y + spacing * np.arange(block.shape[1])[None, :]
+            solid = self.geometry.contains(x, y)
+        else:
+            solid = refine_solid(parent.sim.solid[window])
+
+        # Same viscosity in coarse units: nu = (tau - 1/2) / 3 * dx ** 2 / dt with dx and dt halved
+        tau_f = 0.5 + RATIO * (parent.sim.tau_f - 0.5)
+        f = rescaled(refine(parent.sim.f[window]), tau_f / (RATIO * parent.sim.tau_f))
+        sim = Simulation(f, solid, tau_f, collision=self.collision, magic=self.magic, moment_rates=self.moment_rates)
+        level = Level(sim, block, parent, parent.depth + 1, origin_x, origin_y, spacing)
+        parent.children.append(level)
+        self.levels.append(level)
+        sim.boundaries = list(block.boundaries(level)) if block.boundaries is not None else []
+        for child in block.blocks:
+            self.add_block(level, child)
+
+    def step(self):
+        advance_level(self.root)
+        self.time += 1
+
+    def advance(self, steps):
+        for _ in range(steps):
+            self.step()
+
+    def cell_updates(self):
+        # Lattice updates per coarse step over every level
+        return sum(level.cells() * RATIO ** level.depth for level in self.levels)
+
+    # The coarse lattice and its fields
+    @property
+    def nx(self):
+        return self.root.sim.nx
+
+    @property
+    def ny(self):
+        return self.root.sim.ny
+
+    @property
+    def f(self):
+        return self.root.sim.f
+
+    @property
+    def solid(self):
+        return self.root.sim.solid
+
+    @property
+    def density(self):
+        return self.root.sim.density
+
+    @property
+    def v_x(self):
+        return self.root.sim.v_x
+
+    @property
+    def v_y(self):
+        return self.root.sim.v_y
+
+    @property
+    def T(self):
+        return None
+
+def advance_level(level):
+    # One step of level, each of its blocks sub-cycled RATIO times in between, then restricted back
+    before = [child.parent_edges() for child in level.children]
+    level.sim.step()
+    for child, edges in zip(level.children, before):
+        after = child.parent_edges()
+        for sub_step in range(RATIO):
+            child.set_ring(edges, after, sub_step / RATIO)
+            advance_level(child)
+        child.restrict()
+
+def rescaled(f, factor):
+    # Populations with their non-equilibrium part scaled by factor
+    f_eq = equilibrium_of(f)
+    return f_eq + factor * (f - f_eq)
+
+def refine_line(values):
+    # Linear interpolation of (n, ...) values on parent nodes to the 2n - 1 nodes of a block edge
+    fine = np.empty((RATIO * (len(values) - 1) + 1,) + values.shape[1:])
+    fine[::RATIO] = values
+    fine[1::RATIO] = 0.5 * (values[:-1] + values[1:])
+    return fine
+
+def refine(values):
+    # Bilinear interpolation of (mx, my, ...) values on parent nodes to the nodes of a block
+    fine_x = refine_line(values)
+    return np.swapaxes(refine_line(np.swapaxes(fine_x, 0, 1)), 0, 1)
+
+def refine_solid(solid):
+    # A fine node is solid when every parent node it lies between is
+    fine = refine(solid.astype(np.float64))
+    return fine > 0.999
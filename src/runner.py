@@ -0,0 +1,42 @@
+import contextlib
+import numpy as np
+from .profiling import profile
+
+# Headless driver for a Simulation, no plotting or GUI dependency. The solver advances in chunks of
+# output_every steps and only copies the macroscopic fields out between chunks, so rendering or I/O
+# never paces the kernels.
+FIELDS = ("density", "v_x", "v_y", "T")
+
+def snapshot(sim, fields=FIELDS):
+    # Copies of the requested macroscopic fields, fields the simulation does not have (T when isothermal) are skipped
+    snap = {"time": sim.time}
+    for name in fields:
+        value = getattr(sim, name)
+        if value is not None:
+            snap[name] = value.copy()
+    return snap
+
+def run(sim, steps, output_every=None, callbacks=(), fields=FIELDS, profiler=None):
+    # Advances sim by steps. Every output_every steps, and after the last one, each callback is called as
+    # callback(snap) with a snapshot of the fields. Without an output interval only the final state is reported.
+    # Passing a profiling.Profiler records every step of the run into it.
+    if steps < 0:
+        raise ValueError(f"steps must be non-negative, got {steps}")
+    if output_every is not None and output_every < 1:
+        raise ValueError(f"output_every must be a positive number of steps, got {output_every}")
+
+    callbacks = list(callbacks)
+    chunk = output_every if output_every is not None else steps
+    done = 0
+    with profile(sim, profiler) if profiler is not None else contextlib.nullcontext():
+        while done < steps:
+            n = min(chunk, steps - done)
+            sim.advance(n)
+            done += n
+
+            if callbacks:
+                snap = snapshot(sim, fields)
+                for callback in callbacks:
+                    callback(snap)
+
+    return sim
@@ -0,0 +1,140 @@
+import time
+import numpy as np
+from .kernels import *
+from .precision import PRECISIONS, ShiftedField, check_precision, from_deviations, population_offsets, to_deviations
+
+def as_float(value):
+    return float(value) if value is not None else None
+
+class Simulation:
+    # Owns every array a timestep touches: the populations, a second (ping-pong) buffer for each
+    # distribution and the macroscopic fields. A step runs the fused kernel from the current buffers into
+    # the spare ones, swaps them and applies the boundary conditions in place, so nothing is allocated once
+    # the simulation is set up.
+    #
+    # Boundary conditions are callables bc(f, g) that modify the populations in place, for example
+    #     lambda f, g: outlet_bc(nx, ny, nl, f, g, "right")
+    # They run after streaming, in order, with self.time already advanced to the new step.
+    #
+    # collision picks the operator of f: "bgk" (single relaxation time tau_f), "trt" (two relaxation times, the
+    # antisymmetric one set by the magic parameter) or "mrt" (moment space, the non-hydrodynamic moments relaxing
+    # with moment_rates = (s_e, s_eps, s_q)). All three have the viscosity of tau_f; trt and mrt stay stable much
+    # closer to tau_f = 0.5, i.e. at higher Re on the same grid.
+    #
+    # precision "float32" stores the populations and macroscopic fields in single precision, the populations as their
+    # deviations from the rest equilibrium, see precision.py. f and g are then copied at setup instead of being stepped
+    # in place, and populations() returns them as absolute float64 arrays.
+    #
+    # streaming optionally overrides the (wrap_x, wrap_y, drop_x, drop_y) rules that periodic and multiphase resolve to
+    # (see streaming_rules), e.g. for the slabs of decomposition.py.
+    def __init__(self, f, solid, tau_f, g=None, tau_g=None, alpha=None, T_ref=None, gravity=None, G=None,
+                 periodic=None, multiphase=False, boundaries=(), psi_table=None, collision="bgk", magic=None,
+                 moment_rates=None, precision="float64", streaming=None):
+        check_parameters(f, g, solid, tau_f, tau_g, alpha, T_ref, gravity, G, psi_table)
+        check_collision(collision, magic, moment_rates)
+        check_precision(precision)
+        config = step_config(g, G, periodic, multiphase)
+        self.nx, self.ny, self.nl = f.shape
+        # Parameters are stored as floats so integer and float arguments share one compiled kernel
+        self.solid = solid
+        self.tau_f = as_float(tau_f)
+        self.tau_g = as_float(tau_g)
+        self.alpha = as_float(alpha)
+        self.T_ref = as_float(T_ref)
+        self.gravity = as_float(gravity)
+        self.G = as_float(G)
+        self.periodic = periodic
+        self.multiphase = config[3]
+        self.streaming = resolved_streaming(periodic, self.multiphase, streaming)
+        self.psi_table = psi_table # Shan-Chen pseudopotential, see eos.py
+        self.collision = collision
+        self.magic = as_float(magic)
+        self.moment_rates = tuple(float(rate) for rate in moment_rates) if moment_rates is not None else None
+        self.rates = collision_rates(collision, self.tau_f, self.magic, self.moment_rates)
+        self.precision = precision
+        self.shifted = precision == "float32"
+        self.boundaries = list(boundaries)
+        self.time = 0
+        self.profiler = None # see profiling.py
+        self.residual = None # (nx, 4) per-column residual sums filled by every step while set, see steady.py
+
+        # empty_like keeps the memory layout of the populations that were passed in (see layout.py)
+        self.soa = is_soa(f)
+        if g is not None and is_soa(g) != self.soa:
+            raise ValueError("f and g must use the same memory layout")
+        if self.shifted:
+            self.f_offset, self.g_offset = population_offsets(self.T_ref)
+            f, g = to_deviations(f, self.f_offset), to_deviations(g, self.g_offset)
+        self.f = f
+        self.kernel = make_step(*config, soa=self.soa, collision=collision, shifted=self.shifted, streaming=self.streaming)
+        self.f_new = np.empty_like(f)
+        self.g = g
+        self.g_new = np.empty_like(g) if g is not None else None
+
+        dtype = PRECISIONS[precision]
+        self.density = np.zeros((self.nx, self.ny), dtype=dtype)
+        self.v_x = np.zeros((self.nx, self.ny), dtype=dtype)
+        self.v_y = np.zeros((self.nx, self.ny), dtype=dtype)
+        self.T = np.zeros((self.nx, self.ny), dtype=dtype) if g is not None else None
+        self.psi_halo = psi_buffer(self.nx, self.ny, G)
+        self.cells = collision_buffer(self.nx, collision)
+
+    def step(self):
+        # The macroscopic fields hold the moments the collision used, i.e. those of the state before this step
+        if self.profiler is not None:
+            self.profiler.profile_step(self)
+            return
+
+        self.run_kernels()
+        self.swap()
+        self.apply_boundaries()
+
+    def swap(self):
+        # Makes the buffers the kernels just filled the current populations, which ends the step
+        self.f, self.f_new = self.f_new, self.f
+        self.g, self.g_new = self.g_new, self.g
+        self.time += 1
+
+    def apply_boundaries(self, record=None):
+        # Applies the boundary conditions in place, reporting the wall time of each to record(name, start, end) when
+        # given (see profiling.py)
+        if not self.boundaries:
+            return
+        f, g = self.boundary_fields()
+        with uncached_views():
+            for n, bc in enumerate(self.boundaries):
+                if record is None:
+                    bc(f, g)
+                    continue
+                start = time.perf_counter_ns()
+                bc(f, g)
+                record(f"boundary_{n}", start, time.perf_counter_ns())
+
+    def boundary_fields(self):
+        # What the boundary conditions are called with: the populations, or views of the absolute populations when
+        # they are stored as deviations
+        if not self.shifted:
+            return self.f, self.g
+        return ShiftedField(self.f, self.f_offset), ShiftedField(self.g, self.g_offset) if self.g is not None else None
+
+    def populations(self):
+        # The absolute populations f and g
+        if not self.shifted:
+            return self.f, self.g
+        return from_deviations(self.f, self.f_offset), from_deviations(self.g, self.g_offset)
+
+    def run_kernels(self, i_start=0, i_end=None):
+        # Fills f_new/g_new and the macroscopic fields from f/g with the step kernel specialized for this configuration,
+        # for the columns i_start <= i < i_end only when given (see make_step)
+        if i_end is None:
+            i_end = self.nx
+        f, g, f_new, g_new = self.f, self.g, self.f_new, self.g_new
+        if self.soa:
+            f, g, f_new, g_new = soa_storage(f), soa_storage(g), soa_storage(f_new), soa_storage(g_new)
+        self.kernel(f, g, f_new, g_new, self.density, self.T, self.v_x, self.v_y, self.psi_halo, self.cells, self.nx, self.ny, self.solid,
+                    self.tau_f, self.tau_g, self.alpha, self.T_ref, force_gravity(self.gravity, self.G), self.G, self.rates,
+                    self.residual, *table_arrays(self.psi_table), i_start, i_end)
+
+    def advance(self, steps):
+        for _ in range(steps):
+            self.step()
@@ -0,0 +1,147 @@
+import os
+import queue
+import threading
+import numpy as np
+from .runner import FIELDS
+from .store import StoreWriter
+
+# Asynchronous snapshot output. Fields are copied into one of a fixed pool of preallocated buffers and
+# handed to a background thread that compresses and writes them, so the solver only pays for the copy.
+# Compression (zlib) and file writes release the GIL, so writing overlaps with the numba kernels.
+#
+# When every buffer is still waiting to be written, the "block" policy waits for the writer to free one
+# and the "drop" policy skips the snapshot. Memory use is bounded by max_pending copies of the fields.
+FORMATS = ("npz", "npy", "store")
+POLICIES = ("block", "drop")
+
+class SnapshotWriter:
+    # directory: output directory, created if missing
+    # format: "npz" writes one compressed snapshot_<time>.npz per snapshot, "npy" writes uncompressed
+    #         snapshot_<time>_<field>.npy files, fastest when disk bandwidth is not the bottleneck, "store" appends
+    #         every snapshot to one chunked time series store in directory (store.py), configured by store_options
+    #         (chunks, dtype, quantize, level, mode)
+    # policy: what to do when max_pending snapshots are already queued, see above
+    def __init__(self, directory, format="npz", policy="block", max_pending=2, fields=FIELDS, prefix="snapshot",
+                 **store_options):
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}, got {format!r}")
+        if store_options and format != "store":
+            raise ValueError(f"{sorted(store_options)} only apply to the store format")
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+        if max_pending < 1:
+            raise ValueError(f"max_pending must be at least 1, got {max_pending}")
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = format
+        self.policy = policy
+        self.max_pending = max_pending
+        self.fields = tuple(fields)
+        self.prefix = prefix
+        self.written = 0
+        self.dropped = 0
+        # Opened here so invalid options fail now instead of in the writer thread
+        self._store = StoreWriter(directory, **store_options) if format == "store" else None
+
+        # Buffers are allocated lazily on the first snapshot, once the field shapes are known
+        self._free = queue.Queue()
+        self._pending = queue.Queue()
+        self._allocated = 0
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, name="scald-snapshot-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, snap):
+        # Runner callback, see runner.run
+        self.submit(snap["time"], snap)
+
+    def capture(self, sim):
+        # Snapshot straight from a Simulation, without the intermediate copy run() makes
+        self.submit(sim.time, {name: getattr(sim, name) for name in self.fields})
+
+    def submit(self, time, fields):
+        # Queues a copy of fields (name -> array) for writing. Returns False if the snapshot was dropped.
+        self._raise_error()
+        if self._closed:
+            raise RuntimeError("SnapshotWriter is closed")
+
+        buffers = self._acquire(fields)
+        if buffers is None:
+            self.dropped += 1
+            return False
+
+        for name, buffer in buffers.items():
+            np.copyto(buffer, fields[name])
+        self._pending.put((time, buffers))
+        return True
+
+    def close(self):
+        # Waits for every queued snapshot to be written and stops the writer thread
+        if not self._closed:
+            self._closed = True
+            self._pending.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _acquire(self, fields):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+
+        if self._allocated < self.max_pending:
+            self._allocated += 1
+            return {name: np.empty_like(value) for name, value in fields.items()
+                    if name in self.fields and value is not None}
+
+        if self.policy == "drop":
+            return None
+        while True:
+            # Wake up now and then so an error in the writer thread does not block the solver forever
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                self._raise_error()
+
+    def _work(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                if self._store is not None and self._error is None:
+                    try:
+                        self._store.close()
+                    except Exception as error:
+                        self._error = error
+                return
+            time, buffers = item
+            try:
+                if self._error is None:
+                    self._write(time, buffers)
+                    self.written += 1
+            except Exception as error:
+                self._error = error
+            self._free.put(buffers)
+
+    def _write(self, time, buffers):
+        if self.format == "store":
+            self._store.append(time, buffers)
+            return
+        path = os.path.join(self.directory, f"{self.prefix}_{time:08d}")
+        if self.format == "npz":
+            np.savez_compressed(path + ".npz", time=time, **buffers)
+        else:
+            for name, buffer in buffers.items():
+                np.save(f"{path}_{name}.npy", buffer)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("snapshot writer failed") from error
@@ -0,0 +1,275 @@
+import numpy as np
+from numba import njit, prange, float64, int32
+from numba.experimental import jitclass
+from .kernels import *
+from .simulation import as_float
+
+# Sparse storage for lattices dominated by solid cells (porous media, dense obstacle arrays). Only fluid cells are
+# stored: populations are (cells, nl) arrays in the order of np.nonzero(~solid), and a table built once holds the
+# destination of every population the step pushes, so the moments, collision and streaming only touch fluid cells
+# and both the population memory and the step time shrink with the solid fraction.
+#
+# A population that would stream into a solid cell is bounced back inside the step (halfway bounce-back). The fluid
+# cells then match a dense Simulation that applies obstacle_link_bc to every fluid-solid link, not one that uses the
+# other wall conditions of boundaries.py. g bounces back too (adiabatic walls) unless a wall temperature is imposed
+# with sparse_link_bc. Domain edges follow the periodic/multiphase rules of the dense step.
+#
+# A Shan-Chen force is only supported without solid cells: the dense step takes psi of a solid cell from the
+# populations it keeps streaming there, which a sparse lattice does not store, so SparseSimulation rejects the
+# configuration rather than run a different wall model.
+#
+# Boundary conditions are the bc(f, g) callables of Simulation. They receive SparseField views that index like dense
+# populations, f[i, j, k], so the compiled boundary conditions of boundaries.py run on them unchanged: reads of a
+# solid cell return 0 and writes to one are dropped. Slicing is not supported.
+#     sim = SparseSimulation(f, solid, tau_f, boundaries=[lambda f, g: wind_tunnel_inlet_bc(f, nx, ny, wind_speed)])
+#     speed = np.sqrt(sim.v_x ** 2 + sim.v_y ** 2) # macroscopic fields stay (nx, ny), zero in solid cells
+#     f = sim.lattice.scatter(sim.f) # dense populations, e.g. for a checkpoint
+BOUNCE = -1 # destination codes of the table, see SparseLattice
+DROP = -2
+SPARSE_KERNELS = {}
+
+@jitclass([("data", float64[:, :]), ("index", int32[:, :])])
+class SparseField:
+    # Dense f[i, j, k] indexing of the (cells, nl) populations data, index maps (i, j) to a cell or -1 when solid
+    def __init__(self, data, index):
+        self.data = data
+        self.index = index
+
+    def __getitem__(self, key):
+        n = self.index[key[0], key[1]]
+        if n < 0:
+            return 0.0
+        return self.data[n, key[2]]
+
+    def __setitem__(self, key, value):
+        n = self.index[key[0], key[1]]
+        if n >= 0:
+            self.data[n, key[2]] = value
+
+class SparseLattice:
+    # The fluid cells of a solid mask and their neighbour tables, for one periodic/multiphase configuration:
+    #   index[i, j]           cell number of (i, j), -1 for solid cells
+    #   cell_i, cell_j        position of every cell
+    #   destinations[n, k]    cell the population k of cell n streams to, BOUNCE when it bounces back into cell n
+    #                         (solid neighbour or closed domain edge), DROP when it leaves the domain
+    #   stencil[n, k]         cell whose psi the Shan-Chen force of cell n reads in direction k, cells (a zero psi)
+    #                         for a neighbour beyond a closed y edge; only built with shan_chen
+    def __init__(self, solid, periodic=None, multiphase=False, shan_chen=False):
+        config = step_config(None, None, periodic, multiphase)
+        self.nx, self.ny = solid.shape
+        self.solid = solid
+        self.cell_i, self.cell_j = (axis.astype(np.int32) for axis in np.nonzero(~solid))
+        self.cells = len(self.cell_i)
+        self.index = np.full(solid.shape, -1, dtype=np.int32)
+        self.index[self.cell_i, self.cell_j] = np.arange(self.cells, dtype=np.int32)
+
+        wrap_x, wrap_y, drop_x, drop_y = streaming_rules(periodic, config[3])
+        self.destinations = np.empty((self.cells, Q), dtype=np.int32)
+        self.stencil = np.empty((self.cells, Q), dtype=np.int32) if shan_chen else None
+        for k in range(Q):
+            next_i = self.cell_i + c_x[k]
+            next_j = self.cell_j + c_y[k]
+            if wrap_x:
+                next_i = next_i % self.nx
+            if wrap_y:
+                next_j = next_j % self.ny
+            out_x = (next_i < 0) | (next_i >= self.nx)
+            out_y = ~out_x & ((next_j < 0) | (next_j >= self.ny))
+            inside = ~out_x & ~out_y
+            # a solid neighbour has index -1, which is BOUNCE
+            destination = np.full(self.cells, BOUNCE, dtype=np.int32)
+            destination[inside] = self.index[next_i[inside], next_j[inside]]
+            if drop_x:
+                destination[out_x] = DROP
+            if drop_y:
+                destination[out_y] = DROP
+            self.destinations[:, k] = destination
+            if not shan_chen:
+                continue
+
+            # The psi stencil is always periodic in x, and in y when the streaming wraps it (fill_psi_halo)
+            psi_i = (self.cell_i + c_x[k]) % self.nx
+            psi_j = self.cell_j + c_y[k]
+            if wrap_y:
+                psi_j = psi_j % self.ny
+            neighbour = np.full(self.cells, -1, dtype=np.int32)
+            inside = (psi_j >= 0) & (psi_j < self.ny)
+            neighbour[inside] = self.index[psi_i[inside], psi_j[inside]]
+            self.stencil[:, k] = np.where(neighbour < 0, self.cells, neighbour)
+
+    def gather(self, array):
+        # The fluid cells of a dense (nx, ny, ...) array, in cell order
+        return np.ascontiguousarray(array[self.cell_i, self.cell_j])
+
+    def scatter(self, values, fill=0.0):
+        # A dense (nx, ny, ...) array from per-cell values, solid cells set to fill
+        dense = np.full(self.solid.shape + values.shape[1:], fill, dtype=values.dtype)
+        dense[self.cell_i, self.cell_j] = values
+        return dense
+
+    def nbytes(self):
+        tables = (self.index, self.cell_i, self.cell_j, self.destinations, self.stencil)
+        return sum(table.nbytes for table in tables if table is not None)
+
+class SparseSimulation:
+    # Simulation on a SparseLattice, with the same constructor, step/advance and macroscopic fields. f and g are the
+    # (cells, nl) populations; the dense initial populations passed in are only read.
+    def __init__(self, f, solid, tau_f, g=None, tau_g=None, alpha=None, T_ref=None, gravity=None, G=None,
+                 periodic=None, multiphase=False, boundaries=(), psi_table=None):
+        check_parameters(f, g, solid, tau_f, tau_g, alpha, T_ref, gravity, G, psi_table)
+        thermal, shan_chen, periodic, multiphase = step_config(g, G, periodic, multiphase)
+        if shan_chen and solid.any():
+            raise ValueError("SparseSimulation does not support a Shan-Chen force with solid cells, use Simulation.")
+        self.nx, self.ny, self.nl = f.shape
+        self.lattice = SparseLattice(solid, periodic, multiphase, shan_chen)
+        self.solid = solid
+        self.tau_f = as_float(tau_f)
+        self.tau_g = as_float(tau_g)
+        self.alpha = as_float(alpha)
+        self.T_ref = as_float(T_ref)
+        self.gravity = as_float(gravity)
+        self.G = as_float(G)
+        self.periodic = periodic
+        self.multiphase = multiphase
+        self.psi_table = psi_table
+        self.boundaries = list(boundaries)
+        self.time = 0
+
+        self.kernel = make_sparse_step(thermal, shan_chen)
+        self.f = self.lattice.gather(f)
+        self.f_new = np.empty_like(self.f)
+        self.g = self.lattice.gather(g) if g is not None else None
+        self.g_new = np.empty_like(self.g) if g is not None else None
+        # The views handed to the boundary conditions, swapped with the buffers
+        self.f_view, self.f_new_view = self.view(self.f), self.view(self.f_new)
+        self.g_view, self.g_new_view = self.view(self.g), self.view(self.g_new)
+
+        self.density = np.zeros((self.nx, self.ny))
+        self.v_x = np.zeros((self.nx, self.ny))
+        self.v_y = np.zeros((self.nx, self.ny))
+        self.T = np.zeros((self.nx, self.ny)) if g is not None else None
+        # psi of every cell, and a zero psi at index cells for the stencil
+        self.psi = np.zeros(self.lattice.cells + 1) if G is not None else None
+
+    def view(self, data):
+        return SparseField(data, self.lattice.index) if data is not None else None
+
+    def step(self):
+        self.run_kernels()
+        self.f, self.f_new = self.f_new, self.f
+        self.g, self.g_new = self.g_new, self.g
+        self.f_view, self.f_new_view = self.f_new_view, self.f_view
+        self.g_view, self.g_new_view = self.g_new_view, self.g_view
+        self.time += 1
+
+        with uncached_views():
+            for bc in self.boundaries:
+                bc(self.f_view, self.g_view)
+
+    def run_kernels(self):
+        lattice = self.lattice
+        self.kernel(self.f, self.g, self.f_new, self.g_new, self.density, self.T, self.v_x, self.v_y, self.psi,
+                    lattice.cell_i, lattice.cell_j, lattice.destinations, lattice.stencil, self.tau_f, self.tau_g,
+                    self.alpha, self.T_ref, force_gravity(self.gravity, self.G), self.G, *table_arrays(self.psi_table))
+
+    def advance(self, steps):
+        for _ in range(steps):
+            self.step()
+
+def make_sparse_step(thermal, shan_chen):
+    # Returns sparse_step(f, g, f_new, g_new, density, T, v_x, v_y, psi, cell_i, cell_j, destinations, stencil, tau_f,
+    # tau_g, alpha, T_ref, gravity, G, psi_table, psi_inv_step), the fused step of make_step over the cells of a
+    # SparseLattice. The streaming rules are in the destination table, so only the physics is compiled in.
+    key = (thermal, shan_chen)
+    if key in SPARSE_KERNELS:
+        return SPARSE_KERNELS[key]
+
+    THERMAL = thermal
+    SHAN_CHEN = shan_chen
+
+    @njit(parallel=True, cache=True)
+    def sparse_step(f, g, f_new, g_new, density, T, v_x, v_y, psi, cell_i, cell_j, destinations, stencil, tau_f, tau_g, alpha, T_ref, gravity, G, psi_table, psi_inv_step):
+        cells = len(cell_i)
+        if SHAN_CHEN:
+            for n in prange(cells):
+                rho = 0.0
+                for k in range(Q):
+                    rho += f[n, k]
+                density[cell_i[n], cell_j[n]] = rho
+                psi[n] = pseudopotential(rho, psi_table, psi_inv_step)
+
+        omega_f = 1 - 0.5 / tau_f
+        for n in prange(cells):
+            i = cell_i[n]
+            j = cell_j[n]
+            rho = 0.0
+            u_x = 0.0
+            u_y = 0.0
+            temp = 0.0
+            for k in range(Q):
+                rho += f[n, k]
+                u_x += c_x[k] * f[n, k]
+                u_y += c_y[k] * f[n, k]
+                if THERMAL:
+                    temp += g[n, k]
+
+            if rho > 0: # avoid division by zero
+                u_x /= rho
+                u_y /= rho
+
+            if not SHAN_CHEN:
+                density[i, j] = rho
+            v_x[i, j] = u_x
+            v_y[i, j] = u_y
+            if THERMAL:
+                T[i, j] = temp
+
+            shan_chen_x = 0.0
+            shan_chen_y = 0.0
+            if SHAN_CHEN:
+                for k in range(1, Q):
+                    neighbor_psi = psi[stencil[n, k]]
+                    shan_chen_x += w[k] * neighbor_psi * c_x[k]
+                    shan_chen_y += w[k] * neighbor_psi * c_y[k]
+                shan_chen_x = -G * psi[n] * shan_chen_x
+                shan_chen_y = -G * psi[n] * shan_chen_y
+            force_x, force_y, u_x, u_y = cell_force(g, G, rho, temp, u_x, u_y, alpha, T_ref, gravity, shan_chen_x, shan_chen_y)
+
+            usq = (u_x ** 2 + u_y ** 2) / (2 * cs2)
+            for k in range(Q):
+                poly = velocity_poly(k, u_x, u_y, usq)
+                f_post = bgk_collide(k, f[n, k], w[k] * rho * poly, u_x, u_y, force_x, force_y, tau_f, omega_f)
+                g_post = 0.0
+                if THERMAL:
+                    g_post = g[n, k] - (g[n, k] - w[k] * temp * poly) / tau_g
+
+                destination = destinations[n, k]
+                if destination >= 0:
+                    f_new[destination, k] = f_post
+                    if THERMAL:
+                        g_new[destination, k] = g_post
+                else:
+                    if destination == DROP:
+                        f_post = 0.0
+                        g_post = 0.0
+                    f_new[n, opp_dir[k]] = f_post
+                    if THERMAL:
+                        g_new[n, opp_dir[k]] = g_post
+
+    SPARSE_KERNELS[key] = sparse_step
+    return sparse_step
+
+def sparse_links(lattice, links):
+    # The obstacle_links of boundaries.py as (cell, link_k, link_T) of a SparseLattice
+    link_i, link_j, link_k, link_T = links
+    return lattice.index[link_i, link_j].astype(np.int64), link_k, link_T
+
+@njit(parallel=True, cache=True)
+def sparse_link_bc(g, links):
+    # Anti-bounce-back at the wall temperature of every link on the (cells, nl) populations g, the sparse
+    # obstacle_link_bc: the step already bounced the population back into the cell, this imposes the temperature
+    link_n, link_k, link_T = links
+    for l in prange(len(link_n)):
+        n = link_n[l]
+        k = link_k[l]
+        g[n, opp_dir[k]] = 2 * w[k] * link_T[l] - g[n, opp_dir[k]]
@@ -0,0 +1,126 @@
+import math
+import numpy as np
+from .kernels import collision_rates
+from .moments import equilibrium_at, moments_of
+
+# Steady-state runs: run_steady advances a Simulation until its fields stop changing instead of for a guessed number
+# of steps. Every check_every steps one step runs with sim.residual set, so the fused kernel sums the change of the
+# velocity (and temperature) of each column while it overwrites the fields, without an extra pass over the lattice.
+# The residuals are the relative L2 change over that step,
+#     r_u = sqrt(sum |u - u_old| ** 2 / sum |u| ** 2)        r_T = sqrt(sum (T - T_old) ** 2 / sum T ** 2)
+# and the run stops once both are below tolerance, after max_steps, or as soon as a residual is no longer finite.
+# float32 fields (precision.py) carry about 7 digits, so tolerances much below 1e-7 are not reached with them.
+#
+# Isothermal flows without body forces can spin up faster. At a fixed Reynolds number and grid, multiplying the
+# lattice velocity by factor and the viscosity with it is the same flow with factor times larger time steps, so the
+# start-up transient, which dies out on the viscous time scale, takes factor times fewer steps. With
+# spin_up=SpinUp(factor, boundaries) the run starts with tau_f = 1/2 + factor * (tau_f - 1/2) and the boundary
+# conditions of boundaries, which must impose factor times the velocities of sim.boundaries, and the state is rescaled
+# back to the original parameters once the spin-up residuals are below its tolerance. The two steady states differ by
+# compressibility effects of order Mach ** 2, which the run at the original parameters then removes, so the spin-up only
+# needs to be converged loosely. It shortens viscous start-ups (a lid-driven cavity converges in about a third fewer
+# steps at factor 3) but not the settling of pressure waves, which travel at the lattice sound speed whatever the
+# factor, so channel flows gain little. factor is limited by the Mach number of the scaled velocities (keep them below
+# ~0.3).
+#     lid = lambda speed: [lambda f, g: lid_bc(f, speed, nx, ny)]
+#     sim = Simulation(f, solid, 0.52, boundaries=lid(0.1))
+#     result = run_steady(sim, tolerance=1e-7, spin_up=SpinUp(2, lid(0.2)))
+#     print(result.converged, result.steps, result.history[-1])
+SPIN_UP_TOLERANCE = 100
+
+class SpinUp:
+    # tolerance of the scaled run, by default SPIN_UP_TOLERANCE times that of run_steady
+    def __init__(self, factor, boundaries, tolerance=None):
+        if factor < 1:
+            raise ValueError(f"the spin-up factor must be at least 1, got {factor}")
+        self.factor = float(factor)
+        self.boundaries = list(boundaries)
+        self.tolerance = tolerance
+
+class Convergence:
+    # Outcome of run_steady: whether both residuals fell below the tolerance, the steps it took (the spin-up included)
+    # and the history of every check as (time, velocity residual, temperature residual or None)
+    def __init__(self):
+        self.converged = False
+        self.steps = 0
+        self.spin_up_steps = 0
+        self.history = []
+
+def run_steady(sim, tolerance=1e-6, check_every=100, max_steps=1_000_000, spin_up=None, callbacks=()):
+    # Advances sim until it is steady, calling every callback as callback(time, residual_u, residual_T) after each
+    # check, and returns the Convergence
+    if check_every < 1:
+        raise ValueError(f"check_every must be a positive number of steps, got {check_every}")
+    if spin_up is not None and (sim.g is not None or sim.G is not None or sim.gravity):
+        raise ValueError("spin-up only supports isothermal flows without body forces")
+
+    result = Convergence()
+    start = sim.time
+    buffer = np.empty((sim.nx, 4))
+    if spin_up is not None:
+        tau_f, boundaries = sim.tau_f, sim.boundaries
+        spin_tolerance = spin_up.tolerance if spin_up.tolerance is not None else SPIN_UP_TOLERANCE * tolerance
+        rescale(sim, spin_up.factor, 0.5 + spin_up.factor * (tau_f - 0.5))
+        sim.boundaries = spin_up.boundaries
+        try:
+            steady = advance_to_steady(sim, spin_tolerance, check_every, max_steps, buffer, result, callbacks)
+        finally:
+            rescale(sim, 1 / spin_up.factor, tau_f)
+            sim.boundaries = boundaries
+        result.spin_up_steps = sim.time - start
+        if not steady:
+            result.steps = result.spin_up_steps
+            return result
+
+    result.converged = advance_to_steady(sim, tolerance, check_every, max_steps - (sim.time - start), buffer, result, callbacks)
+    result.steps = sim.time - start
+    return result
+
+def advance_to_steady(sim, tolerance, check_every, max_steps, buffer, result, callbacks):
+    # Checks every check_every steps up to max_steps, True once both residuals are below tolerance
+    done = 0
+    while done < max_steps:
+        n = min(check_every, max_steps - done)
+        sim.advance(n - 1)
+        sim.residual = buffer
+        try:
+            sim.step()
+        finally:
+            sim.residual = None
+        done += n
+
+        change_u, norm_u, change_T, norm_T = buffer.sum(axis=0)
+        residual_u = relative_change(change_u, norm_u)
+        residual_T = relative_change(change_T, norm_T) if sim.g is not None else None
+        result.history.append((sim.time, residual_u, residual_T))
+        for callback in callbacks:
+            callback(sim.time, residual_u, residual_T)
+
+        residuals = (residual_u,) if residual_T is None else (residual_u, residual_T)
+        if not all(math.isfinite(r) for r in residuals):
+            return False
+        if all(r < tolerance for r in residuals):
+            return True
+    return False
+
+def relative_change(change, norm):
+    # A field that is zero and stays zero is steady
+    if norm > 0:
+        return math.sqrt(change / norm)
+    return 0.0 if change == 0 else math.inf
+
+def rescale(sim, factor, tau_f):
+    # Moves an isothermal state to factor times the velocity and to tau_f at the same Reynolds number: the velocity
+    # scales with factor, the density deviation (pressure) with factor ** 2 and the non-equilibrium part, the viscous
+    # stress tau * du, with factor * tau_f / sim.tau_f
+    f, _ = sim.populations()
+    rho, u_x, u_y = moments_of(f)
+    f_eq = equilibrium_at(rho, u_x, u_y)
+    scaled = equilibrium_at(1 + (rho - 1) * factor ** 2, factor * u_x, factor * u_y)
+    scaled += (factor * tau_f / sim.tau_f) * (f - f_eq)
+    sim.f[...] = scaled - sim.f_offset if sim.shifted else scaled
+    sim.density[...] = 1 + (sim.density - 1) * factor ** 2
+    sim.v_x *= factor
+    sim.v_y *= factor
+    sim.tau_f = tau_f
+    sim.rates = collision_rates(sim.collision, tau_f, sim.magic, sim.moment_rates)
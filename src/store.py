@@ -0,0 +1,232 @@
+import json
+import os
+import zlib
+import numpy as np
+
+# Chunked, compressed time series of the macroscopic fields, appendable while a run is going and readable in windows
+# without loading the whole run. A store is a directory holding
+#     store.json                 the fields, lattice shape, chunk shape, encoding and the time of every snapshot
+#     <field>/<c>.<i>.<j>        chunk (c, i, j) of a field: snapshots c * ct..., columns i * cx..., rows j * cy...
+# Each chunk is byte-shuffled (the bytes of every value regrouped by significance, as the HDF5 shuffle filter does,
+# which lets zlib compress smooth floating-point fields far better) and zlib compressed. With quantize = 8 or 16 a chunk
+# is stored lossily as unsigned integers over its own [min, max] range, so the error of a value is at most
+# (max - min) / (2 * (2 ** quantize - 2)); non-finite values read back as NaN.
+#
+# StoreWriter buffers ct snapshots (the time extent of a chunk) and writes their chunks when the buffer is full, so it
+# holds at most ct copies of the fields. store.json is replaced after the chunks it lists are on disk, so a crashed run
+# leaves a readable store of the snapshots written so far, and a store opened with mode="a" is extended in place.
+# Store reads it lazily, decompressing only the chunks a slice touches:
+#     with StoreWriter("run.store", chunks=(1, 256, 256), quantize=16) as writer:
+#         run(sim, 5000, output_every=50, callbacks=[writer])
+#     store = Store("run.store")
+#     probe = store["T"][:, 100, 50]             # time series of one node
+#     window = store["v_x"][-10:, 0:200, :]      # last 10 snapshots of a window
+# SnapshotWriter(directory, format="store", ...) writes to a store from its background thread.
+META = "store.json"
+QUANTIZE = (None, 8, 16)
+CHUNKS = (1, 256, 256)
+
+class StoreWriter:
+    # chunks: (snapshots, columns, rows) of a chunk
+    # dtype: storage type of the values, e.g. "float32" to halve the output of float64 fields, by default the type of
+    #        the first snapshot
+    # quantize: None (lossless), 8 or 16 bits per value
+    # level: zlib compression level, 1 (fastest) to 9 (smallest)
+    # mode: "w" starts a new store (an existing one in path is replaced), "a" appends to an existing one with its
+    #       own chunks, dtype and quantize
+    def __init__(self, path, chunks=CHUNKS, dtype=None, quantize=None, level=6, mode="w"):
+        if mode not in ("w", "a"):
+            raise ValueError(f"mode must be 'w' or 'a', got {mode!r}")
+        self.path = path
+        self.level = level
+        self.meta = None
+        self.buffers = None
+        self.buffered = 0
+
+        if mode == "a":
+            self.meta = read_meta(path)
+            self.buffers = {name: np.empty((self.meta["chunks"][0],) + tuple(self.meta["shape"]), dtype=self.meta["dtype"])
+                            for name in self.meta["fields"]}
+            # A partly filled last chunk is read back and completed
+            self.buffered = len(self.meta["times"]) % self.meta["chunks"][0]
+            if self.buffered:
+                store = Store(path)
+                start = len(self.meta["times"]) - self.buffered
+                for name in self.meta["fields"]:
+                    self.buffers[name][:self.buffered] = store[name][start:]
+        else:
+            if len(chunks) != 3 or min(chunks) < 1:
+                raise ValueError(f"chunks must be three positive sizes (snapshots, columns, rows), got {chunks}")
+            if quantize not in QUANTIZE:
+                raise ValueError(f"quantize must be one of {QUANTIZE}, got {quantize!r}")
+            self.chunks = tuple(int(size) for size in chunks)
+            self.dtype = np.dtype(dtype) if dtype is not None else None
+            self.quantize = quantize
+            if os.path.exists(os.path.join(path, META)):
+                os.remove(os.path.join(path, META))
+            os.makedirs(path, exist_ok=True)
+
+    def __call__(self, snap):
+        # Runner callback, see runner.run
+        self.append(snap["time"], snap)
+
+    def append(self, time, fields):
+        # Adds one snapshot, fields maps names to (nx, ny) arrays; names and shapes are fixed by the first snapshot
+        if self.meta is None:
+            self.start(fields)
+        meta = self.meta
+        for name in meta["fields"]:
+            value = fields[name]
+            if value.shape != tuple(meta["shape"]):
+                raise ValueError(f"{name} has shape {value.shape}, the store holds {tuple(meta['shape'])}")
+            self.buffers[name][self.buffered] = value
+        self.buffered += 1
+        meta["times"].append(int(time))
+        if self.buffered == meta["chunks"][0]:
+            self.flush()
+
+    def flush(self):
+        # Writes the buffered snapshots, as a partial chunk when the buffer is not full, and updates store.json
+        if self.meta is None or not self.buffered:
+            return
+        meta = self.meta
+        c = (len(meta["times"]) - 1) // meta["chunks"][0]
+        _, cx, cy = meta["chunks"]
+        nx, ny = meta["shape"]
+        for name in meta["fields"]:
+            block = self.buffers[name][:self.buffered]
+            for i in range(0, nx, cx):
+                for j in range(0, ny, cy):
+                    data = encode(block[:, i:i + cx, j:j + cy], meta["quantize"], self.level)
+                    write_file(os.path.join(self.path, name, f"{c}.{i // cx}.{j // cy}"), data)
+        write_file(os.path.join(self.path, META), json.dumps(meta).encode())
+        if self.buffered == meta["chunks"][0]:
+            self.buffered = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self, fields):
+        # Lays out the store from the first snapshot, fields that are None (T of an isothermal run) are left out
+        names = [name for name, value in fields.items() if value is not None and np.ndim(value) == 2]
+        shape = np.shape(fields[names[0]])
+        dtype = self.dtype if self.dtype is not None else np.asarray(fields[names[0]]).dtype
+        self.meta = {"fields": names, "shape": list(shape), "chunks": list(self.chunks), "dtype": dtype.name,
+                     "quantize": self.quantize, "times": []}
+        self.buffers = {name: np.empty((self.chunks[0],) + shape, dtype=dtype) for name in names}
+        for name in names:
+            os.makedirs(os.path.join(self.path, name), exist_ok=True)
+
+class Store:
+    # Read access to a store: fields, shape (nx, ny), times (one per snapshot) and store[field], a lazily read
+    # (snapshots, nx, ny) array that supports integer and slice indexing
+    def __init__(self, path):
+        self.path = path
+        self.meta = read_meta(path)
+        self.fields = tuple(self.meta["fields"])
+        self.shape = tuple(self.meta["shape"])
+        self.times = np.array(self.meta["times"], dtype=np.int64)
+
+    def __getitem__(self, name):
+        if name not in self.fields:
+            raise KeyError(f"{name!r} is not in the store, it holds {self.fields}")
+        return StoredField(self, name)
+
+    def __len__(self):
+        return len(self.times)
+
+class StoredField:
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+        self.shape = (len(store.times),) + store.shape
+        self.dtype = np.dtype(store.meta["dtype"])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        # Reads the chunks the selection touches, an integer index drops its axis like numpy
+        key = key if isinstance(key, tuple) else (key,)
+        if len(key) > 3:
+            raise IndexError(f"too many indices for a (snapshots, nx, ny) field: {len(key)}")
+        key = key + (slice(None),) * (3 - len(key))
+        selections = [np.arange(n)[k] for n, k in zip(self.shape, key)]
+        indices = [np.atleast_1d(selection) for selection in selections]
+
+        meta = self.store.meta
+        out = np.empty(tuple(len(index) for index in indices), dtype=self.dtype)
+        chunk_ids = [np.unique(index // size) for index, size in zip(indices, meta["chunks"])]
+        for c in chunk_ids[0]:
+            for i in chunk_ids[1]:
+                for j in chunk_ids[2]:
+                    chunk = self.read_chunk(c, i, j)
+                    picks = [np.nonzero(index // size == n)[0] for index, size, n in zip(indices, meta["chunks"], (c, i, j))]
+                    local = [index[pick] - n * size for index, pick, size, n in zip(indices, picks, meta["chunks"], (c, i, j))]
+                    out[np.ix_(*picks)] = chunk[np.ix_(*local)]
+        return out.reshape(tuple(len(index) for index, selection in zip(indices, selections) if np.ndim(selection)))
+
+    def read_chunk(self, c, i, j):
+        meta = self.store.meta
+        ct, cx, cy = meta["chunks"]
+        nt, nx, ny = self.shape
+        shape = (min(ct, nt - c * ct), min(cx, nx - i * cx), min(cy, ny - j * cy))
+        with open(os.path.join(self.store.path, self.name, f"{c}.{i}.{j}"), "rb") as file:
+            return decode(file.read(), shape, self.dtype, meta["quantize"])
+
+def read_meta(path):
+    meta_path = os.path.join(path, META)
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"no store in {path}")
+    with open(meta_path) as file:
+        return json.load(file)
+
+def write_file(path, data):
+    # Written next to its destination and renamed, so readers never see a partial file
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+def encode(values, quantize, level):
+    # Shuffled and compressed bytes of a chunk, quantized chunks start with their float64 offset and step
+    header = b""
+    if quantize is not None:
+        values, offset, step = quantized(values, quantize)
+        header = np.array([offset, step]).tobytes()
+    values = np.ascontiguousarray(values)
+    shuffled = values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+    return header + zlib.compress(shuffled, level)
+
+def decode(data, shape, dtype, quantize):
+    if quantize is not None:
+        offset, step = np.frombuffer(data[:16], dtype=np.float64)
+        data = data[16:]
+        stored = np.dtype(f"uint{quantize}")
+    else:
+        stored = dtype
+    raw = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+    values = raw.reshape(stored.itemsize, -1).T.copy().view(stored).reshape(shape)
+    if quantize is None:
+        return values
+    missing = values == np.iinfo(stored).max
+    values = (offset + step * values).astype(dtype)
+    values[missing] = np.nan
+    return values
+
+def quantized(values, bits):
+    # Integer codes 0 .. 2 ** bits - 2 over the finite range of values, the top code marks non-finite values
+    finite = np.isfinite(values)
+    top = 2 ** bits - 2
+    low = float(values[finite].min()) if finite.any() else 0.0
+    high = float(values[finite].max()) if finite.any() else 0.0
+    step = (high - low) / top if high > low else 1.0
+    codes = np.full(values.shape, top + 1, dtype=f"uint{bits}")
+    codes[finite] = np.rint((values[finite] - low) / step)
+    return codes, low, step
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from src.boundaries import obstacle_bc, obstacle_cell_bc, obstacle_cells
+from src.init import create_obstacle_mask
+from src.constants import w
+
+def test_obstacle_bc_rejects_unknown_temperature_condition():
+    nx = ny = 8
+    f = np.ones((nx, ny, 9)) * w
+    solid = np.zeros((nx, ny), dtype=bool)
+    with pytest.raises(ValueError, match="temp_cond"):
+        obstacle_bc(solid, nx, ny, 9, f, f.copy(), "cylinder", "heat_flux", 1, [4], [4], 2, 1, 0)
+
+@pytest.mark.parametrize("obstacle", ["cylinder", "box"])
+def test_obstacle_cell_bc_matches_obstacle_bc(obstacle):
+    nx, ny = 24, 16
+    centers_x, centers_y = np.array([6, 16]), np.array([8, 7])
+    solid = create_obstacle_mask(nx, ny, centers_x, centers_y, 2, obstacle, 3, np.zeros((nx, ny), dtype=bool))
+    solid[:, 0] = True
+    solid[:, ny - 1] = True
+    rng = np.random.default_rng(4)
+    f = rng.random((nx, ny, 9))
+    g = rng.random((nx, ny, 9))
+
+    f_dense, g_dense = obstacle_bc(solid, nx, ny, 9, f.copy(), g.copy(), obstacle, "heat flux", 2, centers_x, centers_y, 3, 1.0, 0.25)
+    cells = obstacle_cells(solid, obstacle, 2, centers_x, centers_y, 3, 1.0, 0.25)
+    f_cells, g_cells = obstacle_cell_bc(f.copy(), g.copy(), cells)
+    np.testing.assert_array_equal(f_cells, f_dense)
+    np.testing.assert_array_equal(g_cells, g_dense)
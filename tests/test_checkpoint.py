@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from src.boundaries import heat_flux_bc
+from src.checkpoint import load_checkpoint, save_checkpoint
+from src.init import rayleigh_bernard
+from src.simulation import Simulation
+
+# A run saved, loaded and stepped on against the same run stepped without interruption: the checkpoint holds the whole
+# state, so every field must match exactly.
+nx, ny = 32, 16
+T_hot, T_cold = 1, 0.75
+STEPS = 15
+
+def boundaries():
+    return [lambda f, g: heat_flux_bc(f, g, nx, ny, T_cold, T_hot, None, None)]
+
+def convection(precision, layout):
+    np.random.seed(0)
+    f, g = rayleigh_bernard(nx, ny, 9, T_hot, T_cold, layout)
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+    return Simulation(f, solid, 0.8, g=g, tau_g=0.6, alpha=0.4, T_ref=0.5 * (T_hot + T_cold), gravity=0.05, periodic="x",
+                      precision=precision, boundaries=boundaries())
+
+@pytest.mark.parametrize("precision, layout", [("float64", "aos"), ("float64", "soa"), ("float32", "aos")])
+@pytest.mark.parametrize("mode", ["c", "copy"])
+def test_restart_matches_continuous_run(tmp_path, precision, layout, mode):
+    continuous = convection(precision, layout)
+    continuous.advance(2 * STEPS)
+
+    sim = convection(precision, layout)
+    sim.advance(STEPS)
+    save_checkpoint(sim, tmp_path)
+    restarted = load_checkpoint(tmp_path, boundaries=boundaries(), mode=mode)
+    assert restarted.time == STEPS
+    restarted.advance(STEPS)
+
+    assert restarted.time == continuous.time
+    for name, restarted_array, array in zip(("f", "g"), restarted.populations(), continuous.populations()):
+        assert np.array_equal(restarted_array, array), f"{name} differs from the continuous run"
+    for field in ("density", "v_x", "v_y", "T"):
+        assert np.array_equal(getattr(restarted, field), getattr(continuous, field)), f"{field} differs from the continuous run"
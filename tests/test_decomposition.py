@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from benchmarks.cases import DECOMPOSED_CASES
+from src.decomposition import DecomposedSimulation
+from src.simulation import Simulation
+
+# DecomposedSimulation over two processes against a single-process Simulation of the same case: the slabs run the
+# same kernels on the same values, so every field must match exactly.
+# (case of DECOMPOSED_CASES, keywords added to it); multiphase drops the populations leaving through the y walls
+CASES = {"cylinder": ("cylinder_flow", {}), "droplet": ("droplet", {}), "droplet multiphase": ("droplet", {"multiphase": True})}
+SCALE = 0.1
+STEPS = 20
+FIELDS = ("f", "density", "v_x", "v_y")
+
+@pytest.fixture(scope="module")
+def decomposed():
+    # Every decomposed run goes first: the workers are forked, which numba's TBB threading layer only tolerates
+    # before this process has run a parallel kernel
+    results = {}
+    for name, (case, extra) in CASES.items():
+        positional, keywords, boundaries = DECOMPOSED_CASES[case](SCALE)
+        with DecomposedSimulation(*positional, boundaries=boundaries, processes=2, **keywords, **extra) as sim:
+            sim.advance(STEPS)
+            results[name] = {field: getattr(sim, field) for field in FIELDS}
+    return results
+
+@pytest.mark.parametrize("name", CASES)
+def test_decomposed_matches_simulation(decomposed, name):
+    case, extra = CASES[name]
+    positional, keywords, boundaries = DECOMPOSED_CASES[case](SCALE)
+    reference = Simulation(*positional, boundaries=boundaries(None), **keywords, **extra)
+    reference.advance(STEPS)
+    for field in FIELDS:
+        assert np.array_equal(decomposed[name][field], getattr(reference, field)), f"{field} differs from Simulation"
+
+def test_slabs_narrower_than_the_halo_are_rejected():
+    positional, keywords, boundaries = DECOMPOSED_CASES["droplet"](SCALE)
+    nx = positional[0].shape[0]
+    with pytest.raises(ValueError, match="halo"):
+        DecomposedSimulation(*positional, boundaries=boundaries, processes=nx // 2 + 1, **keywords)
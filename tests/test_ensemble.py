@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from src.boundaries import lid_bc
+from src.ensemble import Ensemble
+from src.init import rest
+from src.kernels import TRT_MAGIC
+from src.simulation import Simulation
+
+# Ensemble.from_simulations against the simulations it batches, stepped on their own.
+n = 24
+STEPS = 20
+
+def cavity(lid_speed, magic=None, precision="float64"):
+    solid = np.zeros((n, n), dtype=bool)
+    solid[0, :] = True
+    solid[n-1, :] = True
+    solid[:, 0] = True
+    return Simulation(rest(9, np.zeros((n, n, 9))), solid, 0.6, collision="trt", magic=magic,
+                      precision=precision, boundaries=[lambda f, g: lid_bc(f, lid_speed, n, n)])
+
+def test_members_without_magic_use_the_default():
+    ensemble = Ensemble.from_simulations([cavity(0.05), cavity(0.1, magic=0.25)])
+    assert np.array_equal(ensemble.magic, [TRT_MAGIC, 0.25])
+    ensemble.advance(STEPS)
+    for m, reference in enumerate([cavity(0.05), cavity(0.1, magic=0.25)]):
+        reference.advance(STEPS)
+        assert np.array_equal(ensemble.f[m], reference.f)
+
+def test_missing_values_of_other_parameters_are_rejected():
+    f = np.stack([rest(9, np.zeros((n, n, 9)))] * 2)
+    with pytest.raises(ValueError, match="tau_f must be given for every member"):
+        Ensemble(f, np.zeros((n, n), dtype=bool), [0.6, None])
+
+def test_float32_members_are_rejected():
+    with pytest.raises(ValueError, match="float64 precision"):
+        Ensemble.from_simulations([cavity(0.05), cavity(0.1, precision="float32")])
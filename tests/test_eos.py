@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+from src.constants import w
+from src.eos import carnahan_starling
+from src.simulation import Simulation
+
+def test_psi_table_rejects_another_G():
+    nx = ny = 8
+    f = np.ones((nx, ny, 9)) * w
+    solid = np.zeros((nx, ny), dtype=bool)
+    table = carnahan_starling(0.9, G=-1.0)
+    Simulation(f.copy(), solid, 0.8, G=-1.0, gravity=0.0, periodic="xy", psi_table=table)
+    with pytest.raises(ValueError, match="built for G = -1.0"):
+        Simulation(f.copy(), solid, 0.8, G=-1.2, gravity=0.0, periodic="xy", psi_table=table)
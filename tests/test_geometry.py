@@ -0,0 +1,17 @@
+import numpy as np
+from src.geometry import Box, Circle
+
+def test_union_with_difference_keeps_other_shapes():
+    geometry = Circle(5, 5, 3) | (Box(15, 5, 6, 6) - Circle(5, 5, 1))
+    solid = geometry.rasterize(20, 10)
+    assert solid[5, 5]
+    assert solid[15, 5]
+    assert np.array_equal(solid, geometry.contains(np.arange(20)[:, None], np.arange(10)[None, :]))
+
+def test_nested_difference_stays_inside_outer_shape():
+    geometry = Box(5, 5, 8, 8) - (Box(8, 5, 8, 4) - Circle(10, 5, 2))
+    solid = geometry.rasterize(20, 10)
+    assert not solid[10, 5] # C outside A
+    assert not solid[7, 5] # removed by B - C
+    assert solid[5, 8]
+    assert np.array_equal(solid, geometry.contains(np.arange(20)[:, None], np.arange(10)[None, :]))
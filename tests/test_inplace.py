@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from benchmarks.cases import DECOMPOSED_CASES
+from src.inplace import InPlaceSimulation
+from src.simulation import Simulation
+
+# InPlaceSimulation against Simulation on small versions of the examples. The AA kernels run the same physics as the
+# fused step, so the streamed populations and fields must match exactly after an even number of steps, when the
+# storage holds them directly, and after an odd one, when populations() reads them back through the swapped slots.
+SCALE = 0.1
+FIELDS = ("density", "v_x", "v_y", "T")
+
+def build(solver, case):
+    np.random.seed(0) # rayleigh_bernard perturbs the initial temperature
+    positional, keywords, boundaries = DECOMPOSED_CASES[case](SCALE)
+    return solver(*positional, boundaries=boundaries(None), **keywords)
+
+@pytest.mark.parametrize("steps", [10, 11])
+@pytest.mark.parametrize("case", DECOMPOSED_CASES)
+def test_inplace_matches_simulation(case, steps):
+    inplace = build(InPlaceSimulation, case)
+    reference = build(Simulation, case)
+    inplace.advance(steps)
+    reference.advance(steps)
+    for name, inplace_array, array in zip(("f", "g"), inplace.populations(), reference.populations()):
+        assert np.array_equal(inplace_array, array), f"{name} differs from Simulation"
+    for field in FIELDS:
+        assert np.array_equal(getattr(inplace, field), getattr(reference, field)), f"{field} differs from Simulation"
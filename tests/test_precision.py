@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from src.boundaries import heat_flux_bc, lid_bc
+from src.init import rayleigh_bernard, rest
+from src.simulation import Simulation
+
+# float32 storage against float64 on small versions of the lid-driven cavity and Rayleigh-Benard examples. Density and
+# T differ by the float32 rounding level relative to their largest float64 value. The velocity error is relative to the
+# peak speed: rounding populations of order w[k] leaves an absolute error of ~1e-9 in u, so slow flows such as the
+# early convection (peak speed ~2e-3) show a larger relative velocity error than the driven cavity.
+STEPS = 300
+TOLERANCE = 2e-7
+VELOCITY_TOLERANCE = 1e-6
+
+def lid_driven_cavity(precision):
+    n = 48
+    lid_speed = 0.1
+    solid = np.zeros((n, n), dtype=bool)
+    solid[0, :] = True
+    solid[n-1, :] = True
+    solid[:, 0] = True
+    return Simulation(rest(9, np.zeros((n, n, 9))), solid, 0.6, precision=precision, boundaries=[
+        lambda f, g: lid_bc(f, lid_speed, n, n),
+    ])
+
+def rayleigh_benard(precision):
+    nx, ny = 64, 24
+    T_hot, T_cold = 1, 0.75
+    np.random.seed(0)
+    f, g = rayleigh_bernard(nx, ny, 9, T_hot, T_cold)
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+    return Simulation(f, solid, 0.8, g=g, tau_g=0.6, alpha=0.4, T_ref=0.5 * (T_hot + T_cold), gravity=0.05, periodic="x",
+                      precision=precision, boundaries=[lambda f, g: heat_flux_bc(f, g, nx, ny, T_cold, T_hot, None, None)])
+
+@pytest.mark.parametrize("build", [lid_driven_cavity, rayleigh_benard])
+def test_float32_matches_float64(build):
+    double = build("float64")
+    single = build("float32")
+    double.advance(STEPS)
+    single.advance(STEPS)
+    assert single.f.dtype == np.float32
+    speed = np.hypot(double.v_x, double.v_y).max()
+    bounds = {"density": (np.abs(double.density).max(), TOLERANCE), "v_x": (speed, VELOCITY_TOLERANCE),
+              "v_y": (speed, VELOCITY_TOLERANCE)}
+    if double.T is not None:
+        bounds["T"] = (np.abs(double.T).max(), TOLERANCE)
+    for name, (scale, tolerance) in bounds.items():
+        error = np.abs(getattr(single, name).astype(np.float64) - getattr(double, name)).max() / scale
+        assert error < tolerance, f"{name} differs by {error:.2e} relative to float64"
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from src.boundaries import heat_flux_bc
+from src.constants import w
+from src.eos import carnahan_starling
+from src.init import droplet_collision, rayleigh_bernard
+from src.profiling import profile
+from src.simulation import Simulation
+
+# The unfused kernel chain of split_phases against the fused step of Simulation: both must give the same fields.
+STEPS = 10
+
+def droplet(periodic="x"):
+    nx, ny = 40, 24
+    density = droplet_collision(nx, ny, np.ones((nx, ny)) * 0.1, 2, 0.1, nx // 2, ny // 2, nx // 8, ny // 4)
+    return Simulation(w * density[:, :, None], np.zeros((nx, ny), dtype=bool), 0.9, gravity=0.0005, G=-5.5, periodic=periodic)
+
+def eos_droplet():
+    # Liquid and gas densities of the Carnahan-Starling EOS below its critical temperature
+    nx, ny = 40, 24
+    density = droplet_collision(nx, ny, np.ones((nx, ny)) * 0.05, 0.35, 0.05, nx // 2, ny // 2, nx // 8, ny // 4)
+    return Simulation(w * density[:, :, None], np.zeros((nx, ny), dtype=bool), 0.9, gravity=0.0, G=-1.0, periodic="x",
+                      psi_table=carnahan_starling(0.9))
+
+def rayleigh_benard():
+    nx, ny = 40, 16
+    np.random.seed(0)
+    f, g = rayleigh_bernard(nx, ny, 9, 1, 0.75)
+    solid = np.zeros((nx, ny), dtype=bool)
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+    return Simulation(f, solid, 0.8, g=g, tau_g=0.6, alpha=0.4, T_ref=0.875, gravity=0.05, periodic="x",
+                      boundaries=[lambda f, g: heat_flux_bc(f, g, nx, ny, 0.75, 1, None, None)])
+
+CASES = {
+    "shan-chen": lambda: droplet(),
+    "shan-chen eos": eos_droplet,
+    "shan-chen periodic xy": lambda: droplet(periodic="xy"),
+    "thermal": rayleigh_benard,
+}
+
+@pytest.mark.parametrize("case", CASES)
+def test_split_phases_match_fused_step(case):
+    fused = CASES[case]()
+    split = CASES[case]()
+    fused.advance(STEPS)
+    with profile(split, split_phases=True) as profiler:
+        split.advance(STEPS)
+    for name in ("f", "density", "v_x", "v_y", "T"):
+        if getattr(fused, name) is not None:
+            assert np.array_equal(getattr(split, name), getattr(fused, name)), f"{name} differs from the fused step"
+    phases = profiler.summary()["phases"]
+    assert ("shan_chen" in phases) == (fused.G is not None)
+    assert all(f"boundary_{n}" in phases for n in range(len(fused.boundaries)))
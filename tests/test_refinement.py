@@ -0,0 +1,23 @@
+import numpy as np
+from src.moments import equilibrium_at
+from src.refinement import Block, RefinedSimulation
+
+# A uniform flow is a fixed point of every level: the refined blocks start from the interpolated equilibrium, the
+# ring nodes are set from uniform parent edges and restriction writes the same state back, so the flow through a
+# nested block must stay uniform up to rounding on the coarse lattice and on every block.
+nx, ny = 24, 16
+DENSITY, U_X, U_Y = 1.0, 0.05, 0.02
+STEPS = 20
+TOLERANCE = 1e-13
+
+def test_uniform_flow_through_a_refined_block_stays_uniform():
+    f = equilibrium_at(np.full((nx, ny), DENSITY), np.full((nx, ny), U_X), np.full((nx, ny), U_Y))
+    blocks = [Block(6, 4, 14, 11, blocks=[Block(4, 4, 10, 8)])]
+    sim = RefinedSimulation(f, np.zeros((nx, ny), dtype=bool), 0.8, blocks=blocks, periodic="xy")
+    assert len(sim.levels) == 3
+    sim.advance(STEPS)
+
+    for level in sim.levels:
+        for field, value in (("density", DENSITY), ("v_x", U_X), ("v_y", U_Y)):
+            np.testing.assert_allclose(getattr(level.sim, field), value, rtol=0, atol=TOLERANCE,
+                                       err_msg=f"{field} at depth {level.depth}")
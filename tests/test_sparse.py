@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from src.boundaries import obstacle_link_bc, obstacle_links
+from src.constants import w
+from src.init import create_obstacle_mask, droplet_collision, thermal_sim, wind_tunnel
+from src.simulation import Simulation
+from src.sparse import SparseSimulation, sparse_link_bc, sparse_links
+
+# SparseSimulation against a dense Simulation that bounces back on the fluid-solid links with obstacle_link_bc: the
+# fluid cells must match exactly, the sparse fields are zero in solid cells.
+nx, ny, nl = 48, 32, 9
+STEPS = 50
+
+def cylinder_array():
+    centers = np.mgrid[6:nx:12, 8:ny:16].reshape(2, -1)
+    solid = create_obstacle_mask(nx, ny, centers[0], centers[1], centers.shape[1], "cylinder", 3, np.zeros((nx, ny), dtype=bool))
+    return solid, centers
+
+def assert_fluid_cells_match(sparse, dense, fields):
+    fluid = ~dense.solid
+    assert np.array_equal(sparse.lattice.scatter(sparse.f)[fluid], dense.f[fluid]), "f differs from Simulation"
+    for name in fields:
+        assert np.array_equal(getattr(sparse, name)[fluid], getattr(dense, name)[fluid]), f"{name} differs from Simulation"
+
+def test_sparse_matches_simulation_with_link_bounce_back():
+    solid, _ = cylinder_array()
+    f = wind_tunnel(np.zeros((nx, ny, nl)), nx, ny, nl, 0.05)
+    links = obstacle_links(solid, nx, ny, None, 0, [], [], 0, 0.0, 0.0)
+    dense = Simulation(f.copy(), solid, 0.7, periodic="xy", boundaries=[lambda f, g: obstacle_link_bc(f, g, links)])
+    sparse = SparseSimulation(f, solid, 0.7, periodic="xy")
+    dense.advance(STEPS)
+    sparse.advance(STEPS)
+    assert_fluid_cells_match(sparse, dense, ("density", "v_x", "v_y"))
+
+def test_sparse_matches_simulation_with_wall_temperature():
+    solid, centers = cylinder_array()
+    solid[:, 0] = True
+    solid[:, ny-1] = True
+    f, g = thermal_sim(nx, ny, nl, 0.0)
+    f = wind_tunnel(f, nx, ny, nl, 0.05)
+    links = obstacle_links(solid, nx, ny, "cylinder", centers.shape[1], centers[0], centers[1], 3, 1.0, 0.0)
+    physics = dict(g=g, tau_g=0.6, alpha=0.01, T_ref=0.0, gravity=0.0)
+    dense = Simulation(f.copy(), solid, 0.7, boundaries=[lambda f, g: obstacle_link_bc(f, g, links)],
+                       **dict(physics, g=g.copy()))
+    sparse = SparseSimulation(f, solid, 0.7, **physics)
+    sparse_wall = sparse_links(sparse.lattice, links)
+    sparse.boundaries.append(lambda f, g: sparse_link_bc(sparse.g, sparse_wall))
+    dense.advance(STEPS)
+    sparse.advance(STEPS)
+    assert_fluid_cells_match(sparse, dense, ("density", "v_x", "v_y", "T"))
+
+def test_sparse_shan_chen_matches_simulation_without_solids():
+    density = droplet_collision(nx, ny, np.ones((nx, ny)) * 0.1, 2, 0.1, nx // 2, ny // 2, nx // 8, ny // 4)
+    f = w * density[:, :, None]
+    solid = np.zeros((nx, ny), dtype=bool)
+    dense = Simulation(f.copy(), solid, 0.9, gravity=0.0005, G=-5.5, periodic="x")
+    sparse = SparseSimulation(f, solid, 0.9, gravity=0.0005, G=-5.5, periodic="x")
+    dense.advance(STEPS)
+    sparse.advance(STEPS)
+    assert_fluid_cells_match(sparse, dense, ("density", "v_x", "v_y"))
+
+def test_sparse_shan_chen_with_solid_cells_is_rejected():
+    solid, _ = cylinder_array()
+    f = np.ones((nx, ny, nl)) * w
+    with pytest.raises(ValueError, match="Shan-Chen"):
+        SparseSimulation(f, solid, 0.9, gravity=0.0005, G=-5.5, periodic="x")
@@ -0,0 +1,50 @@
+import numpy as np
+from src.boundaries import lid_bc
+from src.init import rest
+from src.moments import equilibrium_at, moments_of
+from src.simulation import Simulation
+from src.steady import rescale, run_steady
+
+def test_poiseuille_converges_to_the_parabola():
+    # Gravity-driven channel, periodic in y between bounce-back walls at x = -1/2 and nx - 1/2. G = 0 is a single-phase
+    # fluid under gravity with the half-force velocity shift of the Guo forcing, so the velocity of the steady state is
+    # v_y + F / 2 and the parabola holds up to the wall slip of halfway bounce-back.
+    nx, ny = 16, 4
+    tau_f = 0.8
+    gravity = 1e-6
+    sim = Simulation(rest(9, np.zeros((nx, ny, 9))), np.zeros((nx, ny), dtype=bool), tau_f, G=0.0, gravity=gravity,
+                     periodic="y", streaming=(False, True, False, False))
+    result = run_steady(sim, tolerance=1e-9, check_every=100, max_steps=50_000)
+    assert result.converged
+    assert result.history[-1][1] < 1e-9
+
+    x = np.arange(nx) + 0.5
+    viscosity = (tau_f - 0.5) / 3
+    expected = -gravity / (2 * viscosity) * x * (nx - x)
+    velocity = sim.v_y - 0.5 * gravity
+    assert np.abs(velocity - expected[:, None]).max() < 1e-2 * np.abs(expected).max()
+    assert np.abs(sim.v_x).max() < 1e-12
+
+def test_rescale_scales_the_state_by_the_spin_up_factor():
+    # factor times the velocity, factor ** 2 times the density deviation and factor * tau_f / sim.tau_f times the
+    # non-equilibrium part
+    n = 24
+    solid = np.zeros((n, n), dtype=bool)
+    solid[0, :] = True
+    solid[n-1, :] = True
+    solid[:, 0] = True
+    sim = Simulation(rest(9, np.zeros((n, n, 9))), solid, 0.6, boundaries=[lambda f, g: lid_bc(f, 0.05, n, n)])
+    sim.advance(50)
+    f = sim.populations()[0].copy() # rescale overwrites sim.f in place
+    rho, u_x, u_y = moments_of(f)
+    factor, tau_f = 2.0, 0.5 + 2.0 * 0.1
+
+    rescale(sim, factor, tau_f)
+    scaled, _ = sim.populations()
+    scaled_rho, scaled_u_x, scaled_u_y = moments_of(scaled)
+    np.testing.assert_allclose(scaled_rho - 1, factor ** 2 * (rho - 1), rtol=0, atol=1e-14)
+    np.testing.assert_allclose(scaled_u_x, factor * u_x, rtol=0, atol=1e-14)
+    np.testing.assert_allclose(scaled_u_y, factor * u_y, rtol=0, atol=1e-14)
+    np.testing.assert_allclose(scaled - equilibrium_at(scaled_rho, scaled_u_x, scaled_u_y),
+                               factor * tau_f / 0.6 * (f - equilibrium_at(rho, u_x, u_y)), rtol=0, atol=1e-14)
+    assert sim.tau_f == tau_f
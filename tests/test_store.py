@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from src.store import Store, StoreWriter
+
+# Fields written to a store and read back: exactly without quantize, within half a quantization step of its chunk
+# range with it, and the same across a store closed on a partly filled last chunk and extended with mode="a".
+nx, ny = 20, 12
+CHUNKS = (2, 8, 8) # partial chunks along every axis
+SNAPSHOTS = 5
+
+def snapshots(count, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 2 * np.pi, nx)[:, None]
+    y = np.linspace(0, np.pi, ny)[None, :]
+    return [{"density": 1 + 0.01 * np.sin(x + n) * np.cos(y) + 1e-4 * rng.standard_normal((nx, ny)),
+             "v_x": 0.05 * np.cos(x - n) + 1e-3 * rng.standard_normal((nx, ny)),
+             "T": None} # an isothermal run, left out of the store
+            for n in range(count)]
+
+def write(path, fields, times, **options):
+    with StoreWriter(path, **options) as writer:
+        for time, snap in zip(times, fields):
+            writer.append(time, snap)
+
+def stacked(fields, name):
+    return np.stack([snap[name] for snap in fields])
+
+def test_lossless_round_trip(tmp_path):
+    fields = snapshots(SNAPSHOTS)
+    write(tmp_path, fields, range(0, 50 * SNAPSHOTS, 50), chunks=CHUNKS)
+    store = Store(tmp_path)
+    assert store.fields == ("density", "v_x")
+    assert store.shape == (nx, ny)
+    assert np.array_equal(store.times, np.arange(0, 50 * SNAPSHOTS, 50))
+    for name in store.fields:
+        assert np.array_equal(store[name][:], stacked(fields, name))
+        assert np.array_equal(store[name][:, 9, 3], stacked(fields, name)[:, 9, 3])
+        assert np.array_equal(store[name][-2:, 5:17, 7:], stacked(fields, name)[-2:, 5:17, 7:])
+
+@pytest.mark.parametrize("quantize", [8, 16])
+def test_quantized_round_trip_is_within_the_bound(tmp_path, quantize):
+    fields = snapshots(SNAPSHOTS)
+    fields[1]["v_x"][3, 4] = np.nan
+    write(tmp_path, fields, range(SNAPSHOTS), chunks=CHUNKS, quantize=quantize)
+    store = Store(tmp_path)
+    ct, cx, cy = CHUNKS
+    for name in store.fields:
+        values = stacked(fields, name)
+        stored = store[name][:]
+        assert np.array_equal(np.isnan(stored), np.isnan(values))
+        for c in range(0, SNAPSHOTS, ct):
+            for i in range(0, nx, cx):
+                for j in range(0, ny, cy):
+                    chunk = values[c:c + ct, i:i + cx, j:j + cy]
+                    bound = (np.nanmax(chunk) - np.nanmin(chunk)) / (2 * (2 ** quantize - 2))
+                    error = np.abs(stored[c:c + ct, i:i + cx, j:j + cy] - chunk)
+                    assert np.nanmax(error) <= bound * (1 + 1e-12), f"{name} chunk {c // ct}.{i // cx}.{j // cy}"
+
+def test_append_completes_a_partly_filled_last_chunk(tmp_path):
+    fields = snapshots(SNAPSHOTS + 4)
+    times = list(range(SNAPSHOTS + 4))
+    write(tmp_path, fields[:SNAPSHOTS], times[:SNAPSHOTS], chunks=CHUNKS)
+    assert len(Store(tmp_path)) == SNAPSHOTS
+    write(tmp_path, fields[SNAPSHOTS:], times[SNAPSHOTS:], mode="a")
+
+    store = Store(tmp_path)
+    assert np.array_equal(store.times, times)
+    for name in store.fields:
+        assert np.array_equal(store[name][:], stacked(fields, name))